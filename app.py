@@ -1,4 +1,5 @@
 from flask import Flask, session, g
+import click
 from config import Config
 from models import db, User
 import pytz
@@ -29,6 +30,13 @@ def create_app():
     app.register_blueprint(calendar_bp)
     app.register_blueprint(admin_bp)
     
+    # Canal de eventos en tiempo real para notificaciones
+    from services import notification_bus, notification_dispatch, identity, outbox
+    notification_bus.install_hooks()
+    notification_dispatch.install_hooks()
+    identity.install_hooks()
+    outbox.install_hooks()
+    
     # Configurar zona horaria y contexto global
     @app.before_request
     def load_logged_in_user():
@@ -38,7 +46,8 @@ def create_app():
         if user_id is None:
             g.user = None
         else:
-            g.user = db.session.get(User, user_id)
+            # Usuario y departamento en una sola carga (o desde la caché opcional)
+            g.user = identity.load_current_user(user_id)
             
             # Verificar que el usuario siga activo
             if g.user and not g.user.is_active:
@@ -81,6 +90,120 @@ def create_app():
         if g.user:
             return g.user.get_notifications_count()
         return 0
+
+    # Comandos de mantenimiento (flask --app wsgi <comando>)
+    @app.cli.command('rebuild-balances')
+    def rebuild_balances_command():
+        """Recalcular saldos de vacaciones desde el libro mayor e informar de diferencias"""
+        from models import VacationBalance
+
+        drift = VacationBalance.rebuild()
+
+        if not drift:
+            print("✅ Saldos correctos: no hay diferencias con el libro mayor")
+            return
+
+        print(f"⚠️ Corregidas {len(drift)} diferencias entre saldos y libro mayor:")
+        for item in drift:
+            cached = item['cached'] if item['cached'] is not None else 'sin saldo'
+            print(f"  - Usuario {item['user_id']} ({item['year']}): {cached} → {item['ledger']}")
+    
+    @app.cli.command('reconcile-notifications')
+    def reconcile_notifications_command():
+        """Recalcular los contadores de notificaciones sin leer de cada usuario"""
+        from models import Notification
+        
+        drift = Notification.reconcile_unread_counts()
+        
+        if not drift:
+            print("✅ Contadores correctos: no hay diferencias")
+            return
+        
+        print(f"⚠️ Corregidos {len(drift)} contadores de notificaciones:")
+        for item in drift:
+            print(f"  - Usuario {item['user_id']}: {item['cached']} → {item['real']}")
+    
+    @app.cli.command('rebuild-recovery-status')
+    def rebuild_recovery_status_command():
+        """Recalcular el estado de recuperación de los festivos trabajados"""
+        from models import WorkedHoliday
+        
+        drift = WorkedHoliday.rebuild_recovery_status()
+        
+        if not drift:
+            print("✅ Estados de recuperación correctos: no hay diferencias")
+            return
+        
+        print(f"⚠️ Corregidos {len(drift)} estados de recuperación:")
+        for item in drift:
+            print(f"  - Festivo {item['holiday_id']}: {item['cached'] or 'sin recuperación'} → {item['real'] or 'sin recuperación'}")
+
+    @app.cli.command('process-outbox')
+    @click.option('--watch', is_flag=True, help='Seguir entregando eventos hasta interrumpir (Ctrl+C)')
+    def process_outbox_command(watch):
+        """Entregar los eventos pendientes del outbox (notificaciones)"""
+        if watch:
+            print("📬 Worker del outbox en marcha (Ctrl+C para salir)...")
+            outbox.run_worker(app, app.config['OUTBOX_POLL_SECONDS'])
+            return
+        
+        delivered, processed = outbox.deliver_pending(limit=1000)
+        print(f"📬 Entregados {delivered} de {processed} eventos pendientes")
+    
+    @app.cli.command('year-rollover')
+    @click.option('--year', type=int, default=None, help='Año a cargar (por defecto, el año de vacaciones en curso de cada departamento)')
+    def year_rollover_command(year):
+        """Cargar arrastre y días anuales de los usuarios activos (idempotente)"""
+        from services.annual_load import run_year_rollover
+        
+        summary = run_year_rollover(year)
+        print(f"📅 Carga de {', '.join(map(str, summary['years']))}: {summary['users']} usuarios, "
+              f"{summary['annual_load']} cargas anuales y {summary['carryover']} arrastres")
+    
+    @app.cli.command('migrate')
+    def migrate_command():
+        """Aplicar las migraciones de esquema pendientes"""
+        from services import migrations
+        
+        applied = migrations.apply_pending()
+        if not applied:
+            print("✅ Esquema al día: no hay migraciones pendientes")
+            return
+        
+        print(f"✅ Aplicadas {len(applied)} migraciones")
+    
+    @app.cli.command('check-query-plans')
+    def check_query_plans_command():
+        """Comprobar con EXPLAIN QUERY PLAN que las consultas frecuentes usan índices"""
+        from services.query_plans import check_query_plans
+        
+        results = check_query_plans()
+        for result in results:
+            print(f"{'✅' if result['ok'] else '❌'} {result['name']} ({result['table']})")
+            for line in result['plan']:
+                print(f"    {line}")
+        
+        failed = [result for result in results if not result['ok']]
+        if failed:
+            print(f"❌ {len(failed)} consulta(s) recorren la tabla entera")
+            raise SystemExit(1)
+        
+        print(f"✅ Las {len(results)} consultas frecuentes usan índices")
+    
+    @app.cli.command('benchmark-password-hash')
+    @click.option('--seconds', type=float, default=1.0, help='Tiempo de medida por esquema')
+    @click.option('--method', 'methods', multiple=True, help='Esquema a medir (repetible); por defecto, una selección')
+    def benchmark_password_hash_command(seconds, methods):
+        """Medir hashes por segundo de cada esquema de cifrado de contraseñas"""
+        from services.passwords import BENCHMARK_METHODS, benchmark, get_hash_method, normalize_method
+        
+        configured = normalize_method(get_hash_method())
+        methods = list(methods) or list(dict.fromkeys([configured] + BENCHMARK_METHODS))
+        
+        print(f"⏱️ Cifrado de contraseñas ({seconds:g} s por esquema; verificar cuesta lo mismo)")
+        for result in benchmark(methods, seconds):
+            marker = ' ← configurado' if result['method'] == configured else ''
+            print(f"  {result['method']:<24} {result['hashes_per_second']:7.1f} hashes/s  {result['ms_per_hash']:7.1f} ms{marker}")
     
     # Crear tablas si no existen
     with app.app_context():
@@ -104,6 +227,13 @@ def create_app():
             import traceback
             traceback.print_exc()
     
+    # Worker del outbox: arranca con la primera petición que sirve el proceso, así los
+    # comandos de flask (incluido process-outbox --watch) no lanzan otro hilo de entrega
+    if app.config['OUTBOX_WORKER_ENABLED']:
+        @app.before_request
+        def start_outbox_worker():
+            outbox.start_worker(app)
+    
     return app
     
 
@@ -169,25 +299,9 @@ def create_initial_data():
 def migrate_existing_data():
     """Migrar datos existentes para añadir nuevas columnas"""
     try:
-        # Verificar si necesitamos añadir las nuevas columnas a la BD
-        from sqlalchemy import inspect
-        inspector = inspect(db.engine)
-        
-        # Verificar columnas en Department
-        dept_columns = [col['name'] for col in inspector.get_columns('departments')]
-        if 'vacation_days_per_year' not in dept_columns:
-            print("Añadiendo columna vacation_days_per_year a departments...")
-            db.engine.execute('ALTER TABLE departments ADD COLUMN vacation_days_per_year INTEGER DEFAULT 22')
-            db.engine.execute('ALTER TABLE departments ADD COLUMN created_at DATETIME DEFAULT CURRENT_TIMESTAMP')
-            db.engine.execute('ALTER TABLE departments ADD COLUMN updated_at DATETIME DEFAULT CURRENT_TIMESTAMP')
-        
-        # Verificar columnas en User
-        user_columns = [col['name'] for col in inspector.get_columns('users')]
-        if 'vacation_days_override' not in user_columns:
-            print("Añadiendo columnas de gestión a users...")
-            db.engine.execute('ALTER TABLE users ADD COLUMN vacation_days_override INTEGER')
-            db.engine.execute('ALTER TABLE users ADD COLUMN hire_date DATE')
-            db.engine.execute('ALTER TABLE users ADD COLUMN updated_at DATETIME DEFAULT CURRENT_TIMESTAMP')
+        # Cambios de esquema: migraciones versionadas pendientes (columnas e índices)
+        from services import migrations
+        migrations.apply_pending()
         
         # Actualizar departamentos existentes con días por defecto
         from models import Department
@@ -204,32 +318,39 @@ def migrate_existing_data():
         # ==========================================================
         from models import User
         from models.transaction import VacationTransaction
-        from utils import get_canary_time
         
         # Verificar si la tabla de transacciones está vacía
         transactions_count = VacationTransaction.query.count()
         if transactions_count == 0:
             print("📸 Tomando foto inicial de saldos de vacaciones para el nuevo sistema de transacciones...")
-            current_year = get_canary_time().year
             users = User.query.filter_by(is_active=True).all()
             
             for user in users:
+                # Año de vacaciones en curso del empleado (el de su departamento)
+                current_year = user.get_vacation_year()
+                
                 # Calculamos el saldo EXACTO que tiene hoy con tu lógica actual
                 balance_info = user.get_vacation_balance_info(current_year)
                 dias_disponibles = balance_info['available_days']
                 
                 # Creamos el primer apunte en su libro mayor
-                initial_tx = VacationTransaction(
+                VacationTransaction.record(
                     user_id=user.id,
                     year=current_year,
                     days=dias_disponibles,
                     transaction_type='initial_migration',
                     description=f'Saldo inicial exacto migrado del sistema anterior'
                 )
-                db.session.add(initial_tx)
             
             db.session.commit()
             print(f"✅ Migración de saldos completada con éxito para {len(users)} empleados.")
+        
+        # Rellenar la tabla de saldos materializados si es nueva
+        from models.transaction import VacationBalance
+        if transactions_count > 0 and VacationBalance.query.count() == 0:
+            print("🧮 Calculando saldos materializados desde el libro mayor...")
+            drift = VacationBalance.rebuild()
+            print(f"✅ Saldos calculados para {len(drift)} combinaciones usuario/año.")
             
     except Exception as e:
         print(f"Error en migración: {e}")
@@ -23,6 +23,31 @@ class Config:
     SESSION_COOKIE_HTTPONLY = True  # Prevenir acceso via JavaScript
     SESSION_COOKIE_SAMESITE = 'Lax'
     
+    # Caché entre peticiones del usuario logueado (segundos, 0 = desactivada)
+    USER_CACHE_TTL_SECONDS = int(os.environ.get('USER_CACHE_TTL_SECONDS', 0))
+    
+    # Entrega de notificaciones del outbox en un hilo del proceso web, que arranca con
+    # la primera petición (los comandos de flask no lo lanzan). Desactivar si se usa
+    # un proceso aparte: flask process-outbox --watch
+    OUTBOX_WORKER_ENABLED = os.environ.get('OUTBOX_WORKER_ENABLED', '1') == '1'
+    OUTBOX_POLL_SECONDS = int(os.environ.get('OUTBOX_POLL_SECONDS', 5))
+    
+    # Cifrado de contraseñas (formato de werkzeug). scrypt con N=2^14 (16 MiB por hash)
+    # cuesta unas 5 veces menos CPU que PBKDF2 con 600.000 iteraciones y sigue siendo
+    # costoso en GPU; los hashes antiguos se recifran al iniciar sesión.
+    # Para dimensionarlo: flask benchmark-password-hash
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:16384:8:1')
+    
+    # Límite de intentos fallidos de login (ventana deslizante, por email y por IP).
+    # Detrás de un proxy sin ProxyFix todas las peticiones llegan con la IP del proxy:
+    # el límite por IP debe ser holgado. LOGIN_THROTTLE_DB: ruta de un SQLite para
+    # compartir los contadores entre procesos y conservarlos al reiniciar (vacío = memoria)
+    LOGIN_WINDOW_SECONDS = int(os.environ.get('LOGIN_WINDOW_SECONDS', 900))
+    LOGIN_MAX_FAILURES_PER_EMAIL = int(os.environ.get('LOGIN_MAX_FAILURES_PER_EMAIL', 5))
+    LOGIN_MAX_FAILURES_PER_IP = int(os.environ.get('LOGIN_MAX_FAILURES_PER_IP', 30))
+    LOGIN_THROTTLE_MAX_KEYS = int(os.environ.get('LOGIN_THROTTLE_MAX_KEYS', 10000))
+    LOGIN_THROTTLE_DB = os.environ.get('LOGIN_THROTTLE_DB', '')
+    
     # Configuración de la aplicación
     APP_NAME = os.environ.get('APP_NAME') or 'Sistema de Vacaciones'
     ADMIN_EMAIL = os.environ.get('ADMIN_EMAIL') or 'admin@empresa.com'
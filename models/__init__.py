@@ -8,6 +8,7 @@ from .department import Department
 from .request import Request
 from .holiday import WorkedHoliday
 from .notification import Notification
-from .transaction import VacationTransaction
+from .transaction import VacationTransaction, VacationBalance
+from .outbox import OutboxEvent
 
-__all__ = ['db', 'User', 'Department', 'Request', 'WorkedHoliday', 'Notification', 'VacationTransaction']
\ No newline at end of file
+__all__ = ['db', 'User', 'Department', 'Request', 'WorkedHoliday', 'Notification', 'VacationTransaction', 'VacationBalance', 'OutboxEvent']
\ No newline at end of file
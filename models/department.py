@@ -11,6 +11,9 @@ class Department(db.Model):
     # NUEVO: Días de vacaciones por año para empleados de este departamento
     vacation_days_per_year = db.Column(db.Integer, default=22, nullable=False)
     
+    # Mes en que empieza el año de vacaciones (1 = año natural; otro = año de contrato)
+    vacation_year_start_month = db.Column(db.Integer, default=1, nullable=False)
+    
     # NUEVO: Campos de auditoría
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp(), nullable=False)
     updated_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
@@ -21,9 +24,49 @@ class Department(db.Model):
     def __repr__(self):
         return f'<Department {self.name}>'
     
+    def _employees_query(self, *columns):
+        """Consulta de los empleados activos del departamento (índice department_id, role, is_active)"""
+        from .user import User
+        query = db.session.query(*columns) if columns else User.query
+        return query.filter(
+            User.department_id == self.id,
+            User.role == 'employee',
+            User.is_active == True
+        )
+    
     def get_employees(self):
         """Obtener todos los empleados del departamento"""
-        return [user for user in self.users if user.role == 'employee' and user.is_active]
+        from .user import User
+        return self._employees_query().order_by(User.name).all()
+    
+    def get_employees_count(self):
+        """Número de empleados activos del departamento"""
+        from .user import User
+        return self._employees_query(db.func.count(User.id)).scalar()
+    
+    @staticmethod
+    def get_employee_counts():
+        """Empleados activos por departamento en una consulta: {department_id: número}"""
+        from .user import User
+        return dict(db.session.query(User.department_id, db.func.count(User.id)).filter(
+            User.role == 'employee',
+            User.is_active == True
+        ).group_by(User.department_id).all())
+    
+    def get_vacation_period(self, year):
+        """Límites [inicio, fin) del año de vacaciones del departamento (natural o de contrato)"""
+        from utils import get_period_bounds
+        return get_period_bounds(year, self.vacation_year_start_month or 1)
+    
+    def get_vacation_year(self, on_date):
+        """Año de vacaciones (el del libro mayor) al que pertenece una fecha según el mes de inicio"""
+        from utils import get_period_year
+        return get_period_year(on_date, self.vacation_year_start_month or 1)
+    
+    def get_current_vacation_year(self):
+        """Año de vacaciones en curso según el mes de inicio del departamento"""
+        from utils import get_canary_time
+        return self.get_vacation_year(get_canary_time().date())
     
     def get_employees_on_vacation(self, start_date=None, end_date=None):
         """Obtener empleados que están de vacaciones en un rango de fechas"""
@@ -34,85 +77,121 @@ class Department(db.Model):
         if not end_date:
             end_date = start_date
             
-        # Buscar solicitudes de vacaciones aprobadas que se solapen con el rango
-        vacation_requests = Request.query.filter(
-            Request.user_id.in_([user.id for user in self.get_employees()]),
+        # Usuarios distintos con vacaciones aprobadas que se solapen con el rango (una consulta)
+        from . import User
+        return User.query.join(Request, Request.user_id == User.id).filter(
+            User.department_id == self.id,
+            User.role == 'employee',
+            User.is_active == True,
             Request.type == 'vacation',
             Request.status == 'approved',
             Request.start_date <= end_date,
             Request.end_date >= start_date
-        ).all()
+        ).distinct().all()
         
-        # Obtener los usuarios únicos
-        users_on_vacation = []
-        for request in vacation_requests:
-            if request.user not in users_on_vacation:
-                users_on_vacation.append(request.user)
-                
-        return users_on_vacation
+    def get_occupancy_map(self, start_date, end_date, exclude_user_id=None):
+        """Empleados de vacaciones y plazas libres de cada día del rango"""
+        from services.occupancy import build_occupancy_map
+        return build_occupancy_map(self, start_date, end_date, exclude_user_id)
+    
+    def get_peak_vacation_count(self, start_date, end_date, exclude_user_id=None):
+        """Máximo de empleados de vacaciones a la vez en algún día del rango"""
+        return max(self.get_occupancy_map(start_date, end_date, exclude_user_id)['occupancy'], default=0)
     
     def can_approve_vacation(self, start_date, end_date, exclude_user_id=None):
         """Verificar si se puede aprobar una nueva solicitud de vacaciones"""
-        employees_on_vacation = self.get_employees_on_vacation(start_date, end_date)
-        
-        # Excluir el usuario que está solicitando (para ediciones)
-        if exclude_user_id:
-            employees_on_vacation = [user for user in employees_on_vacation 
-                                   if user.id != exclude_user_id]
-        
-        return len(employees_on_vacation) < self.max_concurrent_vacations
+        # Se compara el pico diario, no todos los que solapan con el rango: dos
+        # personas que se van en semanas distintas no coinciden nunca
+        peak = self.get_peak_vacation_count(start_date, end_date, exclude_user_id)
+        return peak < self.max_concurrent_vacations
     
     def get_available_employees_for_vacation(self, start_date, end_date):
         """Obtener empleados disponibles para vacaciones en un rango de fechas"""
-        all_employees = self.get_employees()
-        employees_on_vacation = self.get_employees_on_vacation(start_date, end_date)
-        
-        available = []
-        for employee in all_employees:
-            if employee not in employees_on_vacation:
-                available.append(employee)
-                
-        return available
+        on_vacation_ids = {user.id for user in self.get_employees_on_vacation(start_date, end_date)}
+        return [employee for employee in self.get_employees() if employee.id not in on_vacation_ids]
     
     def get_vacation_stats(self):
         """Obtener estadísticas de vacaciones del departamento"""
+        return Department.get_stats_for([self])[self.id]
+    
+    @staticmethod
+    def get_stats_for(departments):
+        """Estadísticas de varios departamentos con consultas agrupadas: {department_id: stats}"""
+        from .user import User
         from .request import Request
-        from utils import get_canary_time
+        from utils import period_filter
         
-        current_year = get_canary_time().year
+        stats = {department.id: {
+            'department_id': department.id,
+            'department_name': department.name,
+            'total_requests': 0,
+            'approved_requests': 0,
+            'pending_requests': 0,
+            'employees_count': 0,
+            'employees_on_vacation': [],
+            'employees_on_vacation_count': 0,
+            'can_approve_more': True
+        } for department in departments}
+        if not stats:
+            return stats
         
-        total_requests = Request.query.filter(
-            Request.user_id.in_([user.id for user in self.get_employees()]),
+        department_ids = list(stats)
+        is_employee = (User.department_id.in_(department_ids), User.role == 'employee', User.is_active == True)
+        
+        # Solicitudes creadas en el año de vacaciones en curso de cada departamento; los
+        # departamentos con el mismo periodo comparten condición
+        periods = {}
+        for department in departments:
+            bounds = department.get_vacation_period(department.get_current_vacation_year())
+            periods.setdefault(bounds, []).append(department.id)
+        in_current_year = db.or_(*[
+            db.and_(User.department_id.in_(ids), period_filter(Request.created_at, *bounds))
+            for bounds, ids in periods.items()
+        ])
+        
+        # Una consulta agrupada por departamento y estado
+        for department_id, status, count in db.session.query(
+            User.department_id, Request.status, db.func.count(Request.id)
+        ).join(User, User.id == Request.user_id).filter(
             Request.type == 'vacation',
-            db.extract('year', Request.created_at) == current_year
-        ).count()
+            in_current_year,
+            *is_employee
+        ).group_by(User.department_id, Request.status).all():
+            stats[department_id]['total_requests'] += count
+            if status in ('approved', 'pending'):
+                stats[department_id][f'{status}_requests'] = count
         
-        approved_requests = Request.query.filter(
-            Request.user_id.in_([user.id for user in self.get_employees()]),
+        for department_id, count in db.session.query(
+            User.department_id, db.func.count(User.id)
+        ).filter(*is_employee).group_by(User.department_id).all():
+            stats[department_id]['employees_count'] = count
+        
+        # Empleados de vacaciones hoy (mismo criterio que get_employees_on_vacation)
+        today = date.today()
+        for department_id, name in db.session.query(User.department_id, User.name).join(
+            Request, Request.user_id == User.id
+        ).filter(
             Request.type == 'vacation',
             Request.status == 'approved',
-            db.extract('year', Request.created_at) == current_year
-        ).count()
+            Request.start_date <= today,
+            Request.end_date >= today,
+            *is_employee
+        ).distinct().order_by(User.name).all():
+            stats[department_id]['employees_on_vacation'].append(name)
         
-        pending_requests = Request.query.filter(
-            Request.user_id.in_([user.id for user in self.get_employees()]),
-            Request.type == 'vacation',
-            Request.status == 'pending',
-            db.extract('year', Request.created_at) == current_year
-        ).count()
+        for department in departments:
+            department_stats = stats[department.id]
+            department_stats['employees_on_vacation_count'] = len(department_stats['employees_on_vacation'])
+            # Para un solo día, el pico de ocupación es el número de ausentes de hoy
+            department_stats['can_approve_more'] = department_stats['employees_on_vacation_count'] < department.max_concurrent_vacations
         
-        return {
-            'total_requests': total_requests,
-            'approved_requests': approved_requests,
-            'pending_requests': pending_requests,
-            'employees_count': len(self.get_employees())
-        }
+        return stats
     
     # ============================================================================
     # NUEVOS MÉTODOS PARA GESTIÓN
     # ============================================================================
     
-    def update_details(self, name=None, max_concurrent=None, vacation_days=None):
+    def update_details(self, name=None, max_concurrent=None, vacation_days=None, year_start_month=None):
         """Actualizar detalles del departamento"""
         if name and name != self.name:
             # Verificar que no exista otro departamento con ese nombre
@@ -136,6 +215,11 @@ class Department(db.Model):
                 return False, "Los días de vacaciones no pueden superar 50 por año"
             self.vacation_days_per_year = vacation_days
         
+        if year_start_month is not None:
+            if not 1 <= year_start_month <= 12:
+                return False, "El mes de inicio del año de vacaciones debe estar entre 1 y 12"
+            self.vacation_year_start_month = year_start_month
+        
         try:
             db.session.commit()
             return True, "Departamento actualizado correctamente"
@@ -145,14 +229,15 @@ class Department(db.Model):
     
     def can_be_deleted(self):
         """Verificar si el departamento puede ser eliminado"""
-        active_employees = len(self.get_employees())
+        active_employees = self.get_employees_count()
         if active_employees > 0:
             return False, f"No se puede eliminar: tiene {active_employees} empleado(s) activo(s)"
         
         # Verificar si hay solicitudes asociadas
         from .request import Request
+        from .user import User
         requests_count = Request.query.filter(
-            Request.user_id.in_([user.id for user in self.users])
+            Request.user_id.in_(db.session.query(User.id).filter(User.department_id == self.id))
         ).count()
         
         if requests_count > 0:
@@ -175,7 +260,7 @@ class Department(db.Model):
             return False, f"Error al eliminar: {str(e)}"
     
     @staticmethod
-    def create_department(name, max_concurrent=1, vacation_days=22):
+    def create_department(name, max_concurrent=1, vacation_days=22, year_start_month=1):
         """Crear nuevo departamento"""
         # Verificar que no exista
         existing = Department.query.filter_by(name=name).first()
@@ -189,11 +274,15 @@ class Department(db.Model):
         if vacation_days < 0 or vacation_days > 50:
             return None, "Los días de vacaciones deben estar entre 0 y 50"
         
+        if not 1 <= year_start_month <= 12:
+            return None, "El mes de inicio del año de vacaciones debe estar entre 1 y 12"
+        
         try:
             department = Department(
                 name=name,
                 max_concurrent_vacations=max_concurrent,
-                vacation_days_per_year=vacation_days
+                vacation_days_per_year=vacation_days,
+                vacation_year_start_month=year_start_month
             )
             db.session.add(department)
             db.session.commit()
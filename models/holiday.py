@@ -1,8 +1,15 @@
 from . import db
-from utils import get_canary_time
+from utils import get_canary_time, get_period_bounds, period_filter, keyset_page
 from datetime import date
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import object_session
+from sqlalchemy.orm.attributes import set_committed_value
 from .request import Request
 
+# Festivo disponible para recuperar: aprobado y sin recuperación pendiente ni aprobada.
+# Se usa como texto literal para que SQLite reconozca el índice parcial en las consultas.
+AVAILABLE_FOR_RECOVERY_SQL = "status = 'approved' AND (recovery_status IS NULL OR recovery_status = 'rejected')"
+
 class WorkedHoliday(db.Model):
     __tablename__ = 'worked_holidays'
     
@@ -14,6 +21,8 @@ class WorkedHoliday(db.Model):
     approved_by = db.Column(db.Integer, db.ForeignKey('users.id'))
     created_at = db.Column(db.DateTime, default=get_canary_time, nullable=False)
     approved_at = db.Column(db.DateTime)
+    # Estado de la recuperación más reciente (None si nunca se ha pedido); lo mantienen los eventos de Request
+    recovery_status = db.Column(db.String(20))
     
     # Relación con el aprobador (sin backref para evitar conflictos)
     approver = db.relationship('User', foreign_keys=[approved_by])
@@ -25,8 +34,17 @@ class WorkedHoliday(db.Model):
                                       lazy=True,
                                       cascade='all, delete-orphan')
     
-    # Constraint para evitar duplicados
-    __table_args__ = (db.UniqueConstraint('user_id', 'date', name='unique_user_holiday'),)
+    # Constraint para evitar duplicados; índice para el listado paginado del admin
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'date', name='unique_user_holiday'),
+        db.Index('ix_worked_holidays_status_date_id', 'status', 'date', 'id'),
+        # Índice parcial: solo los festivos disponibles para recuperar
+        db.Index('ix_worked_holidays_available', 'user_id', 'date',
+                 sqlite_where=db.text(AVAILABLE_FOR_RECOVERY_SQL),
+                 postgresql_where=db.text(AVAILABLE_FOR_RECOVERY_SQL)),
+        # Festivos de un empleado por estado (pendientes de aprobación, contadores)
+        db.Index('ix_worked_holidays_user_id_status', 'user_id', 'status'),
+    )
     
     def __repr__(self):
         return f'<WorkedHoliday {self.user.name} {self.date}>'
@@ -70,12 +88,11 @@ class WorkedHoliday(db.Model):
         self.approved_by = admin_user.id
         
         try:
-            db.session.commit()
-            
-            # Crear notificación para el usuario
+            # Notificación al usuario vía outbox: mismo commit que el cambio de estado
             from .notification import Notification
-            notification = Notification.create_for_user_holiday_response(self)
-            db.session.add(notification)
+            from .outbox import OutboxEvent
+            OutboxEvent.enqueue_notification(Notification.create_for_user_holiday_response(self))
+            
             db.session.commit()
             
             return True, "Festivo aprobado correctamente."
@@ -99,12 +116,11 @@ class WorkedHoliday(db.Model):
             self.description = f"{self.description or ''}\n\nMotivo del rechazo: {reason}".strip()
         
         try:
-            db.session.commit()
-            
-            # Crear notificación para el usuario
+            # Notificación al usuario vía outbox: mismo commit que el cambio de estado
             from .notification import Notification
-            notification = Notification.create_for_user_holiday_rejection(self)
-            db.session.add(notification)
+            from .outbox import OutboxEvent
+            OutboxEvent.enqueue_notification(Notification.create_for_user_holiday_rejection(self))
+            
             db.session.commit()
             
             return True, "Festivo rechazado correctamente."
@@ -147,43 +163,33 @@ class WorkedHoliday(db.Model):
         }
         return status_text.get(self.status, 'Desconocido')
     
-    # En models/holiday.py - Reemplazar el método is_available_for_recovery():
     def is_available_for_recovery(self):
         """Verificar si está disponible para recuperación"""
         if self.status != 'approved':
             return False, "El festivo debe estar aprobado para solicitar recuperación."
         
-        # Usar la relación directa en lugar de buscar por texto
-        recovery_status, recovery_request = self.get_recovery_status()
-        
-        if recovery_status == 'approved':
+        if self.recovery_status == 'approved':
             return False, "Este festivo ya ha sido usado para una recuperación aprobada."
-        elif recovery_status == 'pending':
+        elif self.recovery_status == 'pending':
             return False, "Ya tienes una recuperación pendiente para este festivo."
-        # Si recovery_status == 'rejected' o None, está disponible
+        # Si la recuperación fue rechazada o no existe, está disponible
         else:
             return True, "Disponible para recuperación"
 
-        def has_pending_or_approved_recovery(self):
-            """Verificar si tiene recuperación o está completado"""
-            recovery_status, _ = self.get_recovery_status()
-            return recovery_status is not None
-# En models/holiday.py - Reemplazar el método get_recovery_status():
-
-# REEMPLAZAR temporalmente en models/holiday.py
+    def has_pending_or_approved_recovery(self):
+        """Verificar si tiene recuperación o está completado"""
+        return self.recovery_status in ['pending', 'approved']
 
     def get_recovery_status(self):
-        """Obtener el estado de la recuperación más reciente"""
+        """Obtener el estado de la recuperación más reciente y la solicitud"""
+        if not self.recovery_status:
+            return None, None
         
-        # Hacer una query real en lugar de usar la lista
         latest_recovery = Request.query.filter_by(
             worked_holiday_id=self.id
-        ).order_by(Request.created_at.desc()).first()
-        
-        if latest_recovery:
-            return latest_recovery.status, latest_recovery
+        ).order_by(Request.created_at.desc(), Request.id.desc()).first()
         
-        return None, None
+        return self.recovery_status, latest_recovery
 
     def create_recovery_request(self, recovery_date, reason=None):
         """Crear una solicitud de recuperación usando este festivo"""
@@ -228,4 +234,163 @@ class WorkedHoliday(db.Model):
             f"Día de Canarias ({current_year}-05-30)",
         ]
         
-        return common_holidays
\ No newline at end of file
+        return common_holidays
+    
+    @staticmethod
+    def _filter_admin_query(query, department_id=None, user_id=None, year=None):
+        """Aplicar los filtros comunes del listado de festivos (admin)"""
+        from .user import User
+        
+        if user_id:
+            query = query.filter(WorkedHoliday.user_id == user_id)
+        if department_id:
+            query = query.filter(WorkedHoliday.user_id.in_(
+                db.session.query(User.id).filter(User.department_id == department_id)
+            ))
+        if year:
+            # Rango de fechas en lugar de extract('year') para poder usar el índice
+            query = query.filter(period_filter(WorkedHoliday.date, *get_period_bounds(year)))
+        return query
+    
+    @staticmethod
+    def get_admin_page(statuses=None, department_id=None, user_id=None, year=None, cursor=None, limit=50):
+        """Página de festivos para admin (más recientes primero) con paginación por cursor"""
+        from sqlalchemy.orm import joinedload
+        from .user import User
+        
+        # Empleado, departamento y aprobador en la misma consulta: la plantilla los usa en cada fila
+        query = WorkedHoliday.query.options(
+            joinedload(WorkedHoliday.user).joinedload(User.department),
+            joinedload(WorkedHoliday.approver)
+        )
+        
+        if statuses:
+            query = query.filter(WorkedHoliday.status.in_(statuses))
+        query = WorkedHoliday._filter_admin_query(query, department_id, user_id, year)
+        
+        return keyset_page(query, WorkedHoliday.date, WorkedHoliday.id, cursor, limit)
+    
+    @staticmethod
+    def get_status_counts(department_id=None, user_id=None, year=None):
+        """Número de festivos por estado con los mismos filtros del listado (una consulta)"""
+        query = db.session.query(WorkedHoliday.status, db.func.count(WorkedHoliday.id))
+        query = WorkedHoliday._filter_admin_query(query, department_id, user_id, year)
+        
+        counts = {'pending': 0, 'approved': 0, 'rejected': 0}
+        counts.update(dict(query.group_by(WorkedHoliday.status).all()))
+        return counts
+
+    @staticmethod
+    def available_filter():
+        """Condición SQL de festivo disponible para recuperación (coincide con el índice parcial)"""
+        return db.text(AVAILABLE_FOR_RECOVERY_SQL)
+    
+    @staticmethod
+    def get_available_query(user_id):
+        """Festivos disponibles para recuperación de un usuario, del más antiguo al más reciente"""
+        return WorkedHoliday.query.filter(
+            WorkedHoliday.user_id == user_id,
+            WorkedHoliday.available_filter()
+        ).order_by(WorkedHoliday.date.asc(), WorkedHoliday.id.asc())
+    
+    @staticmethod
+    def get_available_counts():
+        """Número de festivos disponibles para recuperación por usuario"""
+        return dict(db.session.query(
+            WorkedHoliday.user_id,
+            db.func.count(WorkedHoliday.id)
+        ).filter(
+            WorkedHoliday.available_filter()
+        ).group_by(WorkedHoliday.user_id).all())
+    
+    @staticmethod
+    def get_latest_recoveries(holiday_ids):
+        """Última solicitud de recuperación de cada festivo como {holiday_id: Request} (una consulta)"""
+        if not holiday_ids:
+            return {}
+        
+        latest = {}
+        recoveries = Request.query.filter(
+            Request.worked_holiday_id.in_(holiday_ids)
+        ).order_by(Request.created_at.asc(), Request.id.asc()).all()
+        for recovery in recoveries:
+            latest[recovery.worked_holiday_id] = recovery
+        return latest
+    
+    @staticmethod
+    def _latest_recovery_status_query(holiday_id_column):
+        """Subconsulta con el estado de la recuperación más reciente de un festivo"""
+        requests_table = Request.__table__
+        return db.select(requests_table.c.status).where(
+            requests_table.c.worked_holiday_id == holiday_id_column
+        ).order_by(
+            requests_table.c.created_at.desc(),
+            requests_table.c.id.desc()
+        ).limit(1).scalar_subquery()
+    
+    @staticmethod
+    def sync_recovery_status(connection, holiday_id):
+        """Recalcular recovery_status de un festivo desde sus solicitudes (sin commit)"""
+        holidays_table = WorkedHoliday.__table__
+        status = connection.execute(
+            db.select(WorkedHoliday._latest_recovery_status_query(holiday_id))
+        ).scalar()
+        connection.execute(
+            holidays_table.update()
+            .where(holidays_table.c.id == holiday_id)
+            .values(recovery_status=status)
+        )
+        return status
+    
+    @staticmethod
+    def rebuild_recovery_status():
+        """Recalcular recovery_status de todos los festivos y devolver los que no cuadraban"""
+        holidays_table = WorkedHoliday.__table__
+        latest = WorkedHoliday._latest_recovery_status_query(holidays_table.c.id)
+        
+        drift = [{
+            'holiday_id': holiday_id,
+            'cached': cached,
+            'real': real
+        } for holiday_id, cached, real in db.session.execute(
+            db.select(holidays_table.c.id, holidays_table.c.recovery_status, latest)
+        ).all() if cached != real]
+        
+        if drift:
+            db.session.execute(holidays_table.update().values(recovery_status=latest))
+            db.session.commit()
+        
+        return drift
+
+def _sync_holidays(session, connection, holiday_ids):
+    """Recalcular recovery_status de los festivos y reflejarlo en las instancias cargadas"""
+    for holiday_id in holiday_ids:
+        if not holiday_id:
+            continue
+        
+        status = WorkedHoliday.sync_recovery_status(connection, holiday_id)
+        
+        holiday = session.identity_map.get(
+            inspect(WorkedHoliday).identity_key_from_primary_key((holiday_id,))
+        ) if session else None
+        if holiday is not None:
+            set_committed_value(holiday, 'recovery_status', status)
+
+@event.listens_for(Request, 'after_insert')
+@event.listens_for(Request, 'after_delete')
+def _sync_on_insert_or_delete(mapper, connection, target):
+    """Crear o borrar una recuperación cambia el estado de su festivo"""
+    _sync_holidays(object_session(target), connection, {target.worked_holiday_id})
+
+@event.listens_for(Request, 'after_update')
+def _sync_on_update(mapper, connection, target):
+    """Aprobar, rechazar o reasignar una recuperación cambia el estado de su festivo"""
+    state = inspect(target)
+    holiday_history = state.attrs.worked_holiday_id.history
+    
+    if not (holiday_history.has_changes() or
+            state.attrs.status.history.has_changes() or
+            state.attrs.created_at.history.has_changes()):
+        return
+    
+    _sync_holidays(object_session(target), connection, {target.worked_holiday_id, *holiday_history.deleted})
@@ -1,5 +1,6 @@
 from . import db
 from utils import get_canary_time
+from sqlalchemy import event
 
 class Notification(db.Model):
     __tablename__ = 'notifications'
@@ -19,14 +20,27 @@ class Notification(db.Model):
     # Relación con el usuario
     user = db.relationship('User', backref='notifications')
     
+    # Notificaciones de un usuario (no leídas primero) en orden cronológico
+    __table_args__ = (
+        db.Index('ix_notifications_user_id_is_read_created_at', 'user_id', 'is_read', 'created_at'),
+    )
+    
     def __repr__(self):
         return f'<Notification {self.type} for {self.user.name}>'
     
     def mark_as_read(self):
         """Marcar notificación como leída"""
+        if self.is_read:
+            return True
+        
         self.is_read = True
         try:
+            Notification.adjust_unread_count(db.session, self.user_id, -1)
             db.session.commit()
+            
+            # Avisar a las pestañas abiertas del usuario del nuevo contador
+            from services.notification_bus import publish
+            publish(self.user_id, 'unread', {'count': Notification.get_unread_count_for_user(self.user_id)})
             return True
         except Exception as e:
             db.session.rollback()
@@ -60,46 +74,36 @@ class Notification(db.Model):
     
     @staticmethod
     def create_for_admin_request(request_obj):
-        """Crear notificación para admin sobre nueva solicitud"""
+        """Crear notificación para admin sobre nueva solicitud (un INSERT para todos, sin commit)"""
         from .user import User
+        from services.notification_dispatch import notify_admins
         
-        # Obtener todos los administradores
-        admins = User.query.filter_by(role='admin', is_active=True).all()
-        
-        notifications = []
-        for admin in admins:
-            notification = Notification(
-                user_id=admin.id,
-                type='request_pending',
-                title=f'Nueva solicitud de {request_obj.get_type_text().lower()}',
-                message=f'{request_obj.user.name} ha solicitado {request_obj.get_type_text().lower()} del {request_obj.start_date} al {request_obj.end_date}',
-                related_type='request',
-                related_id=request_obj.id
-            )
-            notifications.append(notification)
+        # El solicitante suele estar ya en la sesión: get() no lanza consulta
+        user = db.session.get(User, request_obj.user_id)
         
-        return notifications
+        return notify_admins(
+            type='request_pending',
+            title=f'Nueva solicitud de {request_obj.get_type_text().lower()}',
+            message=f'{user.name} ha solicitado {request_obj.get_type_text().lower()} del {request_obj.start_date} al {request_obj.end_date}',
+            related_type='request',
+            related_id=request_obj.id
+        )
     
     @staticmethod
     def create_for_admin_holiday(holiday_obj):
-        """Crear notificación para admin sobre festivo trabajado"""
+        """Crear notificación para admin sobre festivo trabajado (un INSERT para todos, sin commit)"""
         from .user import User
+        from services.notification_dispatch import notify_admins
         
-        admins = User.query.filter_by(role='admin', is_active=True).all()
-        
-        notifications = []
-        for admin in admins:
-            notification = Notification(
-                user_id=admin.id,
-                type='holiday_pending',
-                title='Nuevo festivo trabajado',
-                message=f'{holiday_obj.user.name} marcó como trabajado el festivo del {holiday_obj.date}',
-                related_type='holiday',
-                related_id=holiday_obj.id
-            )
-            notifications.append(notification)
+        user = db.session.get(User, holiday_obj.user_id)
         
-        return notifications
+        return notify_admins(
+            type='holiday_pending',
+            title='Nuevo festivo trabajado',
+            message=f'{user.name} marcó como trabajado el festivo del {holiday_obj.date}',
+            related_type='holiday',
+            related_id=holiday_obj.id
+        )
     
     @staticmethod
     def create_for_user_request_response(request_obj):
@@ -151,7 +155,11 @@ class Notification(db.Model):
         """Marcar todas las notificaciones de un usuario como leídas"""
         try:
             Notification.query.filter_by(user_id=user_id, is_read=False).update({'is_read': True})
+            Notification.set_unread_count(db.session, user_id, 0)
             db.session.commit()
+            
+            from services.notification_bus import publish
+            publish(user_id, 'unread', {'count': 0})
             return True
         except Exception as e:
             db.session.rollback()
@@ -159,12 +167,73 @@ class Notification(db.Model):
     
     @staticmethod
     def get_unread_count_for_user(user_id):
-        """Obtener número de notificaciones no leídas para un usuario"""
-        return Notification.query.filter_by(user_id=user_id, is_read=False).count()
+        """Obtener número de notificaciones no leídas para un usuario (lectura de una fila)"""
+        from .user import User
+        count = db.session.query(User.unread_notifications).filter(User.id == user_id).scalar()
+        return count or 0
+    
+    @staticmethod
+    def adjust_unread_count(connection, user_ids, delta):
+        """Sumar delta al contador de no leídas de uno o varios usuarios (UPDATE atómico)"""
+        from .user import User
+        
+        if isinstance(user_ids, int):
+            user_ids = [user_ids]
+        if not user_ids:
+            return
+        
+        users = User.__table__
+        query = users.update().where(users.c.id.in_(user_ids))
+        if delta < 0:
+            query = query.where(users.c.unread_notifications + delta >= 0)
+        
+        # Se conserva updated_at: el contador no es un cambio del perfil
+        connection.execute(query.values(
+            unread_notifications=users.c.unread_notifications + delta,
+            updated_at=users.c.updated_at
+        ))
+    
+    @staticmethod
+    def set_unread_count(connection, user_id, count):
+        """Fijar el contador de no leídas de un usuario"""
+        from .user import User
+        users = User.__table__
+        connection.execute(users.update().where(users.c.id == user_id).values(
+            unread_notifications=count,
+            updated_at=users.c.updated_at
+        ))
+    
+    @staticmethod
+    def reconcile_unread_counts():
+        """Recalcular los contadores de no leídas desde la tabla de notificaciones y devolver las diferencias"""
+        from .user import User
+        from sqlalchemy import func
+        
+        real_counts = dict(db.session.query(
+            Notification.user_id,
+            func.count(Notification.id)
+        ).filter(Notification.is_read == False).group_by(Notification.user_id).all())
+        
+        drift = []
+        for user_id, cached in db.session.query(User.id, User.unread_notifications).all():
+            expected = real_counts.get(user_id, 0)
+            if cached != expected:
+                drift.append({'user_id': user_id, 'cached': cached, 'real': expected})
+                Notification.set_unread_count(db.session, user_id, expected)
+        
+        db.session.commit()
+        return drift
     
     @staticmethod
     def get_recent_for_user(user_id, limit=10):
         """Obtener notificaciones recientes para un usuario"""
         return Notification.query.filter_by(user_id=user_id)\
                                 .order_by(Notification.created_at.desc())\
-                                .limit(limit).all()
\ No newline at end of file
+                                .limit(limit).all()
+
+
+@event.listens_for(Notification, 'after_insert')
+def _increment_unread_count(mapper, connection, target):
+    """Mantener el contador del usuario en la misma transacción que crea la notificación"""
+    if not target.is_read:
+        Notification.adjust_unread_count(connection, target.user_id, 1)
@@ -0,0 +1,74 @@
+from . import db
+from utils import get_canary_time
+from datetime import timedelta
+import json
+
+class OutboxEvent(db.Model):
+    __tablename__ = 'outbox_events'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(30), nullable=False)  # 'notification' (en el futuro: 'email', 'webhook')
+    payload = db.Column(db.Text, nullable=False)  # JSON con los datos del efecto
+    status = db.Column(db.String(20), default='pending', nullable=False)  # 'pending', 'delivered', 'failed'
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    available_at = db.Column(db.DateTime, default=get_canary_time, nullable=False)  # No entregar antes de esta hora (reintentos)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=get_canary_time, nullable=False)
+    delivered_at = db.Column(db.DateTime)
+    
+    # El worker busca eventos pendientes cuya hora ya ha llegado, en orden de llegada
+    __table_args__ = (
+        db.Index('ix_outbox_events_status_available_at_id', 'status', 'available_at', 'id'),
+    )
+    
+    # Reintentos antes de dar un evento por fallido
+    MAX_ATTEMPTS = 8
+    
+    def __repr__(self):
+        return f'<OutboxEvent {self.kind} {self.status}>'
+    
+    def get_payload(self):
+        """Obtener los datos del evento como diccionario"""
+        return json.loads(self.payload)
+    
+    def schedule_retry(self, error):
+        """Registrar un fallo de entrega y programar el siguiente intento (sin commit)"""
+        self.attempts += 1
+        self.last_error = error
+        
+        if self.attempts >= OutboxEvent.MAX_ATTEMPTS:
+            self.status = 'failed'
+        else:
+            # Espera exponencial: 10s, 20s, 40s... con un máximo de una hora
+            delay = min(10 * 2 ** (self.attempts - 1), 3600)
+            self.available_at = get_canary_time() + timedelta(seconds=delay)
+    
+    @staticmethod
+    def enqueue(kind, payload):
+        """Añadir un efecto secundario al outbox en la transacción actual (sin commit)"""
+        event = OutboxEvent(kind=kind, payload=json.dumps(payload))
+        db.session.add(event)
+        
+        # Avisar al worker cuando se confirme la transacción
+        db.session.info['outbox_pending'] = True
+        return event
+    
+    @staticmethod
+    def enqueue_notification(notification):
+        """Encolar la entrega de una notificación construida con las factorías de Notification"""
+        return OutboxEvent.enqueue('notification', {
+            'user_id': notification.user_id,
+            'type': notification.type,
+            'title': notification.title,
+            'message': notification.message,
+            'related_type': notification.related_type,
+            'related_id': notification.related_id
+        })
+    
+    @staticmethod
+    def get_due_ids(limit=100):
+        """Ids de los eventos pendientes listos para entregar, en orden de llegada"""
+        return [event_id for (event_id,) in db.session.query(OutboxEvent.id).filter(
+            OutboxEvent.status == 'pending',
+            OutboxEvent.available_at <= get_canary_time()
+        ).order_by(OutboxEvent.id).limit(limit).all()]
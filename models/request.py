@@ -1,5 +1,5 @@
 from . import db
-from utils import get_canary_time, calculate_vacation_days, validate_date_range
+from utils import get_canary_time, calculate_vacation_days, validate_date_range, keyset_page
 from datetime import date
 from . import User
 
@@ -16,6 +16,7 @@ class Request(db.Model):
     created_at = db.Column(db.DateTime, default=get_canary_time, nullable=False)
     reviewed_at = db.Column(db.DateTime)
     reviewed_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    updated_at = db.Column(db.DateTime, default=get_canary_time, onupdate=get_canary_time)
     
     # 🆕 NUEVA COLUMNA: Relación con festivo trabajado (solo para recuperaciones)
     worked_holiday_id = db.Column(db.Integer, db.ForeignKey('worked_holidays.id'), nullable=True)
@@ -25,6 +26,22 @@ class Request(db.Model):
     
     # 🆕 La relación worked_holiday se define en WorkedHoliday con backref
     
+    # Índice para las consultas de ocupación por fechas (vacaciones aprobadas en un rango)
+    __table_args__ = (
+        db.Index('ix_requests_type_status_dates', 'type', 'status', 'start_date', 'end_date'),
+        # Paginación por cursor del listado de admin, ordenado por (created_at, id)
+        db.Index('ix_requests_created_at_id', 'created_at', 'id'),
+        db.Index('ix_requests_status_created_at_id', 'status', 'created_at', 'id'),
+        # Solicitudes de un empleado por estado (solapamientos, pendientes, historial)
+        db.Index('ix_requests_user_id_status', 'user_id', 'status'),
+        # Solicitudes de cualquier tipo por estado que solapan con un rango (calendario)
+        db.Index('ix_requests_status_dates', 'status', 'start_date', 'end_date'),
+        # Recuperaciones de un festivo trabajado
+        db.Index('ix_requests_worked_holiday_id', 'worked_holiday_id'),
+        # Solicitudes de un empleado por tipo en un año de vacaciones (rango sobre start_date)
+        db.Index('ix_requests_user_id_type_start_date', 'user_id', 'type', 'start_date'),
+    )
+    
     def __repr__(self):
         return f'<Request {self.type} {self.user.name} {self.start_date}-{self.end_date}>'
     
@@ -44,9 +61,9 @@ class Request(db.Model):
         if self.type not in ['vacation', 'recovery']:
             errors.append("Tipo de solicitud inválido.")
         
-        # Obtener el usuario directamente desde la base de datos
-        from . import User
-        user = User.query.get(self.user_id)
+        # Reutilizar el usuario ya cargado en la petición (g.user / identity map)
+        from services.identity import get_user
+        user = get_user(self.user_id)
         if not user:
             errors.append("Usuario no encontrado.")
             return errors
@@ -85,7 +102,8 @@ class Request(db.Model):
         # Solo validar fechas básicas y disponibilidad de departamento para vacaciones
         if self.type == 'vacation':
             
-            user = User.query.get(self.user_id)
+            from services.identity import get_user
+            user = get_user(self.user_id)
             
             would_exceed, excess_days, details = user.would_exceed_vacation_days(self.start_date, self.end_date)
             if would_exceed:
@@ -104,32 +122,8 @@ class Request(db.Model):
                 else:
                     return False, [f"No se puede aprobar: Ya hay {user.department.max_concurrent_vacations} empleado(s) de vacaciones en esas fechas en el departamento {user.department.name}."]
         
-        self.status = 'approved'
-        self.reviewed_at = get_canary_time()
-        self.reviewed_by = admin_user.id
-        
         try:
-            # NUEVO: Si son vacaciones, insertamos el gasto en el Libro Mayor
-            if self.type == 'vacation':
-                from models.transaction import VacationTransaction
-                days_to_deduct = self.calculate_days()
-                
-                # Crear la transacción en negativo
-                tx = VacationTransaction(
-                    user_id=self.user_id,
-                    year=self.start_date.year,
-                    days=-days_to_deduct,  # El menos indica que es un gasto
-                    transaction_type='vacation_consumed',
-                    description=f'Vacaciones del {self.start_date.strftime("%d/%m/%Y")} al {self.end_date.strftime("%d/%m/%Y")}'
-                )
-                db.session.add(tx)
-
-            db.session.commit()
-            
-            # Crear notificación para el usuario
-            from .notification import Notification
-            notification = Notification.create_for_user_request_response(self)
-            db.session.add(notification)
+            self.apply_approval(admin_user)
             db.session.commit()
             
             return True, "Solicitud aprobada correctamente."
@@ -139,20 +133,8 @@ class Request(db.Model):
     
     def reject(self, admin_user, reason=None):
         """Rechazar la solicitud"""
-        self.status = 'rejected'
-        self.reviewed_at = get_canary_time()
-        self.reviewed_by = admin_user.id
-        
-        if reason:
-            self.reason = f"{self.reason or ''}\n\nMotivo del rechazo: {reason}".strip()
-        
         try:
-            db.session.commit()
-            
-            # Crear notificación para el usuario
-            from .notification import Notification
-            notification = Notification.create_for_user_request_response(self)
-            db.session.add(notification)
+            self.apply_rejection(admin_user, reason)
             db.session.commit()
             
             return True, "Solicitud rechazada correctamente."
@@ -160,6 +142,45 @@ class Request(db.Model):
             db.session.rollback()
             return False, f"Error al rechazar la solicitud: {str(e)}"
     
+    def apply_approval(self, admin_user):
+        """Marcar como aprobada, apuntar el gasto y encolar la notificación (sin commit ni validaciones)"""
+        self.status = 'approved'
+        self.reviewed_at = get_canary_time()
+        self.reviewed_by = admin_user.id
+        
+        # Si son vacaciones, insertamos el gasto en el Libro Mayor
+        if self.type == 'vacation':
+            from models.transaction import VacationTransaction
+            days_to_deduct = self.calculate_days()
+            
+            # Crear la transacción en negativo (actualiza también el saldo) en el año de
+            # vacaciones del departamento en que empiezan
+            VacationTransaction.record(
+                user_id=self.user_id,
+                year=self.user.get_vacation_year(self.start_date),
+                days=-days_to_deduct,  # El menos indica que es un gasto
+                transaction_type='vacation_consumed',
+                description=f'Vacaciones del {self.start_date.strftime("%d/%m/%Y")} al {self.end_date.strftime("%d/%m/%Y")}'
+            )
+        
+        # Notificación al usuario vía outbox: mismo commit que el cambio de estado
+        from .notification import Notification
+        from .outbox import OutboxEvent
+        OutboxEvent.enqueue_notification(Notification.create_for_user_request_response(self))
+    
+    def apply_rejection(self, admin_user, reason=None):
+        """Marcar como rechazada y encolar la notificación (sin commit)"""
+        self.status = 'rejected'
+        self.reviewed_at = get_canary_time()
+        self.reviewed_by = admin_user.id
+        
+        if reason:
+            self.reason = f"{self.reason or ''}\n\nMotivo del rechazo: {reason}".strip()
+        
+        from .notification import Notification
+        from .outbox import OutboxEvent
+        OutboxEvent.enqueue_notification(Notification.create_for_user_request_response(self))
+    
     def cancel(self):
         """Cancelar la solicitud (solo si está pendiente)"""
         if self.status != 'pending':
@@ -246,8 +267,8 @@ class Request(db.Model):
         if any(kwargs.get(field) != old_values[field] for field in ['start_date', 'end_date', 'type']):
             if self.status == 'approved' and self.type == 'vacation':
                 # Validar disponibilidad del departamento con el cambio
-                from . import User
-                user = User.query.get(self.user_id)
+                from services.identity import get_user
+                user = get_user(self.user_id)
                 if not user.department.can_approve_vacation(self.start_date, self.end_date, self.user_id):
                     return False, f"Las nuevas fechas chocan con vacaciones en {user.department.name}"
         
@@ -275,18 +296,47 @@ class Request(db.Model):
                 from models.transaction import VacationTransaction
                 days_to_refund = self.calculate_days()
                 
-                refund_tx = VacationTransaction(
+                VacationTransaction.record(
                     user_id=self.user_id,
-                    year=self.start_date.year,
+                    year=self.user.get_vacation_year(self.start_date),
                     days=days_to_refund,  # En positivo porque es una devolución
                     transaction_type='vacation_refund',
                     description=f'Devolución por cancelación de vacaciones ({self.start_date.strftime("%d/%m/%Y")})'
                 )
-                db.session.add(refund_tx)
 
             db.session.delete(self)
             db.session.commit()
             return True, "Solicitud eliminada correctamente."
         except Exception as e:
             db.session.rollback()
-            return False, f"Error al eliminar: {str(e)}"
\ No newline at end of file
+            return False, f"Error al eliminar: {str(e)}"
+    
+    @staticmethod
+    def get_admin_page(statuses=None, type=None, department_id=None, user_id=None,
+                       date_from=None, date_to=None, cursor=None, limit=50):
+        """Página de solicitudes para admin (más recientes primero) con paginación por cursor"""
+        from sqlalchemy.orm import joinedload
+        
+        # Usuario, departamento y revisor en la misma consulta: la plantilla los usa en cada fila
+        query = Request.query.options(
+            joinedload(Request.user).joinedload(User.department),
+            joinedload(Request.reviewer)
+        )
+        
+        if statuses:
+            query = query.filter(Request.status.in_(statuses))
+        if type:
+            query = query.filter(Request.type == type)
+        if user_id:
+            query = query.filter(Request.user_id == user_id)
+        if department_id:
+            query = query.filter(Request.user_id.in_(
+                db.session.query(User.id).filter(User.department_id == department_id)
+            ))
+        if date_from:
+            query = query.filter(Request.end_date >= date_from)
+        if date_to:
+            query = query.filter(Request.start_date <= date_to)
+        
+        return keyset_page(query, Request.created_at, Request.id, cursor, limit)
+        
\ No newline at end of file
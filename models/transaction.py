@@ -12,5 +12,105 @@ class VacationTransaction(db.Model):
     description = db.Column(db.String(255))
     created_at = db.Column(db.DateTime, default=get_canary_time, nullable=False)
     
+    # Apuntes de un usuario y año (historial y recálculo de saldos); como mucho una
+    # carga anual y un arrastre por usuario y año aunque se lancen dos cargas a la vez
+    __table_args__ = (
+        db.Index('ix_vacation_transactions_user_id_year', 'user_id', 'year'),
+        db.Index('unique_user_year_load', 'user_id', 'year', 'transaction_type', unique=True,
+                 sqlite_where=db.text("transaction_type IN ('annual_load', 'carryover')"),
+                 postgresql_where=db.text("transaction_type IN ('annual_load', 'carryover')")),
+    )
+    
+    def __repr__(self):
+        return f'<Transaction {self.days} days for User {self.user_id} ({self.year})>'
+    
+    @staticmethod
+    def record(user_id, year, days, transaction_type, description=None):
+        """Añadir un apunte al libro mayor y actualizar el saldo materializado (sin commit)"""
+        tx = VacationTransaction(
+            user_id=user_id,
+            year=year,
+            days=days,
+            transaction_type=transaction_type,
+            description=description
+        )
+        db.session.add(tx)
+        VacationBalance.apply(user_id, year, days)
+        return tx
+
+
+class VacationBalance(db.Model):
+    """Saldo de vacaciones por usuario y año, mantenido a partir del libro mayor"""
+    __tablename__ = 'vacation_balances'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    days = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=get_canary_time, onupdate=get_canary_time)
+    
     def __repr__(self):
-        return f'<Transaction {self.days} days for User {self.user_id} ({self.year})>'
\ No newline at end of file
+        return f'<VacationBalance {self.days} days for User {self.user_id} ({self.year})>'
+    
+    @staticmethod
+    def get_days(user_id, year):
+        """Obtener el saldo de un usuario y año (búsqueda por clave primaria)"""
+        balance = db.session.get(VacationBalance, (user_id, year))
+        return balance.days if balance else 0
+    
+    @staticmethod
+    def apply(user_id, year, days):
+        """Sumar días al saldo dentro de la transacción actual (sin commit)"""
+        balance = db.session.get(VacationBalance, (user_id, year))
+        
+        if balance is None:
+            balance = VacationBalance(user_id=user_id, year=year, days=days)
+            db.session.add(balance)
+            # Flush para que un segundo apunte en la misma transacción lo encuentre
+            db.session.flush()
+        else:
+            # Incremento en SQL (SET days = days + n) para no pisar escrituras concurrentes;
+            # flush para que un segundo apunte en la misma transacción no sustituya a este
+            balance.days = VacationBalance.days + days
+            db.session.flush()
+        
+        return balance
+    
+    @staticmethod
+    def rebuild():
+        """Recalcular todos los saldos desde el libro mayor y devolver las diferencias encontradas"""
+        from sqlalchemy import func
+        
+        ledger = {
+            (user_id, year): total or 0
+            for user_id, year, total in db.session.query(
+                VacationTransaction.user_id,
+                VacationTransaction.year,
+                func.sum(VacationTransaction.days)
+            ).group_by(VacationTransaction.user_id, VacationTransaction.year).all()
+        }
+        
+        cached = {(b.user_id, b.year): b for b in VacationBalance.query.all()}
+        
+        drift = []
+        for key in set(ledger) | set(cached):
+            expected = ledger.get(key, 0)
+            balance = cached.get(key)
+            actual = balance.days if balance else None
+            
+            if actual == expected:
+                continue
+            
+            drift.append({
+                'user_id': key[0],
+                'year': key[1],
+                'cached': actual,
+                'ledger': expected
+            })
+            
+            if balance is None:
+                db.session.add(VacationBalance(user_id=key[0], year=key[1], days=expected))
+            else:
+                balance.days = expected
+        
+        db.session.commit()
+        return sorted(drift, key=lambda d: (d['user_id'], d['year']))
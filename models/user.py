@@ -1,7 +1,7 @@
 from . import db
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import check_password_hash
 from datetime import date
-from utils import get_canary_time
+from utils import get_canary_time, get_period_bounds, get_period_year, period_filter
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -17,22 +17,35 @@ class User(db.Model):
     vacation_days_override = db.Column(db.Integer, nullable=True)  # Override personalizado de días
     hire_date = db.Column(db.Date, nullable=True)  # Fecha de contratación
     updated_at = db.Column(db.DateTime, default=get_canary_time, onupdate=get_canary_time)
+    unread_notifications = db.Column(db.Integer, default=0, nullable=False)  # Contador desnormalizado de notificaciones sin leer
+    vacation_loaded_year = db.Column(db.Integer, nullable=True)  # Último año con la carga anual hecha (evita consultar el libro mayor)
     
     # Relaciones
     requests = db.relationship('Request', foreign_keys='Request.user_id', backref='user', lazy=True, cascade='all, delete-orphan')
     worked_holidays = db.relationship('WorkedHoliday', foreign_keys='WorkedHoliday.user_id', backref='user', lazy=True, cascade='all, delete-orphan')
     
+    # Plantilla activa de un departamento (get_employees y comprobaciones de ocupación)
+    __table_args__ = (
+        db.Index('ix_users_department_id_role_is_active', 'department_id', 'role', 'is_active'),
+    )
+    
     def __repr__(self):
         return f'<User {self.email}>'
     
     def set_password(self, password):
         """Establecer contraseña hasheada"""
-        self.password_hash = generate_password_hash(password)
+        from services.passwords import hash_password
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
         """Verificar contraseña"""
         return check_password_hash(self.password_hash, password)
     
+    def password_needs_rehash(self):
+        """Si la contraseña se cifró con otro esquema o coste que el configurado"""
+        from services.passwords import needs_rehash
+        return needs_rehash(self.password_hash)
+    
     def is_admin(self):
         """Verificar si el usuario es administrador"""
         return self.role == 'admin'
@@ -47,6 +60,20 @@ class User(db.Model):
         from .request import Request
         return Request.query.filter_by(user_id=self.id, status='pending').all()
     
+    def get_vacation_period(self, year):
+        """Límites [inicio, fin) del año de vacaciones del usuario (el de su departamento)"""
+        if self.department:
+            return self.department.get_vacation_period(year)
+        return get_period_bounds(year)
+    
+    def get_vacation_year(self, on_date=None):
+        """Año de vacaciones (el del libro mayor) de una fecha; sin fecha, el año en curso"""
+        if not on_date:
+            on_date = get_canary_time().date()
+        if self.department:
+            return self.department.get_vacation_year(on_date)
+        return get_period_year(on_date)
+    
     def get_vacation_requests(self, year=None):
         """Obtener solicitudes de vacaciones del usuario"""
         from .request import Request
@@ -54,7 +81,7 @@ class User(db.Model):
         query = Request.query.filter_by(user_id=self.id, type='vacation')
         
         if year:
-            query = query.filter(db.extract('year', Request.start_date) == year)
+            query = query.filter(period_filter(Request.start_date, *self.get_vacation_period(year)))
         
         return query.order_by(Request.created_at.desc()).all()
     
@@ -65,7 +92,7 @@ class User(db.Model):
         query = Request.query.filter_by(user_id=self.id, type='recovery')
         
         if year:
-            query = query.filter(db.extract('year', Request.start_date) == year)
+            query = query.filter(period_filter(Request.start_date, *self.get_vacation_period(year)))
         
         return query.order_by(Request.created_at.desc()).all()
     
@@ -76,7 +103,7 @@ class User(db.Model):
         query = WorkedHoliday.query.filter_by(user_id=self.id)
         
         if year:
-            query = query.filter(db.extract('year', WorkedHoliday.date) == year)
+            query = query.filter(period_filter(WorkedHoliday.date, *self.get_vacation_period(year)))
         
         return query.order_by(WorkedHoliday.date.desc()).all()
     
@@ -103,13 +130,13 @@ class User(db.Model):
         from utils import calculate_vacation_days
         
         if not year:
-            year = get_canary_time().year
+            year = self.get_vacation_year()
         
         approved_requests = Request.query.filter(
             Request.user_id == self.id,
             Request.type == 'vacation',
             Request.status == 'approved',
-            db.extract('year', Request.start_date) == year
+            period_filter(Request.start_date, *self.get_vacation_period(year))
         ).all()
         
         total_days = 0
@@ -119,9 +146,8 @@ class User(db.Model):
         return total_days
     
     def get_notifications_count(self):
-        """Obtener número de notificaciones no leídas"""
-        from .notification import Notification
-        return Notification.get_unread_count_for_user(self.id)
+        """Obtener número de notificaciones no leídas (contador ya cargado con el usuario)"""
+        return self.unread_notifications or 0
     
     def get_recent_notifications(self, limit=10):
         """Obtener notificaciones recientes"""
@@ -156,11 +182,61 @@ class User(db.Model):
         if self.has_overlapping_requests(start_date, end_date, exclude_request_id):
             return False, "Ya tienes una solicitud para fechas que se solapan con estas."
         
-        # Verificar disponibilidad en el departamento
-        if not self.department.can_approve_vacation(start_date, end_date, self.id):
-            return False, f"Ya hay {self.department.max_concurrent_vacations} empleado(s) de vacaciones en esas fechas."
+        # Verificar disponibilidad en el departamento (el mismo mapa de ocupación que el calendario)
+        from services.occupancy import get_full_days
+        full_days = get_full_days(self.department.get_occupancy_map(start_date, end_date, self.id))
+        if full_days:
+            days_text = ', '.join(day.strftime('%d/%m/%Y') for day in full_days[:3])
+            if len(full_days) > 3:
+                days_text += f' y {len(full_days) - 3} más'
+            return False, f"Ya hay {self.department.max_concurrent_vacations} empleado(s) de vacaciones en esas fechas ({days_text})."
         
         return True, ""
+    
+    def get_date_availability(self, start_date, end_date):
+        """Días del rango ocupados por solicitudes propias o sin plaza en el departamento, y saldos por año"""
+        from .request import Request
+        from models.transaction import VacationBalance
+        from services.occupancy import get_full_days
+        from datetime import timedelta
+        
+        # Solicitudes propias pendientes o aprobadas (las mismas que has_overlapping_requests)
+        own_days = set()
+        for request_start, request_end in db.session.query(Request.start_date, Request.end_date).filter(
+            Request.user_id == self.id,
+            Request.status.in_(['pending', 'approved']),
+            Request.start_date <= end_date,
+            Request.end_date >= start_date
+        ).all():
+            day = max(request_start, start_date)
+            while day <= min(request_end, end_date):
+                own_days.add(day)
+                day += timedelta(days=1)
+        
+        # Días sin plaza en el departamento sin contar al propio empleado (como can_request_vacation)
+        capacity_days = set()
+        max_concurrent = None
+        if self.department:
+            occupancy_map = self.department.get_occupancy_map(start_date, end_date, self.id)
+            capacity_days = set(get_full_days(occupancy_map)) - own_days
+            max_concurrent = occupancy_map['max_concurrent']
+        
+        # Años de vacaciones del rango (los del departamento, como el libro mayor)
+        years = range(self.get_vacation_year(start_date), self.get_vacation_year(end_date) + 1)
+        balances = dict(db.session.query(VacationBalance.year, VacationBalance.days).filter(
+            VacationBalance.user_id == self.id,
+            VacationBalance.year.in_(years)
+        ).all())
+        
+        return {
+            'start_date': start_date,
+            'end_date': end_date,
+            'own_days': sorted(own_days),
+            'capacity_days': sorted(capacity_days),
+            'max_concurrent': max_concurrent,
+            'year_start_month': self.department.vacation_year_start_month if self.department else 1,
+            'balances': {year: balances.get(year, 0) for year in years}
+        }
 
 # En models/user.py - Reemplazar el método get_available_holidays_count():
 
@@ -168,20 +244,8 @@ class User(db.Model):
         """Obtener número de festivos aprobados disponibles para recuperación"""
         from .holiday import WorkedHoliday
         
-        # Obtener todos los festivos aprobados
-        approved_holidays = WorkedHoliday.query.filter_by(
-            user_id=self.id, 
-            status='approved'
-        ).all()
-        
-        available_count = 0
-        for holiday in approved_holidays:
-            recovery_status, _ = holiday.get_recovery_status()
-            # Disponible si no tiene recovery activa O si la anterior fue rechazada
-            if not recovery_status or recovery_status == 'rejected':
-                available_count += 1
-        
-        return available_count
+        # Una consulta indexada sobre el estado de recuperación persistido
+        return WorkedHoliday.get_available_query(self.id).count()
 
 
     # Agregar este método en models/user.py después del método get_available_holidays_count() (línea ~280 aprox):
@@ -202,23 +266,15 @@ class User(db.Model):
         from .holiday import WorkedHoliday
         
         # Buscar el primer festivo aprobado sin recuperación
-        approved_holidays = WorkedHoliday.query.filter_by(
-            user_id=self.id, 
-            status='approved'
-        ).all()
-        
-        for holiday in approved_holidays:
-            recovery_status, _ = holiday.get_recovery_status()
-            if not recovery_status:  # Festivo disponible
-                # Marcar como usado añadiendo una nota
-                if holiday.description:
-                    holiday.description += " [USADO PARA RECUPERACIÓN]"
-                else:
-                    holiday.description = "[USADO PARA RECUPERACIÓN]"
-                
-                return holiday
+        holiday = WorkedHoliday.get_available_query(self.id).first()
+        if holiday:
+            # Marcar como usado añadiendo una nota
+            if holiday.description:
+                holiday.description += " [USADO PARA RECUPERACIÓN]"
+            else:
+                holiday.description = "[USADO PARA RECUPERACIÓN]"
         
-        return None
+        return holiday
 
 
     def get_vacation_days_base(self, year=None):
@@ -229,7 +285,7 @@ class User(db.Model):
 
     def get_vacation_days_per_year(self, year=None):
         if not year:
-            year = get_canary_time().year
+            year = self.get_vacation_year()
         
         # Determinar días base (override o departamento)
         if self.vacation_days_override is not None:
@@ -241,17 +297,17 @@ class User(db.Model):
         if not self.hire_date:
             return base_days
         
+        # Año de vacaciones del departamento [inicio, fin)
+        start_of_year, end_of_year = self.get_vacation_period(year)
+        
         # Si fue contratado antes del año en cuestión, días completos
-        if self.hire_date.year < year:
+        if self.hire_date < start_of_year:
             return base_days
         
         # Si fue contratado en el año en cuestión, calcular proporcionalmente
-        if self.hire_date.year == year:
-            start_of_year = date(year, 1, 1)
-            end_of_year = date(year, 12, 31)
-            
-            days_worked = (end_of_year - self.hire_date).days + 1
-            total_days_year = (end_of_year - start_of_year).days + 1
+        if self.hire_date < end_of_year:
+            days_worked = (end_of_year - self.hire_date).days
+            total_days_year = (end_of_year - start_of_year).days
             
             proportion = days_worked / total_days_year
             proportional_days = round(base_days * proportion)  # ✅ Aplica proporcional al override
@@ -262,21 +318,14 @@ class User(db.Model):
         return 0
 
     def get_vacation_days_available(self, year=None):
-        """Calcular días de vacaciones sumando el libro mayor (transacciones)"""
+        """Obtener días de vacaciones del saldo materializado del libro mayor"""
         if not year:
-            from utils import get_canary_time
-            year = get_canary_time().year
-        
-        from models.transaction import VacationTransaction
-        from sqlalchemy import func
+            year = self.get_vacation_year()
         
-        # Simplemente suma toda la columna de días para este empleado y año
-        balance = db.session.query(func.sum(VacationTransaction.days)).filter(
-            VacationTransaction.user_id == self.id,
-            VacationTransaction.year == year
-        ).scalar()
+        from models.transaction import VacationBalance
         
-        return balance or 0
+        # Lectura por clave primaria (user_id, year) en lugar de SUM sobre transacciones
+        return VacationBalance.get_days(self.id, year)
 
     def is_vacation_balance_negative(self, year=None):
         """Verificar si el balance de vacaciones está en negativo"""
@@ -285,8 +334,7 @@ class User(db.Model):
     def get_vacation_balance_info(self, year=None):
         """Obtener información del balance basada en transacciones"""
         if not year:
-            from utils import get_canary_time
-            year = get_canary_time().year
+            year = self.get_vacation_year()
         
         available_days = self.get_vacation_days_available(year)
         base_days = self.get_vacation_days_per_year(year)
@@ -302,14 +350,15 @@ class User(db.Model):
             'available_days': available_days,
             'is_negative': available_days < 0,
             'year': year,
-            'is_proportional': self.hire_date and self.hire_date.year == year and not self.vacation_days_override,
+            'is_proportional': self.hire_date and self.get_vacation_year(self.hire_date) == year and not self.vacation_days_override,
             'hire_date': self.hire_date
         }
 
     def would_exceed_vacation_days(self, start_date, end_date, year=None):
         """Verificar si una solicitud excedería los días disponibles"""
         if not year:
-            year = start_date.year if start_date else get_canary_time().year
+            # El año de vacaciones en que empieza la solicitud (el que se le cobra)
+            year = self.get_vacation_year(start_date)
         
         from utils import calculate_vacation_days
         requested_days = calculate_vacation_days(start_date, end_date)
@@ -477,76 +526,38 @@ class User(db.Model):
         from .holiday import WorkedHoliday
         
         # Buscar el primer festivo aprobado sin usar
-        approved_holidays = WorkedHoliday.query.filter_by(
-            user_id=self.id, 
-            status='approved'
-        ).order_by(WorkedHoliday.date.asc()).all()
-        
-        for holiday in approved_holidays:
-            # Verificar que no esté ya completado
-            recovery_status, _ = holiday.get_recovery_status()
-            if not recovery_status:  # Disponible
-                print(f"🔄 Marcando festivo del {holiday.date} como COMPLETADO")
-                
-                # Agregar marca de completado en la descripción
-                completion_mark = f"[COMPLETADO {get_canary_time().strftime('%d/%m/%Y')}]"
-                if holiday.description:
-                    holiday.description += f" {completion_mark}"
-                else:
-                    holiday.description = completion_mark
+        holiday = WorkedHoliday.get_available_query(self.id).first()
+        if holiday:
+            print(f"🔄 Marcando festivo del {holiday.date} como COMPLETADO")
+        
+            # Agregar marca de completado en la descripción
+            completion_mark = f"[COMPLETADO {get_canary_time().strftime('%d/%m/%Y')}]"
+            if holiday.description:
+                holiday.description += f" {completion_mark}"
+            else:
+                holiday.description = completion_mark
                 
-                try:
-                    db.session.commit()
-                    print(f"✅ Festivo completado: {holiday.date}")
-                    return holiday
-                except Exception as e:
-                    print(f"❌ Error completando festivo: {e}")
-                    db.session.rollback()
-                    return None
+            try:
+                db.session.commit()
+                print(f"✅ Festivo completado: {holiday.date}")
+                return holiday
+            except Exception as e:
+                print(f"❌ Error completando festivo: {e}")
+                db.session.rollback()
+                return None
         
         print(f"❌ No hay festivos disponibles para completar")
         return None
 
     def check_and_load_annual_vacation(self):
         """Verifica y carga los días de vacaciones del año actual si no existen"""
-        from models.transaction import VacationTransaction
-        from utils import get_canary_time
-        from models import db
-        
-        current_year = get_canary_time().year
+        # Año de vacaciones en curso del departamento (el natural si empieza en enero)
+        current_year = self.get_vacation_year()
         
-        # 1. Mirar si ya tiene la carga de este año (carga anual O foto de migración inicial)
-        exists = VacationTransaction.query.filter(
-            VacationTransaction.user_id == self.id,
-            VacationTransaction.year == current_year,
-            VacationTransaction.transaction_type.in_(['annual_load', 'initial_migration'])
-        ).first()
+        # La marca viene cargada con el usuario: en el caso normal no hay ninguna consulta
+        if self.vacation_loaded_year == current_year:
+            return
         
-        # OJO: Ya no bloqueamos el 2026. Si el usuario no tiene ninguna de las transacciones 
-        # anteriores (es nuevo en 2026), entrará y se le crearán sus días correspondientes.
-        if not exists:
-            # 2. Calcular balance del año anterior
-            last_year = current_year - 1
-            balance_last_year = self.get_vacation_days_available(year=last_year)
-            
-            # 3. Crear Arrastre (solo si no es 0)
-            if balance_last_year != 0:
-                arrastre = VacationTransaction(
-                    user_id=self.id,
-                    year=current_year,
-                    days=balance_last_year,
-                    transaction_type='carryover',
-                    description=f"Arrastre de saldo del año {last_year}"
-                )
-                db.session.add(arrastre)
-            
-            # 4. Crear Carga Anual (sus días de contrato proporcionales)
-            carga = VacationTransaction(
-                user_id=self.id,
-                year=current_year,
-                days=self.get_vacation_days_per_year(current_year),
-                transaction_type='annual_load',
-                description=f"Carga anual de vacaciones {current_year}"
-            )
-            db.session.add(carga)
-            db.session.commit()
\ No newline at end of file
+        # Sin el lote de cambio de año (o usuario nuevo): la misma carga, solo para él
+        from services.annual_load import run_year_rollover
+        run_year_rollover(current_year, user_ids=[self.id])
\ No newline at end of file
@@ -0,0 +1,164 @@
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from models import db, User, Department
+from models.transaction import VacationTransaction, VacationBalance
+from services import identity
+from utils import get_canary_time
+
+# Cambio de año del libro mayor: arrastre del saldo anterior y carga anual de cada
+# usuario activo, en lote y en una sola transacción. El año es el de vacaciones de cada
+# departamento (empieza en su vacation_year_start_month). Lo lanza "flask year-rollover"
+# (cron del día 1 de cada mes: cada departamento cambia de año en su mes de inicio) y,
+# para quien aún no lo tenga, la primera visita al dashboard.
+# Dos ejecuciones a la vez no duplican apuntes: la clave única unique_user_year_load
+# rechaza la segunda y se reintenta sin los usuarios ya cargados.
+
+# Apuntes que cuentan como "días del año ya cargados"
+LOAD_TYPES = ('annual_load', 'initial_migration')
+
+# Reintentos si otro proceso carga a la vez a alguno de los usuarios
+MAX_ATTEMPTS = 3
+
+def _pending_users(year, user_ids=None, department_ids=None):
+    """Usuarios activos sin carga del año (con su departamento para los días de contrato)"""
+    already_loaded = db.select(VacationTransaction.id).where(
+        VacationTransaction.user_id == User.id,
+        VacationTransaction.year == year,
+        VacationTransaction.transaction_type.in_(LOAD_TYPES)
+    ).exists()
+    
+    query = User.query.options(joinedload(User.department)).filter(
+        User.is_active == True,
+        ~already_loaded
+    )
+    if user_ids is not None:
+        query = query.filter(User.id.in_(user_ids))
+    if department_ids is not None:
+        query = query.filter(User.department_id.in_(department_ids))
+    return query.all()
+
+def _refresh_balances(year, user_ids):
+    """Recalcular en SQL los saldos del año de los usuarios cargados desde el libro mayor"""
+    ledger_total = db.select(db.func.coalesce(db.func.sum(VacationTransaction.days), 0)).where(
+        VacationTransaction.user_id == VacationBalance.user_id,
+        VacationTransaction.year == VacationBalance.year
+    ).scalar_subquery()
+    
+    db.session.execute(db.update(VacationBalance).where(
+        VacationBalance.year == year,
+        VacationBalance.user_id.in_(user_ids)
+    ).values(days=ledger_total, updated_at=get_canary_time()).execution_options(synchronize_session=False))
+    
+    # Saldos que aún no existían
+    existing = db.select(VacationBalance.user_id).where(VacationBalance.year == year)
+    db.session.execute(db.insert(VacationBalance).from_select(
+        ['user_id', 'year', 'days'],
+        db.select(
+            VacationTransaction.user_id,
+            VacationTransaction.year,
+            db.func.sum(VacationTransaction.days)
+        ).where(
+            VacationTransaction.year == year,
+            VacationTransaction.user_id.in_(user_ids),
+            VacationTransaction.user_id.not_in(existing)
+        ).group_by(VacationTransaction.user_id, VacationTransaction.year)
+    ))
+
+def _mark_loaded(year, user_ids=None, department_ids=None):
+    """Poner vacation_loaded_year a los usuarios que ya tienen la carga del año"""
+    loaded = db.select(VacationTransaction.user_id).where(
+        VacationTransaction.year == year,
+        VacationTransaction.transaction_type.in_(LOAD_TYPES)
+    )
+    query = db.update(User).where(
+        User.id.in_(loaded),
+        db.or_(User.vacation_loaded_year == None, User.vacation_loaded_year != year)
+    )
+    if user_ids is not None:
+        query = query.where(User.id.in_(user_ids))
+    if department_ids is not None:
+        query = query.where(User.department_id.in_(department_ids))
+    db.session.execute(query.values(vacation_loaded_year=year))
+    db.session.commit()
+    
+    # La actualización en bloque no pasa por los eventos del modelo
+    identity.invalidate_user()
+
+def load_users(users, year):
+    """Arrastre y carga anual de los usuarios dados, con sus saldos (sin commit); devuelve (arrastres, cargas)"""
+    ids = [user.id for user in users]
+    last_year = year - 1
+    
+    # Saldo del año anterior de todos en una consulta (saldos materializados)
+    carryover = dict(db.session.query(VacationBalance.user_id, VacationBalance.days).filter(
+        VacationBalance.year == last_year,
+        VacationBalance.user_id.in_(ids)
+    ).all())
+    
+    rows = []
+    for user in users:
+        # Arrastre solo si no es 0
+        if carryover.get(user.id, 0) != 0:
+            rows.append({
+                'user_id': user.id,
+                'year': year,
+                'days': carryover[user.id],
+                'transaction_type': 'carryover',
+                'description': f"Arrastre de saldo del año {last_year}"
+            })
+        # Carga anual: días de contrato (proporcionales si entró este año)
+        rows.append({
+            'user_id': user.id,
+            'year': year,
+            'days': user.get_vacation_days_per_year(year),
+            'transaction_type': 'annual_load',
+            'description': f"Carga anual de vacaciones {year}"
+        })
+    
+    db.session.execute(db.insert(VacationTransaction), rows)
+    _refresh_balances(year, ids)
+    
+    carryovers = sum(1 for row in rows if row['transaction_type'] == 'carryover')
+    return carryovers, len(rows) - carryovers
+
+def _load(year, user_ids=None, department_ids=None):
+    """Un intento de carga; devuelve el número de usuarios, arrastres y cargas insertados"""
+    users = _pending_users(year, user_ids, department_ids)
+    if not users:
+        # Ya cargados (p. ej. por la foto inicial de saldos): solo falta la marca
+        _mark_loaded(year, user_ids, department_ids)
+        return 0, 0, 0
+    
+    carryovers, loads = load_users(users, year)
+    _mark_loaded(year, user_ids, department_ids)
+    return len(users), carryovers, loads
+
+def _load_year(year, user_ids=None, department_ids=None):
+    """Carga de un año con reintentos si otro proceso carga a la vez"""
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            return _load(year, user_ids, department_ids)
+        except IntegrityError:
+            # Otro proceso cargó a alguno de estos usuarios: volver a calcular sin ellos
+            db.session.rollback()
+    
+    raise RuntimeError(f"No se pudo completar la carga anual de {year} tras {MAX_ATTEMPTS} intentos")
+
+def get_current_years():
+    """Departamentos agrupados por su año de vacaciones en curso: {año: [department_id]}"""
+    years = {}
+    for department in Department.query.all():
+        years.setdefault(department.get_current_vacation_year(), []).append(department.id)
+    return years
+
+def run_year_rollover(year=None, user_ids=None):
+    """Cargar arrastre y días anuales de los usuarios activos que no los tengan (idempotente; sin año, el en curso de cada departamento)"""
+    years = {year: None} if year is not None else get_current_years()
+    
+    summary = {'years': sorted(years), 'users': 0, 'carryover': 0, 'annual_load': 0}
+    for load_year in sorted(years):
+        users, carryovers, loads = _load_year(load_year, user_ids, years[load_year])
+        summary['users'] += users
+        summary['carryover'] += carryovers
+        summary['annual_load'] += loads
+    return summary
@@ -0,0 +1,152 @@
+from models import db, User, Request, WorkedHoliday
+from models.transaction import VacationBalance
+from services.occupancy import get_absences_by_department, daily_occupancy
+from sqlalchemy.orm import joinedload
+
+# Máximo de solicitudes por lote (una petición HTTP, una transacción)
+MAX_BATCH_SIZE = 200
+
+def _result(request_id, success, message):
+    """Resultado de una solicitud del lote"""
+    return {'id': request_id, 'success': success, 'message': message}
+
+def _load_snapshot(requests):
+    """Cargar de una vez saldos, ocupación y solapamientos de las vacaciones del lote"""
+    vacations = [r for r in requests if r.type == 'vacation']
+    holiday_ids = {r.worked_holiday_id for r in requests if r.type == 'recovery' and r.worked_holiday_id}
+    
+    snapshot = {'balances': {}, 'absences': {}, 'user_vacations': {}, 'holidays': {}}
+    
+    if holiday_ids:
+        snapshot['holidays'] = dict(db.session.query(WorkedHoliday.id, WorkedHoliday.status).filter(
+            WorkedHoliday.id.in_(holiday_ids)
+        ).all())
+    
+    if not vacations:
+        return snapshot
+    
+    user_ids = {r.user_id for r in vacations}
+    window_start = min(r.start_date for r in vacations)
+    window_end = max(r.end_date for r in vacations)
+    
+    # Saldo materializado por (usuario, año de vacaciones)
+    snapshot['balances'] = {(user_id, year): days for user_id, year, days in db.session.query(
+        VacationBalance.user_id, VacationBalance.year, VacationBalance.days
+    ).filter(
+        VacationBalance.user_id.in_(user_ids),
+        VacationBalance.year.in_({r.user.get_vacation_year(r.start_date) for r in vacations})
+    ).all()}
+    
+    # Vacaciones aprobadas de los departamentos implicados en la ventana del lote
+    snapshot['absences'] = get_absences_by_department(
+        {r.user.department_id for r in vacations}, window_start, window_end
+    )
+    
+    # Vacaciones pendientes o aprobadas de cada empleado (para detectar solapamientos)
+    for other in Request.query.filter(
+        Request.user_id.in_(user_ids),
+        Request.type == 'vacation',
+        Request.status.in_(['pending', 'approved']),
+        Request.start_date <= window_end,
+        Request.end_date >= window_start
+    ).all():
+        snapshot['user_vacations'].setdefault(other.user_id, []).append(other)
+    
+    return snapshot
+
+def _check_vacation(request_obj, snapshot):
+    """Validar unas vacaciones contra la foto del lote; devuelve (ok, mensaje)"""
+    user = request_obj.user
+    department = user.department
+    
+    # Solapamiento con otras vacaciones del mismo empleado (el estado se lee en vivo:
+    # las aprobadas antes en el lote ya cuentan)
+    for other in snapshot['user_vacations'].get(user.id, []):
+        if (other.id != request_obj.id and other.status in ['pending', 'approved'] and
+                other.start_date <= request_obj.end_date and other.end_date >= request_obj.start_date):
+            overlap_dates = other.start_date.strftime('%d/%m/%Y')
+            if other.start_date != other.end_date:
+                overlap_dates += f" a {other.end_date.strftime('%d/%m/%Y')}"
+            return False, f"No se puede aprobar: {user.name} ya tiene vacaciones {other.get_status_text().lower()} del {overlap_dates}."
+    
+    # Saldo del año de vacaciones en que empiezan
+    requested_days = request_obj.calculate_days()
+    available_days = snapshot['balances'].get((user.id, user.get_vacation_year(request_obj.start_date)), 0)
+    if requested_days > available_days:
+        return False, f"No se puede aprobar: excedería en {requested_days - available_days} días el límite anual de {user.get_vacation_days_per_year()}. El empleado tendría {available_days - requested_days} días después de esta solicitud."
+    
+    # Pico diario de ausencias del departamento sin contar al propio empleado
+    absences = [a for a in snapshot['absences'].get(department.id, []) if a[0] != user.id]
+    peak = max(daily_occupancy(absences, request_obj.start_date, request_obj.end_date), default=0)
+    if peak >= department.max_concurrent_vacations:
+        return False, f"No se puede aprobar: Ya hay {department.max_concurrent_vacations} empleado(s) de vacaciones en esas fechas en el departamento {department.name}."
+    
+    return True, None
+
+def _record_vacation(request_obj, snapshot):
+    """Hacer que una aprobación del lote cuente para las siguientes"""
+    user = request_obj.user
+    key = (user.id, user.get_vacation_year(request_obj.start_date))
+    snapshot['balances'][key] = snapshot['balances'].get(key, 0) - request_obj.calculate_days()
+    
+    # Igual que get_department_absences: solo empleados activos ocupan plaza
+    if user.role == 'employee' and user.is_active:
+        snapshot['absences'].setdefault(user.department_id, []).append(
+            (user.id, request_obj.start_date, request_obj.end_date)
+        )
+
+def review_batch(request_ids, action, admin_user, reason=None):
+    """Aprobar o rechazar varias solicitudes pendientes en una sola transacción (un resultado por id)"""
+    request_ids = list(dict.fromkeys(request_ids))
+    
+    requests = Request.query.options(
+        joinedload(Request.user).joinedload(User.department)
+    ).filter(Request.id.in_(request_ids)).all()
+    # Orden determinista por llegada: cada aprobación cuenta para el saldo y la
+    # ocupación de las siguientes
+    requests.sort(key=lambda r: (r.created_at, r.id))
+    
+    found_ids = {r.id for r in requests}
+    results = []
+    
+    pending = [r for r in requests if r.status == 'pending']
+    snapshot = _load_snapshot(pending) if action == 'approve' else None
+    
+    for request_obj in requests:
+        if request_obj.status != 'pending':
+            results.append(_result(request_obj.id, False, f"La solicitud ya está {request_obj.get_status_text().lower()}."))
+            continue
+        
+        if action == 'reject':
+            request_obj.apply_rejection(admin_user, reason)
+            results.append(_result(request_obj.id, True, "Solicitud rechazada correctamente."))
+            continue
+        
+        if request_obj.type == 'vacation':
+            ok, message = _check_vacation(request_obj, snapshot)
+            if not ok:
+                results.append(_result(request_obj.id, False, message))
+                continue
+        elif snapshot['holidays'].get(request_obj.worked_holiday_id) != 'approved':
+            results.append(_result(request_obj.id, False, "No se puede aprobar: el festivo vinculado ya no está disponible."))
+            continue
+        
+        request_obj.apply_approval(admin_user)
+        if request_obj.type == 'vacation':
+            _record_vacation(request_obj, snapshot)
+        else:
+            # Un festivo solo sirve para una recuperación dentro del lote
+            snapshot['holidays'][request_obj.worked_holiday_id] = 'used'
+        results.append(_result(request_obj.id, True, "Solicitud aprobada correctamente."))
+    
+    results.extend(_result(request_id, False, "Solicitud no encontrada.")
+                   for request_id in request_ids if request_id not in found_ids)
+    
+    # Todas las entradas del libro mayor y notificaciones se confirman juntas
+    try:
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return [_result(r['id'], False, f"Error al guardar el lote: {str(e)}") for r in results]
+    
+    return results
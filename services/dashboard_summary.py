@@ -0,0 +1,62 @@
+from models import db, User, Request, WorkedHoliday, VacationBalance
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+from utils import get_canary_time
+
+# Número fijo de consultas que hace build_employees_summary(), sin importar
+# cuántos empleados haya: empleados, saldos, vacaciones hoy, pendientes, festivos
+SUMMARY_QUERY_COUNT = 5
+
+def build_employees_summary(today=None):
+    """Construir el resumen de empleados del dashboard de admin con consultas agregadas"""
+    if not today:
+        today = get_canary_time().date()
+
+    # 1. Empleados activos con su departamento (evita el lazy load en la plantilla)
+    employees = User.query.options(joinedload(User.department))\
+                          .filter_by(role='employee', is_active=True).all()
+
+    active_employee_ids = db.session.query(User.id).filter(
+        User.role == 'employee',
+        User.is_active == True
+    )
+
+    # 2. Saldo materializado del año de vacaciones en curso (sin sumar el libro mayor); según
+    # el mes de inicio del departamento es el año natural o el anterior
+    balances = {(user_id, year): days for user_id, year, days in db.session.query(
+        VacationBalance.user_id, VacationBalance.year, VacationBalance.days
+    ).filter(
+        VacationBalance.year.in_([today.year - 1, today.year]),
+        VacationBalance.user_id.in_(active_employee_ids)
+    ).all()}
+
+    # 3. Empleados con vacaciones aprobadas que incluyen el día de hoy
+    on_vacation_ids = {user_id for (user_id,) in db.session.query(Request.user_id).filter(
+        Request.type == 'vacation',
+        Request.status == 'approved',
+        Request.start_date <= today,
+        Request.end_date >= today
+    ).distinct().all()}
+
+    # 4. Número de solicitudes pendientes por usuario
+    pending_counts = dict(db.session.query(
+        Request.user_id,
+        func.count(Request.id)
+    ).filter(
+        Request.status == 'pending'
+    ).group_by(Request.user_id).all())
+
+    # 5. Festivos disponibles para recuperar (estado persistido + índice parcial)
+    holidays_to_recover = WorkedHoliday.get_available_counts()
+
+    employees_summary = []
+    for employee in employees:
+        employees_summary.append({
+            'employee': employee,
+            'vacation_days_available': balances.get((employee.id, employee.get_vacation_year(today)), 0),
+            'holidays_to_recover': holidays_to_recover.get(employee.id, 0),
+            'is_on_vacation': employee.id in on_vacation_ids,
+            'has_pending_requests': pending_counts.get(employee.id, 0) > 0
+        })
+
+    return employees_summary
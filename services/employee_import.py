@@ -0,0 +1,195 @@
+import csv
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, date
+from models import db, User, Department
+from services.annual_load import load_users
+from services.passwords import get_hasher
+
+# Alta masiva de empleados desde CSV. El fichero se valida entero contra una sola
+# consulta de emails existentes y otra de departamentos; las contraseñas se cifran
+# en paralelo en un pool de procesos (el hash es CPU pura) y las filas válidas se
+# insertan en una sola transacción junto con su carga anual del libro mayor.
+# Columnas: name, email, department (id o nombre) y, opcionales, password,
+# vacation_days_override y hire_date (YYYY-MM-DD). Separador ',' o ';'.
+
+# Filas como máximo por fichero (una petición HTTP, una transacción)
+MAX_IMPORT_ROWS = 500
+
+# La misma que en el alta individual
+DEFAULT_PASSWORD = 'temp123'
+
+# Con menos contraseñas no compensa arrancar el pool de procesos
+MIN_PARALLEL_HASHES = 8
+
+REQUIRED_COLUMNS = ('name', 'email', 'department')
+
+# Cabeceras en español aceptadas
+COLUMN_ALIASES = {
+    'nombre': 'name',
+    'departamento': 'department',
+    'department_id': 'department',
+    'contraseña': 'password',
+    'dias_vacaciones': 'vacation_days_override',
+    'fecha_contratacion': 'hire_date'
+}
+
+def _result(row_number, email, success, message):
+    """Resultado de una fila del fichero"""
+    return {'row': row_number, 'email': email, 'success': success, 'message': message}
+
+def hash_passwords(passwords):
+    """Cifrar contraseñas en paralelo con el esquema configurado, en el mismo orden"""
+    hasher = get_hasher()
+    workers = min(os.cpu_count() or 1, len(passwords))
+    if len(passwords) < MIN_PARALLEL_HASHES or workers < 2:
+        return [hasher(password) for password in passwords]
+    
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_pool_context()) as pool:
+        return list(pool.map(hasher, passwords, chunksize=max(1, len(passwords) // (workers * 4))))
+
+def get_pool_context():
+    """Contexto del pool de hash: fork si el sistema lo tiene, spawn si no"""
+    # Con spawn cada hijo vuelve a ejecutar el script de arranque: con "python wsgi.py"
+    # eso es create_app(), migraciones y mensajes de inicio una vez por proceso. Con
+    # fork el hijo ya tiene werkzeug cargado, solo calcula hashes (no toca la base de
+    # datos ni bloqueos de los hilos del servidor) y sale con os._exit.
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    # Sin fork (Windows) hay que arrancar con "flask run" o un servidor WSGI, que no crean la app al importarse
+    return multiprocessing.get_context('spawn')
+
+def parse_csv(content):
+    """Filas del CSV como (línea, diccionario con las columnas normalizadas); lanza ValueError si la cabecera no sirve"""
+    if isinstance(content, bytes):
+        content = content.decode('utf-8-sig')
+    
+    try:
+        dialect = csv.Sniffer().sniff(content.split('\n', 1)[0], delimiters=',;')
+    except csv.Error:
+        dialect = csv.excel
+    
+    reader = csv.reader(io.StringIO(content), dialect)
+    header = next(reader, None)
+    if not header:
+        raise ValueError('El fichero está vacío')
+    
+    columns = [COLUMN_ALIASES.get(name.strip().lower(), name.strip().lower()) for name in header]
+    missing = [name for name in REQUIRED_COLUMNS if name not in columns]
+    if missing:
+        raise ValueError(f"Faltan columnas obligatorias: {', '.join(missing)}")
+    
+    # Línea del fichero en que empieza cada fila: cuenta las vacías y los campos entre
+    # comillas de varias líneas, así el informe señala la fila que ve el usuario
+    rows = []
+    line_number = reader.line_num + 1
+    for values in reader:
+        if any(value.strip() for value in values):
+            rows.append((line_number, dict(zip(columns, (value.strip() for value in values)))))
+        line_number = reader.line_num + 1
+    return rows
+
+def _validate_row(row, existing_emails, seen_emails, departments):
+    """Validar una fila; devuelve (datos del empleado, None) o (None, mensaje de error)"""
+    name = row.get('name', '')
+    email = row.get('email', '')
+    
+    if not name or not email:
+        return None, "Nombre y email son obligatorios"
+    if '@' not in email:
+        return None, "Email no válido"
+    if email in existing_emails:
+        return None, "Ya existe un usuario con ese email"
+    if email in seen_emails:
+        return None, f"Email repetido en el fichero (fila {seen_emails[email]})"
+    
+    department_key = row.get('department', '')
+    department = departments.get(department_key) or departments.get(department_key.lower())
+    if not department:
+        return None, "Departamento no encontrado"
+    
+    vacation_days_override = None
+    if row.get('vacation_days_override'):
+        try:
+            vacation_days_override = int(row['vacation_days_override'])
+        except ValueError:
+            vacation_days_override = -1
+        if vacation_days_override < 0 or vacation_days_override > 50:
+            return None, "Los días de vacaciones deben estar entre 0 y 50"
+    
+    hire_date = date.today()
+    if row.get('hire_date'):
+        try:
+            hire_date = datetime.strptime(row['hire_date'], '%Y-%m-%d').date()
+        except ValueError:
+            return None, "Fecha de contratación no válida (YYYY-MM-DD)"
+    
+    return {
+        'name': name,
+        'email': email,
+        'department': department,
+        'vacation_days_override': vacation_days_override,
+        'hire_date': hire_date,
+        'password': row.get('password') or DEFAULT_PASSWORD
+    }, None
+
+def import_employees(rows):
+    """Validar e insertar las filas de parse_csv en una transacción; devuelve {created, errors, rows} con un resultado por fila"""
+    # Todo lo necesario para validar, en dos consultas
+    emails = {row.get('email', '') for _, row in rows}
+    existing_emails = set(db.session.scalars(db.select(User.email).where(User.email.in_(emails))))
+    departments = {}
+    for department in Department.query.all():
+        departments[str(department.id)] = department
+        departments[department.name.lower()] = department
+    
+    results = []
+    valid = []
+    seen_emails = {}
+    for row_number, row in rows:
+        data, error = _validate_row(row, existing_emails, seen_emails, departments)
+        if error:
+            results.append(_result(row_number, row.get('email', ''), False, error))
+            continue
+        seen_emails[data['email']] = row_number
+        valid.append((row_number, data))
+    
+    created = 0
+    if valid:
+        password_hashes = hash_passwords([data['password'] for _, data in valid])
+        
+        users = [User(
+            name=data['name'],
+            email=data['email'],
+            department=data['department'],
+            role='employee',
+            vacation_days_override=data['vacation_days_override'],
+            hire_date=data['hire_date'],
+            is_active=True,
+            password_hash=password_hash,
+            # La carga anual (del año de vacaciones del departamento) se hace aquí
+            # mismo: el dashboard no tendrá que hacerla
+            vacation_loaded_year=data['department'].get_current_vacation_year()
+        ) for (_, data), password_hash in zip(valid, password_hashes)]
+        
+        try:
+            db.session.add_all(users)
+            db.session.flush()
+            by_year = {}
+            for user in users:
+                by_year.setdefault(user.vacation_loaded_year, []).append(user)
+            for year, year_users in by_year.items():
+                load_users(year_users, year)
+            db.session.commit()
+            created = len(users)
+            results.extend(_result(row_number, data['email'], True, "Usuario creado correctamente")
+                           for row_number, data in valid)
+        except Exception as e:
+            db.session.rollback()
+            results.extend(_result(row_number, data['email'], False, f"Error al guardar: {str(e)}")
+                           for row_number, data in valid)
+    
+    results.sort(key=lambda result: result['row'])
+    return {'created': created, 'errors': len(results) - created, 'rows': results}
@@ -0,0 +1,240 @@
+import csv
+import io
+import re
+import zipfile
+from datetime import date, datetime
+from xml.sax.saxutils import escape
+from models import db, User, Department, Request, WorkedHoliday
+from models.transaction import VacationTransaction
+from utils import get_period_bounds, period_filter
+
+# Exportaciones para nómina en streaming: las filas se leen del cursor por lotes
+# (yield_per) y se van devolviendo según se generan, de modo que la memoria no
+# crece con el número de filas. El XLSX se escribe a mano (hoja con cadenas en
+# línea dentro de un zip en streaming) para no depender de openpyxl.
+
+# Filas que se leen del cursor en cada lote
+CHUNK_SIZE = 1000
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+}
+
+# Datos exportables: modelo, filtro por año, nombre de fichero y columnas (cabecera, columna)
+EXPORTS = {
+    'transactions': {
+        'model': VacationTransaction,
+        'year_filter': lambda year: VacationTransaction.year == year,
+        'filename': 'libro_mayor',
+        'columns': [
+            ('ID', VacationTransaction.id),
+            ('Empleado', User.name),
+            ('Email', User.email),
+            ('Departamento', Department.name),
+            ('Año', VacationTransaction.year),
+            ('Días', VacationTransaction.days),
+            ('Tipo', VacationTransaction.transaction_type),
+            ('Descripción', VacationTransaction.description),
+            ('Fecha', VacationTransaction.created_at)
+        ]
+    },
+    'requests': {
+        'model': Request,
+        'year_filter': lambda year: period_filter(Request.start_date, *get_period_bounds(year)),
+        'filename': 'solicitudes',
+        'columns': [
+            ('ID', Request.id),
+            ('Empleado', User.name),
+            ('Email', User.email),
+            ('Departamento', Department.name),
+            ('Tipo', Request.type),
+            ('Estado', Request.status),
+            ('Inicio', Request.start_date),
+            ('Fin', Request.end_date),
+            ('Motivo', Request.reason),
+            ('Festivo trabajado', Request.worked_holiday_id),
+            ('Creada', Request.created_at),
+            ('Revisada', Request.reviewed_at)
+        ]
+    },
+    'worked_holidays': {
+        'model': WorkedHoliday,
+        'year_filter': lambda year: period_filter(WorkedHoliday.date, *get_period_bounds(year)),
+        'filename': 'festivos_trabajados',
+        'columns': [
+            ('ID', WorkedHoliday.id),
+            ('Empleado', User.name),
+            ('Email', User.email),
+            ('Departamento', Department.name),
+            ('Fecha', WorkedHoliday.date),
+            ('Estado', WorkedHoliday.status),
+            ('Descripción', WorkedHoliday.description),
+            ('Recuperación', WorkedHoliday.recovery_status),
+            ('Creado', WorkedHoliday.created_at),
+            ('Aprobado', WorkedHoliday.approved_at)
+        ]
+    }
+}
+
+# Caracteres de control que no admite XML
+_ILLEGAL_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+# Inicios de celda que Excel interpretaría como fórmula (inyección en CSV)
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+# Años exportables: el filtro usa el inicio del año siguiente como límite
+MIN_YEAR = date.min.year
+MAX_YEAR = date.max.year - 1
+
+def build_statement(kind, year=None, department_id=None, user_id=None):
+    """Consulta de una exportación con sus filtros (por id para un orden estable)"""
+    export = EXPORTS[kind]
+    model = export['model']
+    
+    statement = db.select(*[column for _, column in export['columns']]).select_from(model).join(
+        User, User.id == model.user_id
+    ).outerjoin(Department, Department.id == User.department_id)
+    
+    if year is not None:
+        statement = statement.where(export['year_filter'](year))
+    if department_id is not None:
+        statement = statement.where(User.department_id == department_id)
+    if user_id is not None:
+        statement = statement.where(model.user_id == user_id)
+    
+    return statement.order_by(model.id)
+
+def iter_chunks(kind, **filters):
+    """Lotes de filas leídos del cursor sin cargar la exportación entera"""
+    statement = build_statement(kind, **filters).execution_options(yield_per=CHUNK_SIZE)
+    yield from db.session.execute(statement).partitions()
+
+def _format_value(value):
+    """Valor de celda: fechas en ISO, vacíos como cadena vacía"""
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+def _csv_value(value):
+    """Valor de celda del CSV: el texto que empieza como una fórmula se escapa con '"""
+    value = _format_value(value)
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return f"'{value}"
+    return value
+
+def iter_csv(kind, **filters):
+    """CSV por trozos; BOM y ';' para que Excel en español lo abra directamente"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+    
+    buffer.write('\ufeff')
+    writer.writerow([header for header, _ in EXPORTS[kind]['columns']])
+    
+    for chunk in iter_chunks(kind, **filters):
+        writer.writerows([_csv_value(value) for value in row] for row in chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    
+    # Cabecera sola si no hay filas
+    if buffer.tell():
+        yield buffer.getvalue()
+
+class _ChunkWriter:
+    """Destino de escritura del zip que acumula bytes para irlos devolviendo (sin seek)"""
+    
+    def __init__(self):
+        self.chunks = []
+    
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def _xlsx_row(values):
+    """Fila de la hoja: números como números, el resto como cadena en línea"""
+    cells = []
+    for value in values:
+        value = _format_value(value)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            cells.append(f'<c><v>{value}</v></c>')
+        elif value == '':
+            cells.append('<c/>')
+        else:
+            text = escape(_ILLEGAL_XML_CHARS.sub('', str(value)))
+            cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+    return f"<row>{''.join(cells)}</row>"
+
+def _xlsx_parts(sheet_name):
+    """Partes fijas del libro (una sola hoja, sin estilos)"""
+    return {
+        '[Content_Types].xml': (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            '</Types>'
+        ),
+        '_rels/.rels': (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+            '</Relationships>'
+        ),
+        'xl/workbook.xml': (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{escape(sheet_name[:31])}" sheetId="1" r:id="rId1"/></sheets>'
+            '</workbook>'
+        ),
+        'xl/_rels/workbook.xml.rels': (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+            '</Relationships>'
+        )
+    }
+
+def iter_xlsx(kind, **filters):
+    """XLSX por trozos: el zip se escribe en streaming y cada lote de filas se devuelve al momento"""
+    export = EXPORTS[kind]
+    out = _ChunkWriter()
+    
+    with zipfile.ZipFile(out, 'w', compression=zipfile.ZIP_DEFLATED) as workbook:
+        for name, content in _xlsx_parts(export['filename']).items():
+            workbook.writestr(name, content)
+        
+        with workbook.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'.encode()
+            )
+            sheet.write(_xlsx_row([header for header, _ in export['columns']]).encode())
+            
+            for chunk in iter_chunks(kind, **filters):
+                sheet.write(''.join(_xlsx_row(row) for row in chunk).encode())
+                yield out.take()
+            
+            sheet.write(b'</sheetData></worksheet>')
+    
+    # Resto de la hoja y directorio central del zip
+    yield out.take()
+
+def export_filename(kind, file_format, year=None):
+    """Nombre del fichero descargado"""
+    return f"{EXPORTS[kind]['filename']}_{year if year is not None else 'todos'}.{file_format}"
@@ -0,0 +1,119 @@
+import threading
+import time
+from flask import g, current_app, has_request_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session, joinedload, make_transient_to_detached, object_session
+from models import db, User, Department
+
+# Caché opcional entre peticiones de la ficha del usuario logueado (y su departamento).
+# Desactivada por defecto (USER_CACHE_TTL_SECONDS = 0). Se invalida al confirmar cualquier
+# cambio del usuario (update_profile, deactivate_user, cambio de contraseña...); con
+# varios procesos, los demás verán el cambio como mucho al caducar el TTL.
+
+# Columnas que cambian demasiado a menudo para guardarlas en la caché
+VOLATILE_USER_COLUMNS = {'unread_notifications'}
+
+_snapshots = {}
+_lock = threading.Lock()
+_hooks_installed = False
+
+def _cache_ttl():
+    """Segundos de vida de la caché entre peticiones (0 = desactivada)"""
+    return current_app.config.get('USER_CACHE_TTL_SECONDS', 0)
+
+def load_current_user(user_id):
+    """Cargar el usuario de la sesión junto con su departamento (una vez por petición)"""
+    user = _restore_snapshot(user_id)
+    if user is not None:
+        return user
+    
+    user = db.session.get(User, user_id, options=[joinedload(User.department)])
+    if user is not None:
+        _store_snapshot(user)
+    return user
+
+def get_user(user_id):
+    """Obtener un usuario reutilizando g.user o el identity map antes de consultar"""
+    current = g.get('user') if has_request_context() else None
+    if current is not None and current.id == user_id:
+        return current
+    return db.session.get(User, user_id)
+
+def _store_snapshot(user):
+    """Guardar los valores del usuario y su departamento para las próximas peticiones"""
+    if not _cache_ttl() or user.department is None:
+        return
+    
+    user_values = {column.key: getattr(user, column.key) for column in User.__table__.columns
+                   if column.key not in VOLATILE_USER_COLUMNS}
+    department_values = {column.key: getattr(user.department, column.key)
+                         for column in Department.__table__.columns}
+    
+    with _lock:
+        _snapshots[user.id] = (time.monotonic(), user_values, department_values)
+
+def _restore_snapshot(user_id):
+    """Reconstruir el usuario desde la caché sin consultar la base de datos"""
+    ttl = _cache_ttl()
+    if not ttl:
+        return None
+    
+    with _lock:
+        entry = _snapshots.get(user_id)
+    if entry is None:
+        return None
+    
+    stored_at, user_values, department_values = entry
+    if time.monotonic() - stored_at >= ttl:
+        with _lock:
+            _snapshots.pop(user_id, None)
+        return None
+    
+    # Instancias "ya persistidas" sin SELECT; las columnas volátiles se cargan al acceder
+    department = Department(**department_values)
+    make_transient_to_detached(department)
+    db.session.merge(department, load=False)
+    
+    user = User(**user_values)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+def invalidate_user(user_id=None):
+    """Olvidar la ficha cacheada de un usuario (o de todos si no se indica)"""
+    with _lock:
+        if user_id is None:
+            _snapshots.clear()
+        else:
+            _snapshots.pop(user_id, None)
+
+def _track_user_change(mapper, connection, target):
+    """Marcar el usuario como modificado en la transacción actual"""
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('identity_dirty', set()).add(target.id)
+
+def _track_department_change(mapper, connection, target):
+    """Un cambio de departamento afecta a todos los usuarios cacheados"""
+    session = object_session(target)
+    if session is not None:
+        session.info['identity_dirty_all'] = True
+
+def _invalidate_after_commit(session):
+    """Invalidar la caché cuando el cambio ya está confirmado"""
+    if session.info.pop('identity_dirty_all', False):
+        invalidate_user()
+    for user_id in session.info.pop('identity_dirty', ()):
+        invalidate_user(user_id)
+
+def install_hooks():
+    """Conectar los cambios de usuarios y departamentos con la caché"""
+    global _hooks_installed
+    if _hooks_installed:
+        return
+    
+    event.listen(User, 'after_update', _track_user_change)
+    event.listen(User, 'after_delete', _track_user_change)
+    event.listen(Department, 'after_update', _track_department_change)
+    event.listen(Department, 'after_delete', _track_department_change)
+    event.listen(Session, 'after_commit', _invalidate_after_commit)
+    _hooks_installed = True
@@ -0,0 +1,193 @@
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+from models import db, User
+from services.passwords import get_hash_method, normalize_method
+
+# Limitación de intentos fallidos de login por email y por IP, con ventana deslizante
+# aproximada: fallos de la ventana actual más los de la anterior ponderados por lo que
+# aún solapa. Los contadores viven en un LRU acotado del proceso; con LOGIN_THROTTLE_DB
+# se guardan en un SQLite aparte, compartido por los procesos y persistente entre
+# reinicios. Un intento por encima del límite se rechaza antes de calcular ningún hash.
+
+# Segundos que se reutiliza la lista de esquemas de hash guardados antes de volver a leerla
+STORED_METHODS_TTL = 300
+
+_counters = OrderedDict()
+_lock = threading.Lock()
+_prepared_databases = set()
+_dummy_hashes = {}
+_stored_methods = {'read_at': None, 'methods': frozenset()}
+
+def _window():
+    """Duración de la ventana en segundos"""
+    return current_app.config['LOGIN_WINDOW_SECONDS']
+
+def _keys(email, ip):
+    """Contadores que afectan a un intento: [(clave, máximo de fallos)]"""
+    config = current_app.config
+    return [
+        (f'email:{email.lower()}', config['LOGIN_MAX_FAILURES_PER_EMAIL']),
+        (f'ip:{ip}', config['LOGIN_MAX_FAILURES_PER_IP'])
+    ]
+
+def _roll(state, now, window):
+    """Estado (ventana, fallos actuales, fallos anteriores) llevado a la ventana de ahora"""
+    index = int(now // window)
+    if state is None:
+        return index, 0, 0
+    stored, current, previous = state
+    if stored == index:
+        return state
+    if stored == index - 1:
+        return index, 0, current
+    return index, 0, 0
+
+def _retry_after(state, now, window, limit):
+    """Segundos hasta que los fallos estimados bajen del límite (0 si ya están por debajo)"""
+    index, current, previous = _roll(state, now, window)
+    elapsed = now / window - index
+    if previous * (1 - elapsed) + current < limit:
+        return 0
+    
+    if current >= limit:
+        # Hay que esperar a la ventana siguiente, hasta que los actuales pesen menos
+        unblock_at = (index + 1 + 1 - limit / current) * window
+    else:
+        unblock_at = (index + 1 - (limit - current) / previous) * window
+    return max(1, math.ceil(unblock_at - now))
+
+# ----------------------------------------------------------------------------
+# Almacenamiento: LRU del proceso y, opcionalmente, SQLite
+# ----------------------------------------------------------------------------
+
+def _remember(key, state):
+    """Guardar un estado en el LRU descartando los contadores menos usados"""
+    _counters[key] = state
+    _counters.move_to_end(key)
+    while len(_counters) > current_app.config['LOGIN_THROTTLE_MAX_KEYS']:
+        _counters.popitem(last=False)
+
+def _connect():
+    """Conexión al SQLite de contadores (None si la persistencia está desactivada)"""
+    path = current_app.config.get('LOGIN_THROTTLE_DB')
+    if not path:
+        return None
+    
+    conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+    if path not in _prepared_databases:
+        conn.execute('CREATE TABLE IF NOT EXISTS login_throttle ('
+                     'key TEXT PRIMARY KEY, window INTEGER NOT NULL, '
+                     'current INTEGER NOT NULL, previous INTEGER NOT NULL)')
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_login_throttle_window ON login_throttle (window)')
+        _prepared_databases.add(path)
+    return conn
+
+def _load(conn, keys):
+    """Estados guardados de unas claves"""
+    if conn is None:
+        return {key: _counters.get(key) for key in keys}
+    
+    rows = conn.execute(f"SELECT key, window, current, previous FROM login_throttle WHERE key IN ({','.join('?' * len(keys))})",
+                        keys).fetchall()
+    return {key: (window, current, previous) for key, window, current, previous in rows}
+
+# ----------------------------------------------------------------------------
+# API para la vista de login
+# ----------------------------------------------------------------------------
+
+def get_retry_after(email, ip):
+    """Segundos que debe esperar un intento de login (0 si puede hacerlo)"""
+    now = time.time()
+    window = _window()
+    keys = _keys(email, ip)
+    
+    conn = _connect()
+    try:
+        with _lock:
+            states = _load(conn, [key for key, _ in keys])
+    finally:
+        if conn is not None:
+            conn.close()
+    
+    return max(_retry_after(states.get(key), now, window, limit) for key, limit in keys)
+
+def record_failure(email, ip):
+    """Anotar un intento fallido en los contadores del email y de la IP"""
+    now = time.time()
+    window = _window()
+    keys = [key for key, _ in _keys(email, ip)]
+    
+    conn = _connect()
+    try:
+        with _lock:
+            if conn is not None:
+                # Lectura y escritura atómicas frente a los demás procesos
+                conn.execute('BEGIN IMMEDIATE')
+            states = _load(conn, keys)
+            
+            for key in keys:
+                index, current, previous = _roll(states.get(key), now, window)
+                _remember(key, (index, current + 1, previous))
+            
+            if conn is not None:
+                conn.executemany('INSERT OR REPLACE INTO login_throttle (key, window, current, previous) VALUES (?, ?, ?, ?)',
+                                 [(key, *_counters[key]) for key in keys])
+                # Contadores que ya no cuentan para ninguna ventana
+                conn.execute('DELETE FROM login_throttle WHERE window < ?', (int(now // window) - 1,))
+                conn.execute('COMMIT')
+    finally:
+        if conn is not None:
+            conn.close()
+
+def reset(email):
+    """Olvidar los fallos de un email tras un login correcto (los de la IP se mantienen)"""
+    key = f'email:{email.lower()}'
+    
+    conn = _connect()
+    try:
+        with _lock:
+            _counters.pop(key, None)
+            if conn is not None:
+                conn.execute('DELETE FROM login_throttle WHERE key = ?', (key,))
+    finally:
+        if conn is not None:
+            conn.close()
+
+# ----------------------------------------------------------------------------
+# Hash de relleno para emails inexistentes
+# ----------------------------------------------------------------------------
+
+def _get_stored_methods():
+    """Esquemas de los hashes guardados en users (se relee cada STORED_METHODS_TTL segundos)"""
+    now = time.monotonic()
+    read_at = _stored_methods['read_at']
+    if read_at is None or now - read_at >= STORED_METHODS_TTL:
+        # Pocos usuarios: se leen los hashes en lugar de trocear en SQL (portable)
+        methods = {password_hash.split('$', 1)[0] for (password_hash,) in db.session.query(User.password_hash)
+                   if '$' in password_hash}
+        _stored_methods.update(read_at=now, methods=frozenset(methods))
+    return _stored_methods['methods']
+
+def _dummy_hash(method):
+    """(hash de relleno, segundos que cuesta) de un esquema; verificarlo cuesta lo mismo que calcularlo"""
+    if method not in _dummy_hashes:
+        start = time.perf_counter()
+        try:
+            password_hash = generate_password_hash('contraseña de relleno', method=method)
+        except ValueError:
+            # Esquema que werkzeug ya no sabe calcular (tampoco podría verificar esas cuentas)
+            password_hash = None
+        _dummy_hashes[method] = (password_hash, time.perf_counter() - start)
+    return _dummy_hashes[method]
+
+def verify_dummy_password(password):
+    """Verificar contra un hash de relleno del esquema más lento aún guardado: un email inexistente cuesta lo mismo que la cuenta más cara"""
+    # Mientras queden hashes antiguos (más lentos que el actual) se usa el más caro de ellos
+    methods = {normalize_method(get_hash_method())} | _get_stored_methods()
+    password_hash, _ = max((_dummy_hash(method) for method in methods), key=lambda dummy: dummy[1])
+    check_password_hash(password_hash, password)
@@ -0,0 +1,168 @@
+from sqlalchemy import inspect, func
+from models import db
+from utils import get_canary_time
+
+# Migraciones versionadas del esquema. Cada una se aplica una sola vez, en su propia
+# transacción, y queda anotada en schema_migrations. Son idempotentes: en una base
+# nueva create_all ya ha creado columnas e índices y la migración no cambia nada.
+# Para añadir una: nueva función con @migration(<siguiente versión>, '<descripción>').
+
+_migrations = []
+
+# Tabla de control fuera de db.metadata: create_all no la toca
+schema_migrations = db.Table(
+    'schema_migrations', db.MetaData(),
+    db.Column('version', db.Integer, primary_key=True),
+    db.Column('description', db.String(200), nullable=False),
+    db.Column('applied_at', db.DateTime, nullable=False)
+)
+
+def migration(version, description):
+    """Registrar una migración; la función recibe la conexión de su transacción"""
+    def register(func):
+        _migrations.append((version, description, func))
+        return func
+    return register
+
+def _add_column(conn, table, column, ddl):
+    """Añadir una columna si la tabla aún no la tiene; devuelve True si se añadió"""
+    if column in {col['name'] for col in inspect(conn).get_columns(table)}:
+        return False
+    conn.execute(db.text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+    return True
+
+def _create_indexes(conn, table, *names):
+    """Crear los índices declarados en el modelo que aún no existan"""
+    for index in table.indexes:
+        if index.name in names:
+            index.create(bind=conn, checkfirst=True)
+
+@migration(1, 'Días por año y auditoría en departments')
+def _department_columns(conn):
+    # SQLite no admite ADD COLUMN con DEFAULT CURRENT_TIMESTAMP
+    _add_column(conn, 'departments', 'vacation_days_per_year', 'INTEGER DEFAULT 22')
+    _add_column(conn, 'departments', 'created_at', 'DATETIME')
+    _add_column(conn, 'departments', 'updated_at', 'DATETIME')
+
+@migration(2, 'Campos de gestión en users')
+def _user_columns(conn):
+    _add_column(conn, 'users', 'vacation_days_override', 'INTEGER')
+    _add_column(conn, 'users', 'hire_date', 'DATE')
+    _add_column(conn, 'users', 'updated_at', 'DATETIME')
+
+@migration(3, 'Contador de notificaciones sin leer en users')
+def _unread_notifications(conn):
+    if not _add_column(conn, 'users', 'unread_notifications', 'INTEGER NOT NULL DEFAULT 0'):
+        return
+    
+    # Rellenar el contador desde la tabla de notificaciones
+    from models import User, Notification
+    users = User.__table__
+    notifications = Notification.__table__
+    conn.execute(users.update().values(unread_notifications=db.select(func.count(notifications.c.id)).where(
+        notifications.c.user_id == users.c.id,
+        notifications.c.is_read == False
+    ).scalar_subquery()))
+
+@migration(4, 'Fecha de modificación en requests')
+def _request_updated_at(conn):
+    _add_column(conn, 'requests', 'updated_at', 'DATETIME')
+
+@migration(5, 'Estado de recuperación persistido en worked_holidays')
+def _recovery_status(conn):
+    if not _add_column(conn, 'worked_holidays', 'recovery_status', 'VARCHAR(20)'):
+        return
+    
+    # Rellenar con el estado de la recuperación más reciente de cada festivo
+    from models import WorkedHoliday
+    holidays = WorkedHoliday.__table__
+    conn.execute(holidays.update().values(
+        recovery_status=WorkedHoliday._latest_recovery_status_query(holidays.c.id)
+    ))
+
+@migration(6, 'Índices de ocupación, paginación y festivos disponibles')
+def _listing_indexes(conn):
+    from models import Request, WorkedHoliday
+    _create_indexes(conn, Request.__table__,
+                    'ix_requests_type_status_dates', 'ix_requests_created_at_id', 'ix_requests_status_created_at_id')
+    _create_indexes(conn, WorkedHoliday.__table__,
+                    'ix_worked_holidays_status_date_id', 'ix_worked_holidays_available')
+
+@migration(7, 'Índices compuestos de las consultas frecuentes')
+def _hot_path_indexes(conn):
+    from models import Request, WorkedHoliday, Notification, VacationTransaction
+    _create_indexes(conn, Request.__table__,
+                    'ix_requests_user_id_status', 'ix_requests_status_dates', 'ix_requests_worked_holiday_id')
+    _create_indexes(conn, Notification.__table__, 'ix_notifications_user_id_is_read_created_at')
+    _create_indexes(conn, VacationTransaction.__table__, 'ix_vacation_transactions_user_id_year')
+    _create_indexes(conn, WorkedHoliday.__table__, 'ix_worked_holidays_user_id_status')
+
+@migration(8, 'Año de vacaciones de contrato por departamento')
+def _vacation_year_start(conn):
+    from models import Request
+    _add_column(conn, 'departments', 'vacation_year_start_month', 'INTEGER NOT NULL DEFAULT 1')
+    _create_indexes(conn, Request.__table__, 'ix_requests_user_id_type_start_date')
+
+@migration(9, 'Índice de la plantilla activa por departamento')
+def _department_employees_index(conn):
+    from models import User
+    _create_indexes(conn, User.__table__, 'ix_users_department_id_role_is_active')
+
+@migration(10, 'Marca de carga anual y clave única de cargas y arrastres')
+def _annual_load_key(conn):
+    from models import User, VacationTransaction, VacationBalance
+    from services.annual_load import LOAD_TYPES
+    users = User.__table__
+    transactions = VacationTransaction.__table__
+    balances = VacationBalance.__table__
+    
+    if _add_column(conn, 'users', 'vacation_loaded_year', 'INTEGER'):
+        # Rellenar con el último año que cada usuario ya tiene cargado
+        conn.execute(users.update().values(vacation_loaded_year=db.select(func.max(transactions.c.year)).where(
+            transactions.c.user_id == users.c.id,
+            transactions.c.transaction_type.in_(LOAD_TYPES)
+        ).scalar_subquery()))
+    
+    # Cargas duplicadas por visitas simultáneas al dashboard: se conserva la primera
+    yearly = transactions.c.transaction_type.in_(['annual_load', 'carryover'])
+    first_ids = db.select(func.min(transactions.c.id)).where(yearly).group_by(
+        transactions.c.user_id, transactions.c.year, transactions.c.transaction_type
+    )
+    removed = conn.execute(transactions.delete().where(yearly, transactions.c.id.not_in(first_ids))).rowcount
+    if removed:
+        print(f"⚠️ Eliminados {removed} apuntes duplicados de carga anual o arrastre")
+        conn.execute(balances.update().values(days=db.select(func.coalesce(func.sum(transactions.c.days), 0)).where(
+            transactions.c.user_id == balances.c.user_id,
+            transactions.c.year == balances.c.year
+        ).scalar_subquery()))
+    
+    _create_indexes(conn, transactions, 'unique_user_year_load')
+
+def get_applied_versions():
+    """Versiones ya aplicadas en la base de datos"""
+    with db.engine.begin() as conn:
+        schema_migrations.create(bind=conn, checkfirst=True)
+        return {version for (version,) in conn.execute(db.select(schema_migrations.c.version))}
+
+def get_pending():
+    """Migraciones registradas que faltan por aplicar, en orden de versión"""
+    applied = get_applied_versions()
+    return [(version, description, func)
+            for version, description, func in sorted(_migrations, key=lambda item: item[0])
+            if version not in applied]
+
+def apply_pending():
+    """Aplicar las migraciones pendientes en orden; devuelve [(versión, descripción)] aplicadas"""
+    applied = []
+    for version, description, func in get_pending():
+        # Una transacción por migración: si falla, no queda anotada y se reintenta
+        with db.engine.begin() as conn:
+            func(conn)
+            conn.execute(schema_migrations.insert().values(
+                version=version,
+                description=description,
+                applied_at=get_canary_time()
+            ))
+        print(f"🗄️ Migración {version} aplicada: {description}")
+        applied.append((version, description))
+    return applied
@@ -0,0 +1,89 @@
+import json
+import queue
+import threading
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+# Pub/sub en memoria del proceso: cada pestaña abierta con el canal SSE tiene su
+# propia cola. Con varios procesos (workers, o el outbox en "flask process-outbox")
+# cada uno solo ve sus suscriptores: por eso el cliente mantiene un polling lento aunque
+# el canal esté abierto, y el canal se cierra y reconecta cada STREAM_MAX_SECONDS.
+_subscribers = {}
+_lock = threading.Lock()
+_hooks_installed = False
+
+# Eventos máximos en cola por pestaña antes de descartar (cliente lento o colgado)
+MAX_QUEUED_EVENTS = 100
+
+def subscribe(user_id):
+    """Registrar una nueva cola de eventos para el usuario"""
+    subscriber = queue.Queue(maxsize=MAX_QUEUED_EVENTS)
+    with _lock:
+        _subscribers.setdefault(user_id, set()).add(subscriber)
+    return subscriber
+
+def unsubscribe(user_id, subscriber):
+    """Eliminar la cola de eventos de una pestaña que se ha cerrado"""
+    with _lock:
+        queues = _subscribers.get(user_id)
+        if queues:
+            queues.discard(subscriber)
+            if not queues:
+                del _subscribers[user_id]
+
+def publish(user_id, event_name, data):
+    """Enviar un evento a todas las pestañas abiertas del usuario"""
+    with _lock:
+        queues = list(_subscribers.get(user_id, ()))
+    
+    for subscriber in queues:
+        try:
+            subscriber.put_nowait((event_name, data))
+        except queue.Full:
+            pass  # El cliente volverá a sincronizar el contador al reconectar
+
+def format_sse(event_name, data):
+    """Formatear un evento según el protocolo Server-Sent Events"""
+    return f"event: {event_name}\ndata: {json.dumps(data)}\n\n"
+
+def queue_for_publish(session, user_id, data):
+    """Guardar un evento de notificación hasta que se confirme la transacción"""
+    session.info.setdefault('notifications_to_publish', []).append((user_id, data))
+
+def _queue_created_notification(mapper, connection, target):
+    """Guardar la notificación insertada hasta que se confirme la transacción"""
+    session = object_session(target)
+    if session is None:
+        return
+    
+    queue_for_publish(session, target.user_id, {
+        'id': target.id,
+        'type': target.type,
+        'title': target.title,
+        'message': target.message,
+        'is_read': target.is_read,
+        'created_at': target.created_at.isoformat() if target.created_at else None,
+        'icon': target.get_type_icon(),
+        'class': target.get_type_class()
+    })
+
+def _publish_after_commit(session):
+    """Publicar las notificaciones creadas una vez confirmadas en la base de datos"""
+    for user_id, data in session.info.pop('notifications_to_publish', []):
+        publish(user_id, 'notification', data)
+
+def _discard_after_rollback(session, previous_transaction=None):
+    """Descartar las notificaciones de una transacción que no se ha confirmado"""
+    session.info.pop('notifications_to_publish', None)
+
+def install_hooks():
+    """Conectar la creación de notificaciones con el canal de eventos"""
+    global _hooks_installed
+    if _hooks_installed:
+        return
+    
+    from models import Notification
+    event.listen(Notification, 'after_insert', _queue_created_notification)
+    event.listen(Session, 'after_commit', _publish_after_commit)
+    event.listen(Session, 'after_soft_rollback', _discard_after_rollback)
+    _hooks_installed = True
@@ -0,0 +1,111 @@
+import threading
+import time
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from models import db, User, Notification
+from services import notification_bus
+from utils import get_canary_time
+
+# Ids de administradores activos en memoria. Se invalida al confirmar cualquier
+# cambio de rol/estado de un usuario; el TTL cubre cambios hechos por otro proceso.
+ADMIN_IDS_TTL_SECONDS = 300
+
+_admin_ids = None
+_admin_ids_loaded_at = 0
+_lock = threading.Lock()
+_hooks_installed = False
+
+def get_admin_ids():
+    """Obtener los ids de administradores activos (cacheados)"""
+    global _admin_ids, _admin_ids_loaded_at
+    
+    with _lock:
+        if _admin_ids is not None and time.monotonic() - _admin_ids_loaded_at < ADMIN_IDS_TTL_SECONDS:
+            return _admin_ids
+    
+    admin_ids = frozenset(user_id for (user_id,) in db.session.query(User.id).filter(
+        User.role == 'admin',
+        User.is_active == True
+    ).all())
+    
+    with _lock:
+        _admin_ids = admin_ids
+        _admin_ids_loaded_at = time.monotonic()
+    
+    return admin_ids
+
+def invalidate_admin_ids():
+    """Forzar la recarga de los ids de administradores en la próxima consulta"""
+    global _admin_ids
+    with _lock:
+        _admin_ids = None
+
+def dispatch(user_ids, type, title, message=None, related_type=None, related_id=None):
+    """Crear la misma notificación para varios usuarios con un único INSERT (sin commit)"""
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return 0
+    
+    now = get_canary_time()
+    rows = [{
+        'user_id': user_id,
+        'type': type,
+        'title': title,
+        'message': message,
+        'is_read': False,
+        'created_at': now,
+        'related_type': related_type,
+        'related_id': related_id
+    } for user_id in user_ids]
+    
+    # executemany: una sola sentencia preparada para todo el reparto
+    db.session.execute(Notification.__table__.insert(), rows)
+    
+    # El INSERT masivo no pasa por los eventos del ORM: contador y canal SSE a mano
+    Notification.adjust_unread_count(db.session, user_ids, 1)
+    
+    preview = Notification(type=type)
+    for user_id in user_ids:
+        notification_bus.queue_for_publish(db.session, user_id, {
+            'id': None,
+            'type': type,
+            'title': title,
+            'message': message,
+            'is_read': False,
+            'created_at': now.isoformat(),
+            'icon': preview.get_type_icon(),
+            'class': preview.get_type_class()
+        })
+    
+    return len(user_ids)
+
+def notify_admins(type, title, message=None, related_type=None, related_id=None):
+    """Notificar a todos los administradores activos (sin commit)"""
+    return dispatch(get_admin_ids(), type, title, message, related_type, related_id)
+
+def _track_admin_changes(mapper, connection, target):
+    """Marcar la caché de administradores como sucia si cambia el rol o el estado"""
+    state = inspect(target)
+    if state.attrs.role.history.has_changes() or state.attrs.is_active.history.has_changes():
+        state.session.info['admin_ids_dirty'] = True
+
+def _track_admin_delete(mapper, connection, target):
+    """Marcar la caché como sucia al borrar un usuario"""
+    inspect(target).session.info['admin_ids_dirty'] = True
+
+def _invalidate_after_commit(session):
+    """Invalidar la caché cuando el cambio ya está confirmado"""
+    if session.info.pop('admin_ids_dirty', False):
+        invalidate_admin_ids()
+
+def install_hooks():
+    """Conectar los cambios de usuarios con la caché de administradores"""
+    global _hooks_installed
+    if _hooks_installed:
+        return
+    
+    event.listen(User, 'after_insert', _track_admin_changes)
+    event.listen(User, 'after_update', _track_admin_changes)
+    event.listen(User, 'after_delete', _track_admin_delete)
+    event.listen(Session, 'after_commit', _invalidate_after_commit)
+    _hooks_installed = True
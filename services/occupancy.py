@@ -0,0 +1,109 @@
+from models import db, User, Request
+from datetime import timedelta
+
+def get_department_absences(department_id, start_date, end_date, exclude_user_id=None):
+    """Obtener (user_id, inicio, fin) de las vacaciones aprobadas del departamento en el rango"""
+    # Una sola consulta: requests JOIN users por department_id, apoyada en el
+    # índice compuesto (type, status, start_date, end_date)
+    query = db.session.query(
+        Request.user_id,
+        Request.start_date,
+        Request.end_date
+    ).join(User, User.id == Request.user_id).filter(
+        Request.type == 'vacation',
+        Request.status == 'approved',
+        Request.start_date <= end_date,
+        Request.end_date >= start_date,
+        User.department_id == department_id,
+        User.role == 'employee',
+        User.is_active == True
+    )
+    
+    if exclude_user_id:
+        query = query.filter(Request.user_id != exclude_user_id)
+    
+    return query.all()
+
+def get_absences_by_department(department_ids, start_date, end_date):
+    """Vacaciones aprobadas de varios departamentos en una consulta: {department_id: [(user_id, inicio, fin)]}"""
+    rows = db.session.query(
+        User.department_id,
+        Request.user_id,
+        Request.start_date,
+        Request.end_date
+    ).join(User, User.id == Request.user_id).filter(
+        Request.type == 'vacation',
+        Request.status == 'approved',
+        Request.start_date <= end_date,
+        Request.end_date >= start_date,
+        User.department_id.in_(department_ids),
+        User.role == 'employee',
+        User.is_active == True
+    ).all()
+    
+    absences = {department_id: [] for department_id in department_ids}
+    for department_id, user_id, absence_start, absence_end in rows:
+        absences[department_id].append((user_id, absence_start, absence_end))
+    return absences
+
+def daily_occupancy(absences, start_date, end_date):
+    """Contar empleados distintos ausentes cada día del rango (una posición por día)"""
+    total_days = (end_date - start_date).days + 1
+    if total_days <= 0:
+        return []
+    
+    # Agrupar tramos por empleado y recortarlos al rango pedido; los tramos de
+    # un mismo empleado se fusionan para no contarlo dos veces el mismo día
+    by_user = {}
+    for user_id, absence_start, absence_end in absences:
+        first = max((absence_start - start_date).days, 0)
+        last = min((absence_end - start_date).days, total_days - 1)
+        if first <= last:
+            by_user.setdefault(user_id, []).append((first, last))
+    
+    # Array de diferencias: +1 al empezar un tramo, -1 el día siguiente a acabar
+    diff = [0] * (total_days + 1)
+    for intervals in by_user.values():
+        intervals.sort()
+        current_start, current_end = intervals[0]
+        for first, last in intervals[1:]:
+            if first <= current_end + 1:
+                current_end = max(current_end, last)
+            else:
+                diff[current_start] += 1
+                diff[current_end + 1] -= 1
+                current_start, current_end = first, last
+        diff[current_start] += 1
+        diff[current_end + 1] -= 1
+    
+    # Suma acumulada
+    counts = []
+    running = 0
+    for delta in diff[:total_days]:
+        running += delta
+        counts.append(running)
+    
+    return counts
+
+def build_occupancy_map(department, start_date, end_date, exclude_user_id=None):
+    """Ocupación y holgura diarias del departamento en el rango (una consulta + array de diferencias)"""
+    absences = get_department_absences(department.id, start_date, end_date, exclude_user_id)
+    occupancy = daily_occupancy(absences, start_date, end_date)
+    capacity = department.max_concurrent_vacations
+    
+    # Posición i = start_date + i días; la holgura nunca baja de 0 aunque se haya
+    # reducido el máximo después de aprobar
+    return {
+        'department_id': department.id,
+        'start_date': start_date,
+        'end_date': end_date,
+        'max_concurrent': capacity,
+        'occupancy': occupancy,
+        'headroom': [max(capacity - count, 0) for count in occupancy]
+    }
+
+def get_full_days(occupancy_map):
+    """Días del mapa de ocupación sin plazas libres"""
+    start_date = occupancy_map['start_date']
+    return [start_date + timedelta(days=offset)
+            for offset, headroom in enumerate(occupancy_map['headroom']) if headroom == 0]
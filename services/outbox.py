@@ -0,0 +1,121 @@
+import threading
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import db, Notification, OutboxEvent
+from utils import get_canary_time
+
+# Entrega de los efectos secundarios guardados en outbox_events. El estado (aprobación,
+# rechazo...) y su evento se confirman en el mismo commit; el worker entrega después.
+# Puede correr como hilo del proceso web (OUTBOX_WORKER_ENABLED) o como proceso aparte
+# con "flask process-outbox --watch". Varios workers a la vez no duplican entregas:
+# cada evento se reclama con un UPDATE condicionado a status = 'pending'.
+
+_handlers = {}
+_wakeup = threading.Event()
+_worker = None
+_worker_lock = threading.Lock()
+_hooks_installed = False
+
+def handler(kind):
+    """Registrar la función que entrega los eventos de un tipo"""
+    def register(func):
+        _handlers[kind] = func
+        return func
+    return register
+
+@handler('notification')
+def _deliver_notification(payload):
+    """Crear la notificación en la misma transacción que marca el evento como entregado"""
+    db.session.add(Notification(**payload))
+    db.session.flush()
+
+def deliver_event(event_id):
+    """Entregar un evento; devuelve True si se entregó"""
+    outbox = OutboxEvent.__table__
+    
+    # Reclamar el evento: si otro worker ya lo tiene, no se toca
+    claimed = db.session.execute(
+        outbox.update()
+        .where(outbox.c.id == event_id, outbox.c.status == 'pending')
+        .values(status='delivered', delivered_at=get_canary_time())
+    ).rowcount
+    if not claimed:
+        db.session.rollback()
+        return False
+    
+    outbox_event = db.session.get(OutboxEvent, event_id)
+    try:
+        deliver = _handlers[outbox_event.kind]
+        deliver(outbox_event.get_payload())
+        db.session.commit()
+        return True
+    except Exception as e:
+        # Se deshace la entrega y el reclamo; el evento vuelve a quedar pendiente con reintento
+        db.session.rollback()
+        outbox_event = db.session.get(OutboxEvent, event_id)
+        outbox_event.schedule_retry(f"{type(e).__name__}: {e}")
+        db.session.commit()
+        print(f"⚠️ Error entregando evento {event_id} ({outbox_event.kind}), intento {outbox_event.attempts}: {e}")
+        return False
+
+def deliver_pending(limit=100):
+    """Entregar los eventos pendientes; devuelve (entregados, procesados)"""
+    event_ids = OutboxEvent.get_due_ids(limit)
+    delivered = sum(1 for event_id in event_ids if deliver_event(event_id))
+    return delivered, len(event_ids)
+
+def run_worker(app, poll_seconds=5, stop_event=None):
+    """Bucle del worker: entrega al confirmarse eventos nuevos o cada poll_seconds"""
+    while stop_event is None or not stop_event.is_set():
+        _wakeup.wait(poll_seconds)
+        _wakeup.clear()
+        
+        with app.app_context():
+            try:
+                # Vaciar la cola por lotes antes de volver a esperar
+                while True:
+                    delivered, processed = deliver_pending()
+                    if processed == 0 or delivered == 0:
+                        break
+            except Exception as e:
+                db.session.rollback()
+                print(f"❌ Error en el worker del outbox: {e}")
+
+def start_worker(app):
+    """Arrancar el hilo de entrega en segundo plano (una vez por proceso)"""
+    global _worker
+    # Camino rápido sin bloqueo: se llama en cada petición
+    if _worker is not None and _worker.is_alive():
+        return _worker
+    
+    with _worker_lock:
+        if _worker is not None and _worker.is_alive():
+            return _worker
+        
+        _worker = threading.Thread(
+            target=run_worker,
+            args=(app, app.config.get('OUTBOX_POLL_SECONDS', 5)),
+            name='outbox-worker',
+            daemon=True
+        )
+        _worker.start()
+        return _worker
+
+def _wake_after_commit(session):
+    """Despertar al worker cuando se confirman eventos nuevos"""
+    if session.info.pop('outbox_pending', False):
+        _wakeup.set()
+
+def _discard_after_rollback(session, previous_transaction=None):
+    """Los eventos de una transacción deshecha no existen"""
+    session.info.pop('outbox_pending', None)
+
+def install_hooks():
+    """Conectar los commits con el worker del outbox"""
+    global _hooks_installed
+    if _hooks_installed:
+        return
+    
+    event.listen(Session, 'after_commit', _wake_after_commit)
+    event.listen(Session, 'after_soft_rollback', _discard_after_rollback)
+    _hooks_installed = True
@@ -0,0 +1,55 @@
+import time
+from functools import lru_cache, partial
+from flask import current_app
+from werkzeug.security import generate_password_hash
+
+# Cifrado de contraseñas con el esquema y coste de PASSWORD_HASH_METHOD (formato de
+# werkzeug: 'scrypt:n:r:p' o 'pbkdf2:sha256:iteraciones'). Los hashes hechos con
+# otro esquema siguen validando y se recifran con el actual al iniciar sesión.
+
+# Esquemas que compara "flask benchmark-password-hash" además del configurado
+BENCHMARK_METHODS = [
+    'pbkdf2:sha256:600000',  # por defecto de werkzeug 2.3
+    'pbkdf2:sha256:260000',
+    'scrypt:32768:8:1',  # por defecto de werkzeug para scrypt (32 MiB por hash)
+    'scrypt:16384:8:1',
+    'scrypt:8192:8:1'
+]
+
+def get_hash_method():
+    """Esquema configurado"""
+    return current_app.config['PASSWORD_HASH_METHOD']
+
+def hash_password(password):
+    """Hash de una contraseña con el esquema configurado"""
+    return generate_password_hash(password, method=get_hash_method())
+
+def get_hasher():
+    """Función de hash con el esquema configurado, serializable para un pool de procesos"""
+    return partial(generate_password_hash, method=get_hash_method())
+
+@lru_cache(maxsize=None)
+def normalize_method(method):
+    """Esquema con todos sus parámetros tal y como queda en el hash ('scrypt' -> 'scrypt:32768:8:1')"""
+    return generate_password_hash('', method=method).split('$', 1)[0]
+
+def needs_rehash(password_hash):
+    """Si un hash se hizo con otro esquema o coste que el configurado"""
+    return password_hash.split('$', 1)[0] != normalize_method(get_hash_method())
+
+def benchmark(methods, seconds=1.0):
+    """Hashes por segundo de cada esquema en este proceso (lo mismo cuesta verificarlos)"""
+    results = []
+    for method in methods:
+        count = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            generate_password_hash('contraseña de prueba', method=method)
+            count += 1
+        elapsed = time.perf_counter() - start
+        results.append({
+            'method': normalize_method(method),
+            'hashes_per_second': count / elapsed,
+            'ms_per_hash': elapsed / count * 1000
+        })
+    return results
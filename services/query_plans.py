@@ -0,0 +1,96 @@
+from datetime import date
+from models import db, User, Request, WorkedHoliday, Notification, VacationTransaction, OutboxEvent
+from utils import get_period_bounds, period_filter
+
+# Comprobación de planes de las consultas frecuentes con EXPLAIN QUERY PLAN (SQLite).
+# Una consulta falla si recorre entera su tabla principal ("SCAN <tabla>" sin índice);
+# recorrer una tabla pequeña como bucle exterior de un JOIN (users) se permite.
+
+def _hot_queries():
+    """(nombre, tabla principal, sentencia) de las consultas de los caminos frecuentes"""
+    today = date.today()
+    return [
+        ('Solicitudes solapadas de un empleado', 'requests', db.select(Request.id).where(
+            Request.user_id == 1,
+            Request.status.in_(['pending', 'approved']),
+            Request.start_date <= today,
+            Request.end_date >= today
+        )),
+        ('Pendientes de un empleado', 'requests', db.select(db.func.count(Request.id)).where(
+            Request.user_id == 1,
+            Request.status == 'pending'
+        )),
+        ('Ocupación del departamento', 'requests', db.select(Request.user_id, Request.start_date, Request.end_date).join(
+            User, User.id == Request.user_id
+        ).where(
+            Request.type == 'vacation',
+            Request.status == 'approved',
+            Request.start_date <= today,
+            Request.end_date >= today,
+            User.department_id == 1
+        )),
+        ('Calendario (admin)', 'requests', db.select(Request.id).where(
+            Request.status.in_(['approved', 'pending']),
+            Request.start_date <= today,
+            Request.end_date >= today
+        )),
+        ('Vacaciones de un empleado en un año', 'requests', db.select(Request.id).where(
+            Request.user_id == 1,
+            Request.type == 'vacation',
+            period_filter(Request.start_date, *get_period_bounds(today.year))
+        )),
+        ('Recuperaciones de un festivo', 'requests', db.select(Request.status).where(
+            Request.worked_holiday_id == 1
+        ).order_by(Request.created_at.desc(), Request.id.desc()).limit(1)),
+        ('Listado paginado de solicitudes', 'requests', db.select(Request.id).where(
+            Request.status == 'pending'
+        ).order_by(Request.created_at.desc(), Request.id.desc()).limit(50)),
+        ('Empleados activos de un departamento', 'users', db.select(User.id).where(
+            User.department_id == 1,
+            User.role == 'employee',
+            User.is_active == True
+        )),
+        ('Notificaciones sin leer', 'notifications', db.select(Notification.id).where(
+            Notification.user_id == 1,
+            Notification.is_read == False
+        ).order_by(Notification.created_at.desc())),
+        ('Notificaciones recientes', 'notifications', db.select(Notification.id).where(
+            Notification.user_id == 1
+        ).order_by(Notification.created_at.desc()).limit(10)),
+        ('Libro mayor de un empleado', 'vacation_transactions', db.select(VacationTransaction.id).where(
+            VacationTransaction.user_id == 1,
+            VacationTransaction.year == today.year
+        )),
+        ('Festivos pendientes de un empleado', 'worked_holidays', db.select(db.func.count(WorkedHoliday.id)).where(
+            WorkedHoliday.user_id == 1,
+            WorkedHoliday.status == 'pending'
+        )),
+        ('Festivos disponibles para recuperar', 'worked_holidays', WorkedHoliday.get_available_query(1).statement),
+        ('Festivos pendientes (admin)', 'worked_holidays', db.select(WorkedHoliday.id).where(
+            WorkedHoliday.status == 'pending'
+        ).order_by(WorkedHoliday.date, WorkedHoliday.id).limit(50)),
+        ('Eventos del outbox', 'outbox_events', db.select(OutboxEvent.id).where(
+            OutboxEvent.status == 'pending',
+            OutboxEvent.available_at <= db.func.current_timestamp()
+        ).order_by(OutboxEvent.id).limit(100)),
+    ]
+
+def explain(statement):
+    """Líneas de EXPLAIN QUERY PLAN de una sentencia"""
+    compiled = statement.compile(dialect=db.engine.dialect, compile_kwargs={'render_postcompile': True})
+    # El plan no depende de los valores: basta con un parámetro por marcador
+    parameters = tuple(None for _ in compiled.positiontup or ())
+    with db.engine.connect() as conn:
+        return [row[-1] for row in conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}', parameters)]
+
+def check_query_plans():
+    """Revisar los planes de las consultas frecuentes; devuelve [{name, table, plan, ok}]"""
+    if db.engine.dialect.name != 'sqlite':
+        raise RuntimeError('La comprobación de planes solo está disponible con SQLite')
+    
+    results = []
+    for name, table, statement in _hot_queries():
+        plan = explain(statement)
+        full_scan = any(line.startswith(f'SCAN {table}') and 'USING' not in line for line in plan)
+        results.append({'name': name, 'table': table, 'plan': plan, 'ok': not full_scan})
+    return results
@@ -0,0 +1,169 @@
+from models import db, User, Request
+from models.transaction import VacationBalance
+from services.occupancy import get_absences_by_department, daily_occupancy
+from sqlalchemy.orm import joinedload
+from datetime import date, timedelta
+
+# Días que se puede desplazar una solicitud rechazada al buscar alternativas
+MAX_SHIFT_DAYS = 30
+
+# Alternativas sugeridas como máximo por solicitud rechazada
+MAX_ALTERNATIVES = 3
+
+# Estrategias voraces: cada solicitud se acepta o rechaza una vez, en el orden que
+# marca la estrategia. 'longest_first' es una heurística (las más largas primero) y
+# no garantiza el máximo de días aprobados posible.
+STRATEGIES = ['longest_first', 'seniority']
+
+def _priority_key(strategy):
+    """Orden en que se intenta encajar cada solicitud según la estrategia"""
+    if strategy == 'seniority':
+        # Antigüedad: fecha de contratación más antigua primero (sin fecha, al final)
+        return lambda r: (r.user.hire_date or date.max, r.created_at, r.id)
+    # Las más largas primero (heurística, no el óptimo)
+    return lambda r: (-r.calculate_days(), r.created_at, r.id)
+
+def _entry(request_obj):
+    """Datos de una solicitud en el plan"""
+    return {
+        'request_id': request_obj.id,
+        'user_id': request_obj.user_id,
+        'user_name': request_obj.user.name,
+        'department_id': request_obj.user.department_id,
+        'start_date': request_obj.start_date.isoformat(),
+        'end_date': request_obj.end_date.isoformat(),
+        'days': request_obj.calculate_days()
+    }
+
+def _find_alternatives(request_obj, occupancy, capacity, window_start, busy_days):
+    """Ventanas de la misma duración, lo más cerca posible de la original, sin días llenos"""
+    length = (request_obj.end_date - request_obj.start_date).days + 1
+    
+    # Día bloqueado: departamento lleno o el empleado ya tiene vacaciones
+    blocked = [1 if count >= capacity or day in busy_days else 0
+               for day, count in enumerate(occupancy)]
+    prefix = [0]
+    for value in blocked:
+        prefix.append(prefix[-1] + value)
+    
+    original = (request_obj.start_date - window_start).days
+    today = date.today()
+    alternatives = []
+    
+    # Desplazamientos alternos: +1, -1, +2, -2...
+    for shift in range(1, MAX_SHIFT_DAYS + 1):
+        for offset in (original + shift, original - shift):
+            if offset < 0 or offset + length > len(occupancy):
+                continue
+            start = window_start + timedelta(days=offset)
+            if start < today or prefix[offset + length] - prefix[offset]:
+                continue
+            alternatives.append({
+                'start_date': start.isoformat(),
+                'end_date': (start + timedelta(days=length - 1)).isoformat()
+            })
+            if len(alternatives) == MAX_ALTERNATIVES:
+                return alternatives
+    
+    return alternatives
+
+def plan_vacations(start_date, end_date, department_id=None, strategy='longest_first'):
+    """Elegir de forma voraz qué vacaciones pendientes del periodo se pueden aprobar sin superar límites"""
+    query = Request.query.options(
+        joinedload(Request.user).joinedload(User.department)
+    ).join(User, User.id == Request.user_id).filter(
+        Request.type == 'vacation',
+        Request.status == 'pending',
+        Request.start_date <= end_date,
+        Request.end_date >= start_date
+    )
+    if department_id:
+        query = query.filter(User.department_id == department_id)
+    pending = query.all()
+    
+    plan = {'strategy': strategy, 'approve': [], 'reject': [], 'approved_days': 0}
+    if not pending:
+        return plan
+    
+    # Ventana de trabajo: el periodo, las solicitudes y el margen para alternativas
+    window_start = min(start_date, min(r.start_date for r in pending)) - timedelta(days=MAX_SHIFT_DAYS)
+    window_end = max(end_date, max(r.end_date for r in pending)) + timedelta(days=MAX_SHIFT_DAYS)
+    total_days = (window_end - window_start).days + 1
+    
+    user_ids = {r.user_id for r in pending}
+    departments = {r.user.department_id: r.user.department for r in pending}
+    
+    # Ocupación diaria de partida por departamento: una consulta + barrido de extremos
+    absences = get_absences_by_department(set(departments), window_start, window_end)
+    occupancy = {dept_id: daily_occupancy(absences.get(dept_id, []), window_start, window_end)
+                 for dept_id in departments}
+    
+    # Saldos del libro mayor (materializados) por (usuario, año de vacaciones)
+    balances = {(user_id, year): days for user_id, year, days in db.session.query(
+        VacationBalance.user_id, VacationBalance.year, VacationBalance.days
+    ).filter(
+        VacationBalance.user_id.in_(user_ids),
+        VacationBalance.year.in_({r.user.get_vacation_year(r.start_date) for r in pending})
+    ).all()}
+    
+    # Días ya ocupados por cada empleado con vacaciones aprobadas
+    busy_days = {user_id: set() for user_id in user_ids}
+    for user_id, absence_start, absence_end in db.session.query(
+        Request.user_id, Request.start_date, Request.end_date
+    ).filter(
+        Request.user_id.in_(user_ids),
+        Request.type == 'vacation',
+        Request.status == 'approved',
+        Request.start_date <= window_end,
+        Request.end_date >= window_start
+    ).all():
+        first = max((absence_start - window_start).days, 0)
+        last = min((absence_end - window_start).days, total_days - 1)
+        busy_days[user_id].update(range(first, last + 1))
+    
+    pending_by_user = {}
+    for r in pending:
+        pending_by_user.setdefault(r.user_id, []).append(r)
+    
+    for request_obj in sorted(pending, key=_priority_key(strategy)):
+        user = request_obj.user
+        department = user.department
+        dept_occupancy = occupancy[department.id]
+        first = (request_obj.start_date - window_start).days
+        last = (request_obj.end_date - window_start).days
+        requested_days = request_obj.calculate_days()
+        balance_key = (user.id, user.get_vacation_year(request_obj.start_date))
+        
+        reason = None
+        # Igual que la aprobación manual: no puede solapar con otra pendiente del empleado
+        if any(other.id != request_obj.id and other.start_date <= request_obj.end_date
+               and other.end_date >= request_obj.start_date for other in pending_by_user[user.id]):
+            reason = 'Se solapa con otra solicitud pendiente del empleado'
+        elif any(day in busy_days[user.id] for day in range(first, last + 1)):
+            reason = 'Se solapa con vacaciones ya aprobadas del empleado'
+        elif requested_days > balances.get(balance_key, 0):
+            reason = f'Saldo insuficiente ({balances.get(balance_key, 0)} días disponibles)'
+        elif max(dept_occupancy[first:last + 1]) >= department.max_concurrent_vacations:
+            reason = f'Supera el máximo de {department.max_concurrent_vacations} empleado(s) a la vez en {department.name}'
+        
+        if reason:
+            entry = _entry(request_obj)
+            entry['reason'] = reason
+            entry['alternatives'] = _find_alternatives(
+                request_obj, dept_occupancy, department.max_concurrent_vacations,
+                window_start, busy_days[user.id]
+            ) if requested_days <= balances.get(balance_key, 0) else []
+            plan['reject'].append(entry)
+            continue
+        
+        # Aceptada: cuenta para el saldo, la ocupación y los días del empleado
+        balances[balance_key] = balances.get(balance_key, 0) - requested_days
+        busy_days[user.id].update(range(first, last + 1))
+        if user.role == 'employee' and user.is_active:
+            for day in range(first, last + 1):
+                dept_occupancy[day] += 1
+        
+        plan['approve'].append(_entry(request_obj))
+        plan['approved_days'] += requested_days
+    
+    return plan
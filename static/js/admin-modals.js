@@ -30,8 +30,9 @@ class AdminModalsManager {
                 const deptName = button.getAttribute('data-dept-name');
                 const maxConcurrent = button.getAttribute('data-dept-max-concurrent');
                 const vacationDays = button.getAttribute('data-dept-vacation-days');
+                const yearStartMonth = button.getAttribute('data-dept-year-start-month');
                 
-                this.populateEditDepartmentModal(deptId, deptName, maxConcurrent, vacationDays);
+                this.populateEditDepartmentModal(deptId, deptName, maxConcurrent, vacationDays, yearStartMonth);
             });
         }
     }
@@ -75,7 +76,7 @@ class AdminModalsManager {
     /**
      * Poblar modal de editar departamento
      */
-    populateEditDepartmentModal(deptId, deptName, maxConcurrent, vacationDays) {
+    populateEditDepartmentModal(deptId, deptName, maxConcurrent, vacationDays, yearStartMonth) {
         const editDepartmentForm = document.getElementById('editDepartmentForm');
         if (editDepartmentForm) {
             editDepartmentForm.action = `/admin/departments/${deptId}/edit`;
@@ -92,6 +93,10 @@ class AdminModalsManager {
         if (editDeptVacationDays) {
             editDeptVacationDays.value = vacationDays;
         }
+        const editDeptYearStartMonth = document.getElementById('editDeptYearStartMonth');
+        if (editDeptYearStartMonth) {
+            editDeptYearStartMonth.value = yearStartMonth || '1';
+        }
     }
 
     /**
@@ -16,8 +16,8 @@ function validateVacationDates() {
         return;
     }
     
-    fetch(`/api/validate-dates?start_date=${startDate}&end_date=${endDate}&type=vacation`)
-        .then(response => response.json())
+    // Disponibilidad cacheada por trimestre (date-range.js): sin petición por cada cambio
+    checkRequestDates(startDate, endDate, 'vacation')
         .then(data => {
             resultDiv.style.display = 'block';
             if (data.available) {
@@ -3,6 +3,137 @@
  * Implementación directa sin complicaciones
  */
 
+/**
+ * Disponibilidad de fechas del usuario por trimestres
+ * Una petición a /api/availability por trimestre; el resto se valida en el cliente
+ */
+class DateAvailability {
+    constructor() {
+        this.quarters = new Map();
+    }
+
+    formatDate(date) {
+        const year = date.getFullYear();
+        const month = String(date.getMonth() + 1).padStart(2, '0');
+        const day = String(date.getDate()).padStart(2, '0');
+        return `${year}-${month}-${day}`;
+    }
+
+    parseDate(value) {
+        const [year, month, day] = value.split('-').map(Number);
+        return new Date(year, month - 1, day);
+    }
+
+    quarterKey(date) {
+        return `${date.getFullYear()}-Q${Math.floor(date.getMonth() / 3) + 1}`;
+    }
+
+    loadQuarter(date) {
+        const key = this.quarterKey(date);
+        if (!this.quarters.has(key)) {
+            const firstMonth = Math.floor(date.getMonth() / 3) * 3;
+            const start = new Date(date.getFullYear(), firstMonth, 1);
+            const end = new Date(date.getFullYear(), firstMonth + 3, 0);
+            
+            const request = fetch(`/api/availability?start=${this.formatDate(start)}&end=${this.formatDate(end)}`)
+                .then(response => {
+                    if (!response.ok) throw new Error(`HTTP ${response.status}`);
+                    return response.json();
+                })
+                .then(data => ({
+                    own: new Set(data.own_days),
+                    capacity: new Set(data.capacity_days),
+                    maxConcurrent: data.max_concurrent,
+                    yearStartMonth: data.year_start_month,
+                    balances: data.balances
+                }))
+                .catch(error => {
+                    // Sin datos se vuelve a intentar la próxima vez
+                    this.quarters.delete(key);
+                    throw error;
+                });
+            this.quarters.set(key, { request: request, data: null });
+            request.then(data => {
+                const entry = this.quarters.get(key);
+                if (entry) entry.data = data;
+            }).catch(() => {});
+        }
+        return this.quarters.get(key).request;
+    }
+
+    loadRange(start, end) {
+        // Trimestres que cubren el rango (normalmente uno o dos)
+        const loads = [];
+        const cursor = new Date(start.getFullYear(), Math.floor(start.getMonth() / 3) * 3, 1);
+        while (cursor <= end) {
+            loads.push(this.loadQuarter(cursor));
+            cursor.setMonth(cursor.getMonth() + 3);
+        }
+        return Promise.all(loads);
+    }
+
+    getStatus(date) {
+        // 'own', 'capacity', 'free' o null si el trimestre aún no está cargado
+        const entry = this.quarters.get(this.quarterKey(date));
+        if (!entry || !entry.data) return null;
+        
+        const key = this.formatDate(date);
+        if (entry.data.own.has(key)) return 'own';
+        if (entry.data.capacity.has(key)) return 'capacity';
+        return 'free';
+    }
+
+    isBlocked(date) {
+        const status = this.getStatus(date);
+        return status === 'own' || status === 'capacity';
+    }
+
+    check(startDate, endDate) {
+        // Misma respuesta que /api/validate-dates para vacaciones, sin ir al servidor por cada cambio
+        const start = this.parseDate(startDate);
+        const end = this.parseDate(endDate);
+        
+        return this.loadRange(start, end).then(quarters => {
+            const ownDays = [];
+            const capacityDays = [];
+            for (const day = new Date(start); day <= end; day.setDate(day.getDate() + 1)) {
+                const status = this.getStatus(day);
+                if (status === 'own') ownDays.push(new Date(day));
+                if (status === 'capacity') capacityDays.push(new Date(day));
+            }
+            
+            if (ownDays.length > 0) {
+                return { available: false, message: 'Ya tienes una solicitud para fechas que se solapan con estas.' };
+            }
+            
+            if (capacityDays.length > 0) {
+                let daysText = capacityDays.slice(0, 3).map(day => day.toLocaleDateString('es-ES')).join(', ');
+                if (capacityDays.length > 3) daysText += ` y ${capacityDays.length - 3} más`;
+                return {
+                    available: false,
+                    message: `Ya hay ${quarters[0].maxConcurrent} empleado(s) de vacaciones en esas fechas (${daysText}).`
+                };
+            }
+            
+            const days = Math.round((end - start) / (1000 * 60 * 60 * 24)) + 1;
+            // Año de vacaciones del departamento en que empiezan (el que se cobra)
+            const year = start.getMonth() + 1 >= quarters[0].yearStartMonth ? start.getFullYear() : start.getFullYear() - 1;
+            const balance = quarters[0].balances[String(year)];
+            let message = `Solicitas ${days} días.`;
+            if (balance !== undefined) {
+                message += ` Te quedarían ${balance - days} días de ${year}.`;
+            }
+            return { available: true, message: message, days: days };
+        });
+    }
+
+    invalidate() {
+        this.quarters.clear();
+    }
+}
+
+window.dateAvailability = new DateAvailability();
+
 class FlatpickrRanges {
     constructor() {
         this.instances = new Map();
@@ -65,13 +196,22 @@ class FlatpickrRanges {
             minDate: 'today',
             showMonths: window.innerWidth > 768 ? 2 : 1,
             static: false,
+            // Días imposibles en gris: solicitudes propias o departamento completo
+            disable: [date => window.dateAvailability.isBlocked(date)],
             onChange: (selectedDates, dateStr, instance) => {
                 this.handleRangeChange(selectedDates, input, startHidden, endHidden);
                 this.validateDates(modal);
             },
-            onReady: () => {
+            onReady: (selectedDates, dateStr, instance) => {
                 // Cargar fechas existentes si las hay
                 this.loadExistingDates(input, startHidden, endHidden);
+                this.loadVisibleAvailability(instance);
+            },
+            onMonthChange: (selectedDates, dateStr, instance) => {
+                this.loadVisibleAvailability(instance);
+            },
+            onYearChange: (selectedDates, dateStr, instance) => {
+                this.loadVisibleAvailability(instance);
             }
         };
 
@@ -126,6 +266,16 @@ class FlatpickrRanges {
         console.log(`✅ Recovery picker inicializado en ${modalId}`);
     }
 
+    loadVisibleAvailability(instance) {
+        // Cargar los trimestres de los meses visibles y repintar al llegar los datos
+        const first = new Date(instance.currentYear, instance.currentMonth, 1);
+        const last = new Date(instance.currentYear, instance.currentMonth + instance.config.showMonths, 0);
+        
+        window.dateAvailability.loadRange(first, last)
+            .then(() => instance.redraw())
+            .catch(error => console.error('Error cargando disponibilidad:', error));
+    }
+
     handleRangeChange(selectedDates, input, startHidden, endHidden) {
         if (selectedDates.length === 1) {
             // Solo inicio seleccionado
@@ -194,18 +344,20 @@ class FlatpickrRanges {
             return;
         }
         
-        // Validar con API
-        const type = modal.querySelector('select[name="type"]')?.value || 'vacation';
+        // Validar con la disponibilidad ya cargada; agrupar cambios seguidos en una sola validación
+        const type = modal.querySelector('select[name="type"], input[name="type"]')?.value || 'vacation';
         
-        fetch(`/api/validate-dates?start_date=${startDate}&end_date=${endDate}&type=${type}`)
-            .then(response => response.json())
-            .then(data => {
-                this.setValidationState(validationDiv, submitBtn, data.available, data.message);
-            })
-            .catch(error => {
-                console.error('Error validando:', error);
-                this.setValidationState(validationDiv, submitBtn, false, 'Error al validar fechas');
-            });
+        clearTimeout(this.validationTimer);
+        this.validationTimer = setTimeout(() => {
+            checkRequestDates(startDate, endDate, type)
+                .then(data => {
+                    this.setValidationState(validationDiv, submitBtn, data.available, data.message);
+                })
+                .catch(error => {
+                    console.error('Error validando:', error);
+                    this.setValidationState(validationDiv, submitBtn, false, 'Error al validar fechas');
+                });
+        }, 150);
     }
 
     validateRecovery(modal) {
@@ -287,6 +439,15 @@ class FlatpickrRanges {
     }
 }
 
+// Validación de un rango: vacaciones en el cliente, recuperaciones en el servidor
+function checkRequestDates(startDate, endDate, type) {
+    if (type === 'vacation') {
+        return window.dateAvailability.check(startDate, endDate);
+    }
+    return fetch(`/api/validate-dates?start_date=${startDate}&end_date=${endDate}&type=${type}`)
+        .then(response => response.json());
+}
+
 // Instancia global
 window.flatpickrRanges = new FlatpickrRanges();
 
@@ -86,4 +86,37 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         });
     }
-});
\ No newline at end of file
+});
+async function loadMoreHolidays(btn) {
+    const tbody = document.getElementById(btn.dataset.target);
+    if (!tbody) return;
+    
+    const originalContent = btn.innerHTML;
+    btn.innerHTML = '<i class="ti ti-loader"></i>';
+    btn.disabled = true;
+    
+    // Mismos filtros que la página actual + sección y cursor de la última fila cargada
+    const params = new URLSearchParams(window.location.search);
+    params.set('section', btn.dataset.section);
+    params.set('cursor', btn.dataset.nextCursor);
+    
+    try {
+        const response = await fetch(`/holidays/page?${params.toString()}`);
+        if (!response.ok) throw new Error('Network response was not ok');
+        
+        const data = await response.json();
+        tbody.insertAdjacentHTML('beforeend', data.html);
+        
+        if (data.next_cursor) {
+            btn.dataset.nextCursor = data.next_cursor;
+            btn.innerHTML = originalContent;
+            btn.disabled = false;
+        } else {
+            btn.closest('.card-footer').remove();
+        }
+    } catch (error) {
+        console.error('Error loading more holidays:', error);
+        btn.innerHTML = originalContent;
+        btn.disabled = false;
+    }
+}
@@ -1,5 +1,7 @@
 // Sistema de notificaciones moderno y robusto
 let notificationPolling;
+let notificationStream;
+let notificationCount = 0;
 let lastUpdateTime = new Date();
 
 document.addEventListener('DOMContentLoaded', function() {
@@ -8,11 +10,84 @@ document.addEventListener('DOMContentLoaded', function() {
 });
 
 function initializeNotificationSystem() {
-    updateNotificationBadge();
+    // Canal en tiempo real (SSE); el polling queda como respaldo
+    if (window.EventSource) {
+        connectNotificationStream();
+    } else {
+        updateNotificationBadge();
+        startNotificationPolling();
+    }
+}
+
+// Sin canal, polling cada 30 s; con el canal abierto, uno lento de reconciliación: el
+// canal es del proceso y no recibe lo que se publica en otros workers ni en el outbox aparte
+const POLLING_INTERVAL = 30000;
+const RECONCILE_INTERVAL = 120000;
+let notificationPollingInterval = null;
+
+function startNotificationPolling(interval = POLLING_INTERVAL) {
+    if (notificationPolling && notificationPollingInterval === interval) return;
+    
+    stopNotificationPolling();
+    notificationPollingInterval = interval;
     notificationPolling = setInterval(() => {
         updateNotificationBadge();
         updateLastUpdateDisplay();
-    }, 30000);
+    }, interval);
+}
+
+function stopNotificationPolling() {
+    clearInterval(notificationPolling);
+    notificationPolling = null;
+    notificationPollingInterval = null;
+}
+
+function connectNotificationStream() {
+    notificationStream = new EventSource('/api/notifications/stream');
+    
+    notificationStream.onopen = function() {
+        startNotificationPolling(RECONCILE_INTERVAL);
+    };
+    
+    // Contador completo (al conectar y al marcar como leídas)
+    notificationStream.addEventListener('unread', function(event) {
+        const data = JSON.parse(event.data);
+        setNotificationBadge(data.count);
+        lastUpdateTime = new Date();
+    });
+    
+    // Notificación nueva
+    notificationStream.addEventListener('notification', function(event) {
+        setNotificationBadge(notificationCount + 1);
+        lastUpdateTime = new Date();
+        
+        const dropdown = document.querySelector('.notification-dropdown');
+        if (dropdown && dropdown.classList.contains('show')) {
+            loadNotificationsList();
+        }
+    });
+    
+    notificationStream.onerror = function() {
+        // EventSource reintenta solo; si el servidor cierra el canal, volvemos al polling
+        if (notificationStream.readyState === EventSource.CLOSED) {
+            updateNotificationBadge();
+            startNotificationPolling();
+        }
+    };
+}
+
+function setNotificationBadge(count) {
+    notificationCount = count;
+    const badge = document.getElementById('notification-badge');
+    
+    if (badge) {
+        if (count > 0) {
+            badge.textContent = count > 99 ? '99+' : count;
+            badge.classList.remove('d-none');
+        } else {
+            badge.classList.add('d-none');
+        }
+    }
 }
 
 async function updateNotificationBadge() {
@@ -21,16 +96,7 @@ async function updateNotificationBadge() {
         if (!response.ok) throw new Error('Network response was not ok');
         
         const data = await response.json();
-        const badge = document.getElementById('notification-badge');
-        
-        if (badge) {
-            if (data.count > 0) {
-                badge.textContent = data.count > 99 ? '99+' : data.count;
-                badge.classList.remove('d-none');
-            } else {
-                badge.classList.add('d-none');
-            }
-        }
+        setNotificationBadge(data.count);
         
         lastUpdateTime = new Date();
     } catch (error) {
@@ -80,6 +146,7 @@ function marcarNotificacionesLeidas() {
     if (badge) {
         badge.classList.add('d-none');
     }
+    notificationCount = 0;
     
     // 2. Le mandamos el aviso silencioso al servidor
     fetch('/notificaciones/leer', {
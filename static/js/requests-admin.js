@@ -51,4 +51,81 @@ function showEditModal(requestId, userName, type, status, startDate, endDate, re
     document.getElementById('editRequestEndDate').value = endDate;
     document.getElementById('editRequestReason').value = reason;
     new bootstrap.Modal(document.getElementById('editRequestModal')).show();
-}
\ No newline at end of file
+}
+
+async function loadMoreHistory() {
+    const btn = document.getElementById('loadMoreHistory');
+    const tbody = document.getElementById('historyRequestsBody');
+    if (!btn || !tbody) return;
+    
+    const originalContent = btn.innerHTML;
+    btn.innerHTML = '<i class="ti ti-loader"></i>';
+    btn.disabled = true;
+    
+    // Mismos filtros que la página actual + cursor de la última fila cargada
+    const params = new URLSearchParams(window.location.search);
+    params.set('cursor', btn.dataset.nextCursor);
+    
+    try {
+        const response = await fetch(`/requests/history?${params.toString()}`);
+        if (!response.ok) throw new Error('Network response was not ok');
+        
+        const data = await response.json();
+        tbody.insertAdjacentHTML('beforeend', data.html);
+        
+        if (data.next_cursor) {
+            btn.dataset.nextCursor = data.next_cursor;
+            btn.innerHTML = originalContent;
+            btn.disabled = false;
+        } else {
+            btn.closest('.card-footer').remove();
+        }
+    } catch (error) {
+        console.error('Error loading more requests:', error);
+        btn.innerHTML = originalContent;
+        btn.disabled = false;
+    }
+}
+
+function toggleAllPending(checked) {
+    document.querySelectorAll('.pending-select').forEach(cb => cb.checked = checked);
+}
+
+async function batchReview(action) {
+    const ids = Array.from(document.querySelectorAll('.pending-select:checked')).map(cb => parseInt(cb.value));
+    if (ids.length === 0) {
+        alert('Selecciona al menos una solicitud');
+        return;
+    }
+    
+    let reason = null;
+    if (action === 'approve') {
+        if (!confirm(`¿Aprobar ${ids.length} solicitud(es)? Se procesan por orden de llegada.`)) return;
+    } else {
+        reason = prompt(`Motivo del rechazo para ${ids.length} solicitud(es) (opcional):`);
+        if (reason === null) return;
+    }
+    
+    try {
+        const response = await fetch('/requests/batch', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ action: action, ids: ids, reason: reason })
+        });
+        const data = await response.json();
+        if (!response.ok || !data.success) {
+            alert(data.message || 'Error al procesar el lote');
+            return;
+        }
+        
+        // Informe por solicitud: solo se detallan las que no se pudieron procesar
+        const failures = data.results.filter(r => !r.success).map(r => `#${r.id}: ${r.message}`);
+        let summary = `${data.processed} procesada(s), ${data.failed} con error.`;
+        if (failures.length) summary += '\n\n' + failures.join('\n');
+        alert(summary);
+        location.reload();
+    } catch (error) {
+        console.error('Error in batch review:', error);
+        alert('Error al procesar el lote');
+    }
+}
@@ -33,9 +33,8 @@ function validateDates() {
         return;
     }
     
-    // El resto igual que antes
-    fetch(`/api/validate-dates?start_date=${startDate}&end_date=${endDate}&type=${type}`)
-        .then(response => response.json())
+    // Disponibilidad cacheada por trimestre (date-range.js): sin petición por cada cambio
+    checkRequestDates(startDate, endDate, type)
         .then(data => {
             resultDiv.style.display = 'block';
             if (data.available) {
@@ -36,8 +36,8 @@ function validateVacationDates() {
     resultDiv.innerHTML = '<div class="d-flex align-items-center"><i class="ti ti-loader me-2"></i><div>Validando fechas...</div></div>';
     submitBtn.disabled = true;
     
-    fetch(`/api/validate-dates?start_date=${startDate}&end_date=${endDate}&type=vacation`)
-        .then(response => response.json())
+    // Disponibilidad cacheada por trimestre (date-range.js): sin petición por cada cambio
+    checkRequestDates(startDate, endDate, 'vacation')
         .then(data => {
             resultDiv.style.display = 'block';
             if (data.available) {
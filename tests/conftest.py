@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+from sqlalchemy import event
+
+# Base de datos en memoria y sin hilo del outbox: antes de importar config
+os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+os.environ['OUTBOX_WORKER_ENABLED'] = '0'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from models import db
+
+@pytest.fixture
+def app():
+    """Aplicación con una base de datos nueva (tablas, migraciones y datos iniciales)"""
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def count_queries(app):
+    """Ejecutar una función y devolver (resultado, número de sentencias SQL)"""
+    def run(func, *args, **kwargs):
+        statements = []
+        listener = lambda *event_args: statements.append(event_args[2])
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        return result, len(statements)
+    return run
@@ -0,0 +1,79 @@
+import pytest
+
+from models import db, User, VacationTransaction, VacationBalance
+from services import annual_load
+from services.annual_load import run_year_rollover, load_users
+
+YEAR = 2031
+
+def _loads_per_user(year):
+    return dict(db.session.query(VacationTransaction.user_id, db.func.count(VacationTransaction.id)).filter(
+        VacationTransaction.year == year,
+        VacationTransaction.transaction_type == 'annual_load'
+    ).group_by(VacationTransaction.user_id).all())
+
+def _active_ids():
+    return {user_id for (user_id,) in db.session.query(User.id).filter(User.is_active == True)}
+
+def test_rollover_twice_loads_each_user_once(app):
+    assert _active_ids()
+    first = run_year_rollover(YEAR)
+    assert first['users'] == len(_active_ids())
+    
+    second = run_year_rollover(YEAR)
+    assert (second['users'], second['annual_load'], second['carryover']) == (0, 0, 0)
+    
+    assert _loads_per_user(YEAR) == {user_id: 1 for user_id in _active_ids()}
+    assert {user.vacation_loaded_year for user in User.query.filter_by(is_active=True)} == {YEAR}
+
+def test_rollover_carries_over_the_previous_balance(app):
+    run_year_rollover(YEAR)
+    user = User.query.filter_by(is_active=True).first()
+    VacationTransaction.record(user.id, YEAR, -5, 'vacation_consumed')
+    db.session.commit()
+    left = VacationBalance.get_days(user.id, YEAR)
+    
+    run_year_rollover(YEAR + 1)
+    carryover = VacationTransaction.query.filter_by(user_id=user.id, year=YEAR + 1, transaction_type='carryover').one()
+    assert carryover.days == left
+    assert VacationBalance.get_days(user.id, YEAR + 1) == left + user.get_vacation_days_per_year(YEAR + 1)
+
+def _stale_pending_users(monkeypatch, already_loaded, times):
+    """Simular otro proceso: las primeras 'times' lecturas no ven la carga ya hecha de un usuario"""
+    real = annual_load._pending_users
+    calls = {'count': 0}
+    
+    def pending_users(year, user_ids=None, department_ids=None):
+        calls['count'] += 1
+        users = real(year, user_ids, department_ids)
+        if calls['count'] <= times:
+            users.append(db.session.get(User, already_loaded))
+        return users
+    
+    monkeypatch.setattr(annual_load, '_pending_users', pending_users)
+    return calls
+
+def test_unique_load_conflict_is_retried_without_the_loaded_user(app, monkeypatch):
+    user = User.query.filter_by(is_active=True).first()
+    # Otro proceso ya cargó a este usuario
+    load_users([user], YEAR)
+    db.session.commit()
+    
+    calls = _stale_pending_users(monkeypatch, user.id, times=1)
+    summary = run_year_rollover(YEAR)
+    
+    # El primer intento choca con unique_user_year_load y se repite sin él
+    assert calls['count'] == 2
+    assert summary['users'] == len(_active_ids()) - 1
+    assert _loads_per_user(YEAR) == {user_id: 1 for user_id in _active_ids()}
+
+def test_rollover_gives_up_after_max_attempts(app, monkeypatch):
+    user = User.query.filter_by(is_active=True).first()
+    load_users([user], YEAR)
+    db.session.commit()
+    
+    calls = _stale_pending_users(monkeypatch, user.id, times=annual_load.MAX_ATTEMPTS)
+    with pytest.raises(RuntimeError):
+        run_year_rollover(YEAR)
+    assert calls['count'] == annual_load.MAX_ATTEMPTS
+    assert _loads_per_user(YEAR) == {user.id: 1}
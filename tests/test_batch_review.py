@@ -0,0 +1,95 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from models import db, User, Department, Request, VacationTransaction, VacationBalance
+from services.batch_review import review_batch
+
+def _department(capacity):
+    department = Department(name=f'Lote {capacity}', max_concurrent_vacations=capacity, vacation_days_per_year=22)
+    db.session.add(department)
+    db.session.flush()
+    return department
+
+def _employee(department, name, balance=22):
+    user = User(email=f'{name}@example.com', name=name, department_id=department.id, role='employee',
+                hire_date=date(2020, 1, 1), password_hash='sin-login')
+    db.session.add(user)
+    db.session.flush()
+    VacationTransaction.record(user.id, 2030, balance, 'annual_load')
+    return user
+
+def _pending(user, start_date, days, created_minute):
+    request_obj = Request(user_id=user.id, type='vacation', status='pending', start_date=start_date,
+                          end_date=start_date + timedelta(days=days - 1),
+                          created_at=datetime(2030, 1, 1, 9, created_minute))
+    db.session.add(request_obj)
+    db.session.flush()
+    return request_obj
+
+@pytest.fixture
+def admin(app):
+    return User.query.filter_by(role='admin').first()
+
+def _outcome(results):
+    return {result['id']: result['success'] for result in results}
+
+def test_requests_are_processed_in_arrival_order_against_capacity(app, admin):
+    department = _department(capacity=1)
+    first = _pending(_employee(department, 'primera'), date(2030, 6, 1), 5, created_minute=1)
+    second = _pending(_employee(department, 'segunda'), date(2030, 6, 3), 5, created_minute=2)
+    db.session.commit()
+    
+    # El orden de los ids no importa: gana la que llegó antes
+    results = review_batch([second.id, first.id], 'approve', admin)
+    assert _outcome(results) == {first.id: True, second.id: False}
+    assert 'Ya hay 1 empleado(s)' in next(r['message'] for r in results if r['id'] == second.id)
+    assert (first.status, second.status) == ('approved', 'pending')
+
+def test_capacity_limit_reached_partway_through_the_batch(app, admin):
+    department = _department(capacity=2)
+    requests = [_pending(_employee(department, f'e{i}'), date(2030, 7, 1), 3, created_minute=i) for i in range(4)]
+    # Una que no solapa con ninguna sigue entrando aunque el hueco de julio esté lleno
+    later = _pending(_employee(department, 'tarde'), date(2030, 9, 1), 3, created_minute=10)
+    db.session.commit()
+    
+    results = review_batch([r.id for r in requests] + [later.id], 'approve', admin)
+    assert _outcome(results) == {requests[0].id: True, requests[1].id: True, requests[2].id: False,
+                                 requests[3].id: False, later.id: True}
+
+def test_balance_limit_reached_partway_through_the_batch(app, admin):
+    department = _department(capacity=5)
+    user = _employee(department, 'saldo', balance=6)
+    requests = [_pending(user, date(2030, month, 1), 3, created_minute=month) for month in (3, 4, 5)]
+    db.session.commit()
+    
+    results = review_batch([r.id for r in requests], 'approve', admin)
+    assert _outcome(results) == {requests[0].id: True, requests[1].id: True, requests[2].id: False}
+    assert VacationBalance.get_days(user.id, 2030) == 0
+
+def test_missing_and_already_reviewed_requests_are_reported(app, admin):
+    department = _department(capacity=5)
+    request_obj = _pending(_employee(department, 'unica'), date(2030, 6, 1), 2, created_minute=1)
+    request_obj.status = 'rejected'
+    db.session.commit()
+    
+    results = review_batch([request_obj.id, 999999], 'approve', admin)
+    assert _outcome(results) == {request_obj.id: False, 999999: False}
+
+@pytest.mark.parametrize('payload', [
+    {'action': 'approve', 'ids': '123'},
+    {'action': 'approve', 'ids': ['a']},
+    {'action': 'approve', 'ids': [1, 1]},
+    {'action': 'approve', 'ids': []},
+    {'action': 'archive', 'ids': [1]},
+    {'action': 'approve', 'ids': {'1': 1}},
+])
+def test_invalid_batches_return_400(app, admin, payload):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = admin.id
+        session['user_role'] = 'admin'
+    
+    response = client.post('/requests/batch', json=payload)
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
@@ -0,0 +1,46 @@
+from datetime import date, timedelta
+
+from models import db, User, Department, Request, WorkedHoliday, VacationTransaction
+from services.dashboard_summary import build_employees_summary, SUMMARY_QUERY_COUNT
+from utils import get_canary_time
+
+def _seed_employees(count, start=0):
+    """Empleados con carga anual, vacaciones de hoy, pendientes y festivos"""
+    departments = Department.query.all()
+    today = date.today()
+    for i in range(start, start + count):
+        user = User(
+            email=f'empleado{i}@example.com',
+            name=f'Empleado {i}',
+            department_id=departments[i % len(departments)].id,
+            role='employee',
+            hire_date=date(2020, 1, 1),
+            password_hash='sin-login'
+        )
+        db.session.add(user)
+        db.session.flush()
+        VacationTransaction.record(user.id, get_canary_time().year, 22, 'annual_load')
+        db.session.add(Request(user_id=user.id, type='vacation', status='approved' if i % 2 else 'pending',
+                               start_date=today - timedelta(days=1), end_date=today + timedelta(days=1)))
+        db.session.add(WorkedHoliday(user_id=user.id, date=today - timedelta(days=10), status='approved'))
+    db.session.commit()
+
+def test_summary_query_count_does_not_grow_with_employees(app, count_queries):
+    _seed_employees(5)
+    summary, queries = count_queries(build_employees_summary)
+    assert len(summary) == 5
+    assert queries == SUMMARY_QUERY_COUNT
+    
+    _seed_employees(5, start=5)
+    summary, queries = count_queries(build_employees_summary)
+    assert len(summary) == 10
+    assert queries == SUMMARY_QUERY_COUNT
+
+def test_summary_reads_the_materialised_balance(app):
+    _seed_employees(2)
+    user = User.query.filter_by(email='empleado0@example.com').one()
+    VacationTransaction.record(user.id, get_canary_time().year, -3, 'vacation_consumed')
+    db.session.commit()
+    
+    available = {row['employee'].email: row['vacation_days_available'] for row in build_employees_summary()}
+    assert available == {'empleado0@example.com': 19, 'empleado1@example.com': 22}
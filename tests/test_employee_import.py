@@ -0,0 +1,55 @@
+import multiprocessing
+
+from werkzeug.security import check_password_hash
+
+from models import User, Department
+from services import employee_import
+from services.employee_import import parse_csv, import_employees, MIN_PARALLEL_HASHES, DEFAULT_PASSWORD
+
+def test_rows_keep_their_line_in_the_file(app):
+    department = Department.query.first()
+    content = (
+        'name;email;department\n'
+        f'Ana;ana@example.com;{department.id}\n'
+        '\n'
+        f'"Luis\nPérez";luis@example.com;{department.id}\n'
+        f'Eva;sin-arroba;{department.id}\n'
+    )
+    rows = parse_csv(content.encode())
+    assert [line for line, _ in rows] == [2, 4, 6]
+    
+    report = import_employees(rows)
+    assert report['created'] == 2
+    assert [(result['row'], result['success']) for result in report['rows']] == [(2, True), (4, True), (6, False)]
+
+def test_parallel_hashing_keeps_row_order_without_respawning_the_app(app, monkeypatch):
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+    # Forzar el pool aunque la máquina tenga una sola CPU y anotar el contexto usado
+    monkeypatch.setattr(employee_import.os, 'cpu_count', lambda: 2)
+    contexts = []
+    executor = employee_import.ProcessPoolExecutor
+    
+    def recording_executor(*args, **kwargs):
+        contexts.append(kwargs['mp_context'].get_start_method())
+        return executor(*args, **kwargs)
+    
+    monkeypatch.setattr(employee_import, 'ProcessPoolExecutor', recording_executor)
+    
+    department = Department.query.first()
+    lines = ['name;email;department;password']
+    for number in range(MIN_PARALLEL_HASHES):
+        # Una fila sin contraseña usa la de por defecto
+        password = f'clave-{number}' if number else ''
+        lines.append(f'Temporero {number};temporero{number}@example.com;{department.id};{password}')
+    
+    report = import_employees(parse_csv('\n'.join(lines).encode()))
+    assert report['created'] == MIN_PARALLEL_HASHES
+    
+    # fork donde existe: con spawn cada hijo volvería a ejecutar "python wsgi.py" (create_app)
+    expected_method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+    assert contexts == [expected_method]
+    
+    for number in range(MIN_PARALLEL_HASHES):
+        user = User.query.filter_by(email=f'temporero{number}@example.com').one()
+        assert user.password_hash.startswith('pbkdf2:sha256:1000$')
+        assert check_password_hash(user.password_hash, f'clave-{number}' if number else DEFAULT_PASSWORD)
@@ -0,0 +1,84 @@
+import csv
+import io
+import zipfile
+
+import pytest
+
+from models import db, User, Department, VacationTransaction
+from services import export
+
+ROWS = 7
+
+@pytest.fixture
+def ledger(app, monkeypatch):
+    monkeypatch.setattr(export, 'CHUNK_SIZE', 2)
+    user = User(email='nomina@example.com', name='=Nómina', department_id=Department.query.first().id,
+                role='employee', password_hash='sin-login')
+    db.session.add(user)
+    db.session.flush()
+    for number in range(ROWS):
+        VacationTransaction.record(user.id, 2030, number + 1, 'adjustment', f'Apunte {number}')
+    db.session.commit()
+    return user
+
+def _count_rows(monkeypatch, name):
+    """Contar las filas formateadas hasta el momento"""
+    formatted = []
+    original = getattr(export, name)
+    
+    def counting(values, *args):
+        formatted.append(values)
+        return original(values, *args)
+    
+    monkeypatch.setattr(export, name, counting)
+    return formatted
+
+def test_csv_is_yielded_chunk_by_chunk(ledger, monkeypatch):
+    columns = len(export.EXPORTS['transactions']['columns'])
+    formatted = _count_rows(monkeypatch, '_csv_value')
+    pieces = export.iter_csv('transactions', user_id=ledger.id)
+    
+    # El primer trozo sale con el primer lote: el resto aún no se ha leído ni formateado
+    first = next(pieces)
+    assert len(formatted) == 2 * columns
+    assert len(first.splitlines()) == 3
+    
+    rest = list(pieces)
+    assert len(rest) == 3
+    assert len(formatted) == ROWS * columns
+    
+    rows = list(csv.reader(io.StringIO(first + ''.join(rest)), delimiter=';'))
+    assert rows[0][0] == '\ufeffID'
+    assert len(rows) == ROWS + 1
+    assert rows[1][1] == "'=Nómina"
+
+def test_xlsx_is_yielded_chunk_by_chunk_and_is_a_valid_zip(ledger, monkeypatch):
+    formatted = _count_rows(monkeypatch, '_xlsx_row')
+    pieces = export.iter_xlsx('transactions', user_id=ledger.id)
+    
+    # Cabecera y primer lote
+    first = next(pieces)
+    assert len(formatted) == 1 + 2
+    
+    rest = list(pieces)
+    assert len(rest) == 4
+    assert len(formatted) == 1 + ROWS
+    
+    with zipfile.ZipFile(io.BytesIO(first + b''.join(rest))) as workbook:
+        assert workbook.testzip() is None
+        sheet = workbook.read('xl/worksheets/sheet1.xml').decode()
+    assert sheet.count('<row>') == ROWS + 1
+    assert sheet.endswith('</sheetData></worksheet>')
+
+def test_export_endpoint_streams(app, ledger):
+    client = app.test_client()
+    admin = User.query.filter_by(role='admin').first()
+    with client.session_transaction() as session:
+        session['user_id'] = admin.id
+        session['user_role'] = admin.role
+    
+    response = client.get(f'/admin/export/transactions?format=csv&user_id={ledger.id}', buffered=False)
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert len(list(response.response)) == 4
+    response.close()
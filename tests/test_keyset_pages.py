@@ -0,0 +1,74 @@
+from datetime import date, datetime
+
+import pytest
+
+from models import db, User, Department, Request, WorkedHoliday
+
+@pytest.fixture
+def employee(app):
+    user = User(email='cursor@example.com', name='Cursor', department_id=Department.query.first().id,
+                role='employee', password_hash='sin-login')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+def _walk(get_page, limit):
+    """Recorrer todas las páginas siguiendo el cursor y devolver los ids en orden"""
+    ids, cursor = [], None
+    while True:
+        rows, cursor = get_page(cursor=cursor, limit=limit)
+        ids.extend(row.id for row in rows)
+        if not cursor:
+            return ids
+
+def test_request_pages_keep_every_row_when_created_at_ties(app, employee):
+    # Doce solicitudes con el mismo created_at y dos más alrededor: el id desempata
+    created = [datetime(2030, 1, 1, 9, 0)] * 12 + [datetime(2030, 1, 1, 10, 0), datetime(2030, 1, 1, 8, 0)]
+    for created_at in created:
+        db.session.add(Request(user_id=employee.id, type='vacation', status='rejected', created_at=created_at,
+                               start_date=date(2030, 6, 1), end_date=date(2030, 6, 2)))
+    db.session.commit()
+    
+    expected = [request_obj.id for request_obj in Request.query.filter_by(user_id=employee.id)
+                .order_by(Request.created_at.desc(), Request.id.desc())]
+    for limit in (1, 5, 12, 13):
+        ids = _walk(lambda **page: Request.get_admin_page(user_id=employee.id, **page), limit)
+        assert ids == expected
+
+def test_holiday_pages_keep_every_row_when_dates_tie(app):
+    # Un festivo por empleado y fecha: el empate sale de nueve empleados del mismo departamento
+    department = Department(name='Cursor', max_concurrent_vacations=1, vacation_days_per_year=22)
+    db.session.add(department)
+    db.session.flush()
+    for number in range(9):
+        user = User(email=f'cursor{number}@example.com', name=f'Cursor {number}', department_id=department.id,
+                    role='employee', password_hash='sin-login')
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(WorkedHoliday(user_id=user.id, date=date(2030, 1, 6), status='approved'))
+    db.session.add(WorkedHoliday(user_id=user.id, date=date(2030, 1, 1), status='rejected'))
+    db.session.add(WorkedHoliday(user_id=user.id, date=date(2030, 12, 25), status='approved'))
+    db.session.commit()
+    
+    expected = [holiday.id for holiday in WorkedHoliday.query.join(WorkedHoliday.user).filter(User.department_id == department.id)
+                .order_by(WorkedHoliday.date.desc(), WorkedHoliday.id.desc())]
+    assert len(expected) == 11
+    for limit in (1, 4, 9, 10):
+        ids = _walk(lambda **page: WorkedHoliday.get_admin_page(department_id=department.id, year=2030, **page), limit)
+        assert ids == expected
+
+def test_holiday_filters_reject_years_out_of_range(app):
+    client = app.test_client()
+    admin = User.query.filter_by(role='admin').first()
+    with client.session_transaction() as session:
+        session['user_id'] = admin.id
+        session['user_role'] = admin.role
+    
+    for year in ('1899', '3001', 'dosmil'):
+        assert client.get(f'/holidays?year={year}').status_code == 400
+        response = client.get(f'/holidays/page?year={year}')
+        assert response.status_code == 400
+        assert not response.get_json()['success']
+    
+    assert client.get('/holidays?year=2030').status_code == 200
+    assert client.get('/holidays?year=').status_code == 200
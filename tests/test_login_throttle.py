@@ -0,0 +1,83 @@
+import pytest
+from werkzeug.security import generate_password_hash
+
+from models import db, User, Department
+from services import login_throttle
+from services.login_throttle import _roll, _retry_after
+
+WINDOW = 900
+
+@pytest.fixture(autouse=True)
+def clean_throttle():
+    """Contadores y esquemas guardados de cada prueba desde cero (viven en el módulo)"""
+    login_throttle._counters.clear()
+    login_throttle._stored_methods.update(read_at=None, methods=frozenset())
+    yield
+    login_throttle._counters.clear()
+
+def test_roll_moves_the_counters_to_the_current_window():
+    now = 10 * WINDOW + 100
+    assert _roll(None, now, WINDOW) == (10, 0, 0)
+    assert _roll((10, 3, 2), now, WINDOW) == (10, 3, 2)
+    # La ventana anterior pasa a contar como "previous"; las más antiguas se olvidan
+    assert _roll((9, 4, 1), now, WINDOW) == (10, 0, 4)
+    assert _roll((7, 4, 1), now, WINDOW) == (10, 0, 0)
+
+def test_retry_after_weights_the_previous_window():
+    start = 10 * WINDOW
+    # 4 fallos en la ventana anterior y 3 en esta: a un cuarto de ventana pesan 4 * 0.75 + 3 = 6
+    assert _retry_after((10, 3, 4), start + WINDOW / 4, WINDOW, 5) == WINDOW / 4
+    # A mitad de ventana pesan 5 (aún bloqueado) y justo después, menos de 5
+    assert _retry_after((10, 3, 4), start + WINDOW / 2, WINDOW, 5) == 1
+    assert _retry_after((10, 3, 4), start + WINDOW / 2 + 1, WINDOW, 5) == 0
+    # Por debajo del límite no hay que esperar
+    assert _retry_after((10, 2, 0), start, WINDOW, 5) == 0
+
+def test_retry_after_with_the_current_window_full():
+    start = 10 * WINDOW
+    # 5 fallos ya en esta ventana: hasta el final de la siguiente no bajan de 5
+    assert _retry_after((10, 5, 0), start, WINDOW, 5) == WINDOW
+    assert _retry_after((10, 5, 0), start + WINDOW - 1, WINDOW, 5) == 1
+
+def _post_login(client, email, password):
+    return client.post('/login', data={'email': email, 'password': password})
+
+def test_too_many_failures_return_429_with_retry_after(app):
+    app.config.update(LOGIN_MAX_FAILURES_PER_EMAIL=3, LOGIN_MAX_FAILURES_PER_IP=100)
+    department = Department.query.first()
+    user = User(email='throttle@example.com', name='Throttle', department_id=department.id)
+    user.set_password('correcta')
+    db.session.add(user)
+    db.session.commit()
+    client = app.test_client()
+    
+    for _ in range(3):
+        assert _post_login(client, 'throttle@example.com', 'mala').status_code == 200
+    
+    # Bloqueado aunque la contraseña sea la buena, sin llegar a comprobarla
+    response = _post_login(client, 'throttle@example.com', 'correcta')
+    assert response.status_code == 429
+    assert 0 < int(response.headers['Retry-After']) <= app.config['LOGIN_WINDOW_SECONDS'] * 2
+    
+    # Otro email desde la misma IP sigue pudiendo entrar
+    assert _post_login(client, 'otro@example.com', 'mala').status_code == 200
+
+def test_dummy_hash_costs_like_the_slowest_stored_scheme(app, monkeypatch):
+    department = Department.query.first()
+    legacy_method = 'pbkdf2:sha256:600000'
+    db.session.add(User(email='antiguo@example.com', name='Antiguo', department_id=department.id,
+                        password_hash=generate_password_hash('x', method=legacy_method)))
+    db.session.commit()
+    
+    checked = []
+    monkeypatch.setattr(login_throttle, 'check_password_hash', lambda password_hash, password: checked.append(password_hash))
+    
+    login_throttle.verify_dummy_password('lo que sea')
+    assert checked[-1].startswith(legacy_method + '$')
+    
+    # Sin hashes antiguos se vuelve al esquema configurado
+    User.query.filter_by(email='antiguo@example.com').one().set_password('x')
+    db.session.commit()
+    login_throttle._stored_methods.update(read_at=None)
+    login_throttle.verify_dummy_password('lo que sea')
+    assert checked[-1].startswith(app.config['PASSWORD_HASH_METHOD'] + '$')
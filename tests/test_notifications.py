@@ -0,0 +1,47 @@
+from models import db, User, Notification
+from services.notification_dispatch import dispatch
+from views import api
+
+def _login(client, user):
+    with client.session_transaction() as session:
+        session['user_id'] = user.id
+        session['user_role'] = user.role
+
+def test_stream_closes_after_its_max_lifetime(app, monkeypatch):
+    monkeypatch.setattr(api, 'STREAM_MAX_SECONDS', 0.2)
+    monkeypatch.setattr(api, 'STREAM_KEEPALIVE_SECONDS', 0.05)
+    client = app.test_client()
+    _login(client, User.query.filter_by(role='admin').first())
+    
+    # El generador termina solo: el navegador reconectará y recibirá el contador de nuevo
+    body = client.get('/api/notifications/stream').get_data(as_text=True)
+    assert body.startswith('retry: 5000')
+    assert 'event: unread' in body
+    assert ': keepalive' in body
+
+def _unread_rows(user_id):
+    return Notification.query.filter_by(user_id=user_id, is_read=False).count()
+
+def test_unread_counter_matches_count_after_create_and_read(app):
+    admins = User.query.filter_by(role='admin', is_active=True).all()
+    user = admins[0]
+    
+    # Alta por el ORM (listener after_insert) y por el INSERT masivo
+    for number in range(3):
+        db.session.add(Notification(user_id=user.id, type='system', title=f'Aviso {number}'))
+    db.session.commit()
+    dispatch([admin.id for admin in admins], 'system', 'Aviso para todos')
+    db.session.commit()
+    for admin in admins:
+        assert Notification.get_unread_count_for_user(admin.id) == _unread_rows(admin.id)
+    assert Notification.get_unread_count_for_user(user.id) == 4
+    
+    # Marcar una dos veces solo descuenta una
+    notification = Notification.query.filter_by(user_id=user.id, is_read=False).first()
+    assert notification.mark_as_read()
+    assert notification.mark_as_read()
+    assert Notification.get_unread_count_for_user(user.id) == _unread_rows(user.id) == 3
+    
+    assert Notification.mark_all_as_read_for_user(user.id)
+    assert Notification.get_unread_count_for_user(user.id) == _unread_rows(user.id) == 0
+    assert Notification.reconcile_unread_counts() == []
@@ -0,0 +1,83 @@
+from datetime import date
+
+from models import db, User, Department, Request
+from services.occupancy import daily_occupancy, get_full_days
+
+START = date(2030, 3, 1)
+END = date(2030, 3, 10)
+
+def test_overlaps_count_distinct_employees_per_day():
+    absences = [
+        (1, date(2030, 3, 2), date(2030, 3, 4)),
+        (2, date(2030, 3, 4), date(2030, 3, 6)),
+        (3, date(2030, 3, 4), date(2030, 3, 4)),
+    ]
+    assert daily_occupancy(absences, START, END) == [0, 1, 1, 3, 1, 1, 0, 0, 0, 0]
+
+def test_ranges_touching_the_edges_are_clipped():
+    absences = [
+        (1, date(2030, 2, 20), date(2030, 3, 1)),   # acaba el primer día
+        (2, date(2030, 3, 10), date(2030, 3, 20)),  # empieza el último día
+        (3, date(2030, 2, 1), date(2030, 4, 1)),    # cubre todo el rango
+        (4, date(2030, 2, 1), date(2030, 2, 28)),   # acaba justo antes
+        (5, date(2030, 3, 11), date(2030, 3, 12)),  # empieza justo después
+    ]
+    assert daily_occupancy(absences, START, END) == [2, 1, 1, 1, 1, 1, 1, 1, 1, 2]
+    assert daily_occupancy(absences, START, START) == [2]
+    assert daily_occupancy(absences, END, START) == []
+
+def test_same_employee_is_counted_once_per_day():
+    absences = [
+        (1, date(2030, 3, 1), date(2030, 3, 3)),
+        (1, date(2030, 3, 3), date(2030, 3, 5)),   # solapado
+        (1, date(2030, 3, 6), date(2030, 3, 6)),   # contiguo
+        (1, date(2030, 3, 9), date(2030, 3, 10)),  # separado
+    ]
+    assert daily_occupancy(absences, START, END) == [1, 1, 1, 1, 1, 1, 0, 0, 1, 1]
+
+def _department_with_vacations(capacity):
+    department = Department(name='Ocupación', max_concurrent_vacations=capacity, vacation_days_per_year=22)
+    db.session.add(department)
+    db.session.flush()
+    users = []
+    for number, (start_date, end_date) in enumerate([(date(2030, 3, 2), date(2030, 3, 5)),
+                                                      (date(2030, 3, 5), date(2030, 3, 8))]):
+        user = User(email=f'ocupacion{number}@example.com', name=f'Ocupación {number}',
+                    department_id=department.id, role='employee', password_hash='sin-login')
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(Request(user_id=user.id, type='vacation', status='approved',
+                               start_date=start_date, end_date=end_date))
+        users.append(user)
+    db.session.commit()
+    return department, users
+
+def test_occupancy_map_headroom_and_excluded_user(app):
+    department, (first, second) = _department_with_vacations(capacity=2)
+    
+    occupancy_map = department.get_occupancy_map(START, END)
+    assert occupancy_map['occupancy'] == [0, 1, 1, 1, 2, 1, 1, 1, 0, 0]
+    assert occupancy_map['headroom'] == [2, 1, 1, 1, 0, 1, 1, 1, 2, 2]
+    assert get_full_days(occupancy_map) == [date(2030, 3, 5)]
+    assert department.get_peak_vacation_count(START, END) == 2
+    
+    # Reducir el máximo después de aprobar no deja holguras negativas
+    department.max_concurrent_vacations = 1
+    assert min(department.get_occupancy_map(START, END)['headroom']) == 0
+    
+    assert department.get_occupancy_map(START, END, exclude_user_id=first.id)['occupancy'] == [0, 0, 0, 0, 1, 1, 1, 1, 0, 0]
+
+def test_employee_shading_does_not_count_their_own_vacation(app):
+    department, (first, _) = _department_with_vacations(capacity=2)
+    client = app.test_client()
+    
+    def headroom_on_march_5(user):
+        with client.session_transaction() as session:
+            session['user_id'] = user.id
+            session['user_role'] = user.role
+        data = client.get(f'/api/occupancy/department/{department.id}?year=2030').get_json()
+        return data['headroom'][(date(2030, 3, 5) - date(2030, 1, 1)).days]
+    
+    # El admin ve el día completo; quien consulta aún cabe porque una de las dos plazas ocupadas es suya
+    assert headroom_on_march_5(User.query.filter_by(role='admin').first()) == 0
+    assert headroom_on_march_5(first) == 1
@@ -0,0 +1,76 @@
+from datetime import timedelta
+
+import pytest
+
+from models import db, User, Notification, OutboxEvent
+from services import outbox
+
+@pytest.fixture
+def user(app):
+    return User.query.filter_by(role='admin').first()
+
+def _enqueue(kind, payload):
+    event = OutboxEvent.enqueue(kind, payload)
+    db.session.commit()
+    return event.id
+
+def test_successful_delivery_marks_the_event_delivered_once(app, user):
+    unread = user.unread_notifications or 0
+    event_id = _enqueue('notification', {'user_id': user.id, 'type': 'info', 'title': 'Hola', 'message': 'Prueba'})
+    
+    assert outbox.deliver_pending() == (1, 1)
+    event = db.session.get(OutboxEvent, event_id)
+    assert (event.status, event.attempts) == ('delivered', 0)
+    assert event.delivered_at is not None
+    assert Notification.query.filter_by(user_id=user.id, title='Hola').count() == 1
+    db.session.refresh(user)
+    assert user.unread_notifications == unread + 1
+    
+    # Ya reclamado: una segunda entrega no hace nada
+    assert outbox.deliver_event(event_id) is False
+    assert OutboxEvent.get_due_ids() == []
+    assert Notification.query.filter_by(user_id=user.id, title='Hola').count() == 1
+
+def _failing_handler(monkeypatch, user):
+    def deliver(payload):
+        # Lo hecho antes del fallo se deshace con el reclamo
+        db.session.add(Notification(user_id=user.id, type='info', title='A medias', message='x'))
+        db.session.flush()
+        raise RuntimeError('servicio caído')
+    monkeypatch.setitem(outbox._handlers, 'boom', deliver)
+
+def test_failing_handler_leaves_the_event_pending_with_backoff(app, user, monkeypatch):
+    _failing_handler(monkeypatch, user)
+    event_id = _enqueue('boom', {})
+    
+    assert outbox.deliver_event(event_id) is False
+    event = db.session.get(OutboxEvent, event_id)
+    assert (event.status, event.attempts) == ('pending', 1)
+    assert event.last_error == 'RuntimeError: servicio caído'
+    assert event.delivered_at is None
+    assert Notification.query.filter_by(title='A medias').count() == 0
+    # Espera de 10 s antes del siguiente intento: todavía no está listo
+    assert event.available_at - event.created_at >= timedelta(seconds=9)
+    assert OutboxEvent.get_due_ids() == []
+    
+    # El segundo fallo dobla la espera
+    event.available_at = event.created_at
+    db.session.commit()
+    assert outbox.deliver_pending() == (0, 1)
+    event = db.session.get(OutboxEvent, event_id)
+    assert event.attempts == 2
+    assert event.available_at - event.created_at >= timedelta(seconds=19)
+
+def test_event_fails_after_max_attempts(app, user, monkeypatch):
+    _failing_handler(monkeypatch, user)
+    event_id = _enqueue('boom', {})
+    
+    for _ in range(OutboxEvent.MAX_ATTEMPTS):
+        event = db.session.get(OutboxEvent, event_id)
+        event.available_at = event.created_at
+        db.session.commit()
+        outbox.deliver_event(event_id)
+    
+    event = db.session.get(OutboxEvent, event_id)
+    assert (event.status, event.attempts) == ('failed', OutboxEvent.MAX_ATTEMPTS)
+    assert OutboxEvent.get_due_ids() == []
@@ -0,0 +1,7 @@
+from services.query_plans import check_query_plans
+
+def test_hot_queries_use_indexes(app):
+    results = check_query_plans()
+    assert results
+    full_scans = [f"{result['name']}: {' | '.join(result['plan'])}" for result in results if not result['ok']]
+    assert not full_scans, '\n'.join(full_scans)
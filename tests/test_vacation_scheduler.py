@@ -0,0 +1,96 @@
+from datetime import date, datetime, timedelta
+
+from models import db, User, Department, Request, VacationTransaction
+from services.vacation_scheduler import plan_vacations
+
+# Fechas lejanas: las alternativas nunca caen antes de hoy
+YEAR = 2090
+
+def _department(capacity):
+    department = Department(name='Planificación', max_concurrent_vacations=capacity, vacation_days_per_year=22)
+    db.session.add(department)
+    db.session.flush()
+    return department
+
+def _employee(department, name, hire_date=date(2020, 1, 1), balance=22):
+    user = User(email=f'{name}@example.com', name=name, department_id=department.id, role='employee',
+                hire_date=hire_date, password_hash='sin-login')
+    db.session.add(user)
+    db.session.flush()
+    VacationTransaction.record(user.id, YEAR, balance, 'annual_load')
+    return user
+
+def _request(user, start_day, days, created_minute, status='pending'):
+    start_date = date(YEAR, 6, start_day)
+    request_obj = Request(user_id=user.id, type='vacation', status=status, start_date=start_date,
+                          end_date=start_date + timedelta(days=days - 1),
+                          created_at=datetime(YEAR, 1, 1, 9, created_minute))
+    db.session.add(request_obj)
+    db.session.flush()
+    return request_obj
+
+def _plan(department, strategy):
+    plan = plan_vacations(date(YEAR, 6, 1), date(YEAR, 6, 30), department.id, strategy)
+    return [entry['request_id'] for entry in plan['approve']], {entry['request_id']: entry for entry in plan['reject']}
+
+def test_longest_first_prefers_the_longest_request(app):
+    department = _department(capacity=1)
+    short = _request(_employee(department, 'corta', hire_date=date(2010, 1, 1)), 1, 2, created_minute=1)
+    long = _request(_employee(department, 'larga'), 1, 5, created_minute=2)
+    db.session.commit()
+    
+    approved, rejected = _plan(department, 'longest_first')
+    assert approved == [long.id]
+    assert 'Supera el máximo de 1' in rejected[short.id]['reason']
+
+def test_longest_first_is_a_heuristic_not_the_optimum(app):
+    department = _department(capacity=1)
+    long = _request(_employee(department, 'larga'), 3, 5, created_minute=1)
+    before = _request(_employee(department, 'antes'), 1, 3, created_minute=2)
+    after = _request(_employee(department, 'despues'), 6, 3, created_minute=3)
+    db.session.commit()
+    
+    # Aprobar las dos de 3 días daría 6; la voraz se queda con la de 5
+    approved, rejected = _plan(department, 'longest_first')
+    assert approved == [long.id]
+    assert set(rejected) == {before.id, after.id}
+
+def test_seniority_prefers_the_oldest_hire(app):
+    department = _department(capacity=1)
+    senior = _request(_employee(department, 'veterana', hire_date=date(2005, 3, 1)), 1, 2, created_minute=2)
+    junior = _request(_employee(department, 'nueva', hire_date=date(2022, 3, 1)), 1, 5, created_minute=1)
+    no_date = _request(_employee(department, 'sin-fecha', hire_date=None), 2, 1, created_minute=0)
+    db.session.commit()
+    
+    approved, rejected = _plan(department, 'seniority')
+    assert approved == [senior.id]
+    assert set(rejected) == {junior.id, no_date.id}
+
+def test_capacity_counts_approved_vacations_and_suggests_alternatives(app):
+    department = _department(capacity=2)
+    _request(_employee(department, 'aprobada'), 10, 5, created_minute=0, status='approved')
+    first = _request(_employee(department, 'uno'), 10, 3, created_minute=1)
+    second = _request(_employee(department, 'dos'), 11, 3, created_minute=2)
+    db.session.commit()
+    
+    # Una plaza ya ocupada por la aprobada: solo cabe una más
+    approved, rejected = _plan(department, 'longest_first')
+    assert approved == [first.id]
+    alternatives = rejected[second.id]['alternatives']
+    assert alternatives
+    # Ninguna alternativa cae en los días que quedaron llenos (10-12 de junio)
+    for alternative in alternatives:
+        start = date.fromisoformat(alternative['start_date'])
+        end = date.fromisoformat(alternative['end_date'])
+        assert (end - start).days == 2
+        assert end < date(YEAR, 6, 10) or start > date(YEAR, 6, 12)
+
+def test_insufficient_balance_is_rejected_without_alternatives(app):
+    department = _department(capacity=3)
+    short_of_days = _request(_employee(department, 'sin-saldo', balance=2), 1, 3, created_minute=1)
+    db.session.commit()
+    
+    approved, rejected = _plan(department, 'longest_first')
+    assert approved == []
+    assert rejected[short_of_days.id]['reason'].startswith('Saldo insuficiente')
+    assert rejected[short_of_days.id]['alternatives'] == []
@@ -0,0 +1,111 @@
+from datetime import date, datetime
+
+import pytz
+
+import utils
+from models import db, User, Department, Request, VacationTransaction, VacationBalance
+from services.annual_load import run_year_rollover
+from services.batch_review import review_batch
+from services.query_plans import explain
+from utils import get_period_bounds, period_filter
+
+def _april_employee(hire_date=date(2020, 1, 1)):
+    """Empleado de un departamento cuyo año de vacaciones empieza en abril"""
+    department = Department(name='Temporada', max_concurrent_vacations=5, vacation_days_per_year=22,
+                            vacation_year_start_month=4)
+    db.session.add(department)
+    db.session.flush()
+    user = User(email='abril@example.com', name='Abril', department_id=department.id, role='employee',
+                hire_date=hire_date, password_hash='sin-login')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+def _vacation(user, start_date, end_date):
+    request_obj = Request(user_id=user.id, type='vacation', status='pending', start_date=start_date, end_date=end_date)
+    db.session.add(request_obj)
+    db.session.commit()
+    return request_obj
+
+def _freeze_today(monkeypatch, today):
+    """Fijar la fecha de get_canary_time en utils y en los módulos que lo importan"""
+    frozen = lambda: pytz.timezone('Atlantic/Canary').localize(datetime.combine(today, datetime.min.time()))
+    monkeypatch.setattr(utils, 'get_canary_time', frozen)
+    monkeypatch.setattr('models.user.get_canary_time', frozen)
+
+def test_vacation_year_follows_the_department_start_month(app):
+    user = _april_employee()
+    assert user.get_vacation_year(date(2026, 3, 31)) == 2025
+    assert user.get_vacation_year(date(2026, 4, 1)) == 2026
+    assert user.get_vacation_period(2025) == (date(2025, 4, 1), date(2026, 4, 1))
+
+def test_approval_charges_the_vacation_year_it_starts_in(app):
+    user = _april_employee()
+    admin = User.query.filter_by(role='admin').first()
+    VacationTransaction.record(user.id, 2025, 2, 'annual_load')
+    VacationTransaction.record(user.id, 2026, 22, 'annual_load')
+    db.session.commit()
+    
+    # Marzo pertenece al año 2025, que solo tiene 2 días
+    exceeds, excess, _ = user.would_exceed_vacation_days(date(2026, 3, 23), date(2026, 3, 25))
+    assert (exceeds, excess) == (True, 1)
+    success, _ = _vacation(user, date(2026, 3, 23), date(2026, 3, 25)).approve(admin)
+    assert not success
+    
+    # Abril ya es 2026
+    success, _ = _vacation(user, date(2026, 4, 6), date(2026, 4, 8)).approve(admin)
+    assert success
+    assert VacationBalance.get_days(user.id, 2025) == 2
+    assert VacationBalance.get_days(user.id, 2026) == 19
+    assert user.get_vacation_days_used(2026) == 3
+    assert user.get_vacation_days_used(2025) == 0
+
+def test_batch_review_uses_the_vacation_year(app):
+    user = _april_employee()
+    admin = User.query.filter_by(role='admin').first()
+    VacationTransaction.record(user.id, 2025, 2, 'annual_load')
+    db.session.commit()
+    
+    march = _vacation(user, date(2026, 3, 30), date(2026, 3, 31))
+    april = _vacation(user, date(2026, 4, 6), date(2026, 4, 6))
+    results = {result['id']: result['success'] for result in review_batch([march.id, april.id], 'approve', admin)}
+    
+    # Marzo cabe en el saldo de 2025; abril se cobraría a 2026, que no tiene carga
+    assert results == {march.id: True, april.id: False}
+    assert VacationBalance.get_days(user.id, 2025) == 0
+
+def test_proportional_days_use_the_vacation_period(app):
+    # Contratado a mitad del año de vacaciones 2025 (abril 2025 - marzo 2026)
+    user = _april_employee(hire_date=date(2025, 10, 1))
+    assert user.get_vacation_days_per_year(2025) == round(22 * 182 / 365)
+    assert user.get_vacation_days_per_year(2026) == 22
+    assert user.get_vacation_days_per_year(2024) == 0
+
+def test_rollover_loads_each_department_in_its_current_year(app, monkeypatch):
+    user = _april_employee()
+    january_user = User.query.filter(User.department_id != user.department_id, User.is_active == True).first()
+    
+    _freeze_today(monkeypatch, date(2026, 3, 31))
+    summary = run_year_rollover()
+    assert summary['years'] == [2025, 2026]
+    assert (user.vacation_loaded_year, january_user.vacation_loaded_year) == (2025, 2026)
+    assert VacationBalance.get_days(user.id, 2025) == 22
+    
+    _freeze_today(monkeypatch, date(2026, 4, 1))
+    run_year_rollover()
+    db.session.refresh(user)
+    assert user.vacation_loaded_year == 2026
+    # El saldo de 2025 pasa como arrastre al año 2026
+    assert VacationBalance.get_days(user.id, 2026) == 44
+
+def test_period_filters_are_index_range_seeks(app):
+    bounds = get_period_bounds(2025, 4)
+    created = explain(db.select(db.func.count(Request.id)).where(period_filter(Request.created_at, *bounds)))
+    assert any('SEARCH requests' in line and 'created_at>? AND created_at<?' in line for line in created)
+    
+    vacations = explain(db.select(Request.id).where(
+        Request.user_id == 1,
+        Request.type == 'vacation',
+        period_filter(Request.start_date, *bounds)
+    ))
+    assert any('start_date>? AND start_date<?' in line for line in vacations)
@@ -0,0 +1,77 @@
+from datetime import date, datetime
+
+import pytest
+
+from models import db, User, Department, WorkedHoliday
+
+@pytest.fixture
+def admin(app):
+    return User.query.filter_by(role='admin').first()
+
+@pytest.fixture
+def holiday(app):
+    user = User(email='festivo@example.com', name='Festivo', department_id=Department.query.first().id,
+                role='employee', password_hash='sin-login')
+    db.session.add(user)
+    db.session.flush()
+    holiday = WorkedHoliday(user_id=user.id, date=date(2030, 1, 6), status='approved', description='Reyes')
+    db.session.add(holiday)
+    db.session.commit()
+    return holiday
+
+def _recover(holiday, minute):
+    recovery, _ = holiday.create_recovery_request(date(2030, 2, minute))
+    recovery.created_at = datetime(2030, 1, 10, 9, minute)
+    db.session.add(recovery)
+    db.session.commit()
+    return recovery
+
+def _is_available(holiday):
+    return WorkedHoliday.get_available_query(holiday.user_id).filter(WorkedHoliday.id == holiday.id).count() == 1
+
+def test_recovery_status_follows_pending_rejected_and_approved(app, admin, holiday):
+    assert holiday.recovery_status is None and _is_available(holiday)
+    
+    first = _recover(holiday, 1)
+    assert holiday.recovery_status == 'pending'
+    assert not _is_available(holiday)
+    
+    first.apply_rejection(admin)
+    db.session.commit()
+    assert holiday.recovery_status == 'rejected'
+    assert _is_available(holiday)
+    
+    # La más reciente manda
+    second = _recover(holiday, 2)
+    assert holiday.recovery_status == 'pending'
+    second.apply_approval(admin)
+    db.session.commit()
+    assert holiday.recovery_status == 'approved'
+    assert not _is_available(holiday)
+    assert WorkedHoliday.rebuild_recovery_status() == []
+
+def test_cancelling_a_recovery_restores_the_previous_status(app, admin, holiday):
+    first = _recover(holiday, 1)
+    first.apply_rejection(admin)
+    db.session.commit()
+    
+    second = _recover(holiday, 2)
+    assert holiday.recovery_status == 'pending'
+    assert second.cancel()[0]
+    assert holiday.recovery_status == 'rejected'
+    
+    assert first.cancel()[0] is False  # Ya revisada: no se cancela
+    db.session.delete(first)
+    db.session.commit()
+    assert holiday.recovery_status is None
+    assert WorkedHoliday.rebuild_recovery_status() == []
+
+def test_rebuild_fixes_a_drifted_status(app, holiday):
+    _recover(holiday, 1)
+    db.session.execute(WorkedHoliday.__table__.update().values(recovery_status=None))
+    db.session.commit()
+    
+    drift = WorkedHoliday.rebuild_recovery_status()
+    assert drift == [{'holiday_id': holiday.id, 'cached': None, 'real': 'pending'}]
+    db.session.refresh(holiday)
+    assert holiday.recovery_status == 'pending'
@@ -1,6 +1,7 @@
 from functools import wraps
 from flask import session, redirect, url_for, flash
-from datetime import datetime
+from datetime import datetime, date, time
+from sqlalchemy import DateTime, and_, or_
 import pytz
 
 def login_required(f):
@@ -33,6 +34,54 @@ def get_canary_time():
     canary_tz = pytz.timezone('Atlantic/Canary')
     return datetime.now(canary_tz)
 
+def get_period_bounds(year, start_month=1):
+    """Límites [inicio, fin) del año de vacaciones que empieza el día 1 del mes indicado"""
+    return date(year, start_month, 1), date(year + 1, start_month, 1)
+
+def get_period_year(on_date, start_month=1):
+    """Año de vacaciones (año en que empieza el periodo) al que pertenece una fecha"""
+    return on_date.year if on_date.month >= start_month else on_date.year - 1
+
+def period_filter(column, start_date, end_date):
+    """Condición column >= inicio AND column < fin; a diferencia de extract('year') usa los índices"""
+    if isinstance(column.type, DateTime):
+        start_date = datetime.combine(start_date, time.min)
+        end_date = datetime.combine(end_date, time.min)
+    return and_(column >= start_date, column < end_date)
+
+def encode_cursor(value, row_id):
+    """Cursor de paginación '<valor ISO>_<id>' a partir de la última fila de una página"""
+    return f"{value.isoformat()}_{row_id}"
+
+def decode_cursor(cursor, parse):
+    """Obtener (valor, id) de un cursor con la función que interpreta el valor; None si no es válido"""
+    try:
+        value, row_id = cursor.rsplit('_', 1)
+        return parse(value), int(row_id)
+    except (AttributeError, ValueError):
+        return None
+
+def keyset_page(query, sort_column, id_column, cursor=None, limit=50):
+    """Página por cursor sobre (columna, id), más recientes primero; devuelve (filas, siguiente cursor)"""
+    parse = datetime.fromisoformat if isinstance(sort_column.type, DateTime) else date.fromisoformat
+    position = decode_cursor(cursor, parse) if cursor else None
+    if position:
+        value, row_id = position
+        query = query.filter(or_(
+            sort_column < value,
+            and_(sort_column == value, id_column < row_id)
+        ))
+    
+    # Se pide una fila de más para saber si hay página siguiente
+    rows = query.order_by(sort_column.desc(), id_column.desc()).limit(limit + 1).all()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(getattr(rows[-1], sort_column.key), getattr(rows[-1], id_column.key))
+    
+    return rows, next_cursor
+
 def format_date(date_obj, format_str='%d/%m/%Y'):
     """Formatear fecha según zona horaria de Canarias"""
     if not date_obj:
@@ -79,11 +128,8 @@ def create_notifications_for_new_request(request_obj):
     from models import db
     
     try:
-        # Crear notificaciones para administradores
-        admin_notifications = Notification.create_for_admin_request(request_obj)
-        for notification in admin_notifications:
-            db.session.add(notification)
-        
+        # Crear notificaciones para administradores (un único INSERT)
+        Notification.create_for_admin_request(request_obj)
         db.session.commit()
         return True
     except Exception as e:
@@ -96,11 +142,8 @@ def create_notifications_for_new_holiday(holiday_obj):
     from models import db
     
     try:
-        # Crear notificaciones para administradores
-        admin_notifications = Notification.create_for_admin_holiday(holiday_obj)
-        for notification in admin_notifications:
-            db.session.add(notification)
-        
+        # Crear notificaciones para administradores (un único INSERT)
+        Notification.create_for_admin_holiday(holiday_obj)
         db.session.commit()
         return True
     except Exception as e:
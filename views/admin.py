@@ -1,6 +1,6 @@
-from flask import Blueprint, render_template, request as flask_request, redirect, url_for, flash, g, jsonify
+from flask import Blueprint, render_template, request as flask_request, redirect, url_for, flash, g, jsonify, Response, stream_with_context
 from utils import admin_required, get_canary_time
-from models import db, User, Department, Request, WorkedHoliday
+from models import db, User, Department, WorkedHoliday
 from datetime import datetime, date
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
@@ -14,7 +14,9 @@ admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 def departments():
     """Lista de departamentos"""
     departments = Department.query.order_by(Department.name).all()
-    return render_template('admin/departments.html', departments=departments)
+    # Plantilla de todos los departamentos en una consulta agrupada
+    employee_counts = Department.get_employee_counts()
+    return render_template('admin/departments.html', departments=departments, employee_counts=employee_counts)
 
 @admin_bp.route('/departments', methods=['POST'])
 @admin_required
@@ -24,12 +26,13 @@ def create_department():
         name = flask_request.form.get('name', '').strip()
         max_concurrent = int(flask_request.form.get('max_concurrent_vacations', 1))
         vacation_days = int(flask_request.form.get('vacation_days_per_year', 22))
+        year_start_month = int(flask_request.form.get('vacation_year_start_month', 1))
         
         if not name:
             flash('El nombre del departamento es obligatorio.', 'error')
             return redirect(url_for('admin.departments'))
         
-        department, message = Department.create_department(name, max_concurrent, vacation_days)
+        department, message = Department.create_department(name, max_concurrent, vacation_days, year_start_month)
         
         if department:
             flash(message, 'success')
@@ -53,11 +56,13 @@ def edit_department(dept_id):
         name = flask_request.form.get('name', '').strip()
         max_concurrent = int(flask_request.form.get('max_concurrent_vacations'))
         vacation_days = int(flask_request.form.get('vacation_days_per_year'))
+        year_start_month = flask_request.form.get('vacation_year_start_month')
         
         success, message = department.update_details(
             name=name if name else None,
             max_concurrent=max_concurrent,
-            vacation_days=vacation_days
+            vacation_days=vacation_days,
+            year_start_month=int(year_start_month) if year_start_month else None
         )
         
         if success:
@@ -97,7 +102,8 @@ def employees():
     """Lista de empleados"""
     employees = User.query.filter_by(role='employee').order_by(User.name).all()
     departments = Department.query.order_by(Department.name).all()
-    return render_template('admin/employees.html', employees=employees, departments=departments)
+    return render_template('admin/employees.html', employees=employees, departments=departments,
+                           current_year=get_canary_time().year)
 
 @admin_bp.route('/employees', methods=['POST'])
 @admin_required
@@ -145,6 +151,32 @@ def create_employee():
     
     return redirect(url_for('admin.employees'))
 
+@admin_bp.route('/employees/import', methods=['POST'])
+@admin_required
+def import_employees():
+    """Alta masiva de empleados desde un CSV (informe por fila)"""
+    from services.employee_import import parse_csv, import_employees as run_import, MAX_IMPORT_ROWS
+    
+    upload = flask_request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify({'success': False, 'message': 'Selecciona un fichero CSV'}), 400
+    
+    try:
+        rows = parse_csv(upload.read())
+    except UnicodeDecodeError:
+        return jsonify({'success': False, 'message': 'El fichero debe estar en UTF-8'}), 400
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    if not rows:
+        return jsonify({'success': False, 'message': 'El fichero no tiene empleados'}), 400
+    if len(rows) > MAX_IMPORT_ROWS:
+        return jsonify({'success': False, 'message': f'Máximo {MAX_IMPORT_ROWS} empleados por fichero'}), 400
+    
+    report = run_import(rows)
+    report['success'] = report['created'] > 0
+    return jsonify(report)
+
 @admin_bp.route('/employees/<int:user_id>/edit', methods=['POST'])
 @admin_required
 def edit_employee(user_id):
@@ -238,7 +270,7 @@ def validate_vacation_request():
         would_exceed, excess_days, details = user.would_exceed_vacation_days(start_date, end_date)
         
         # Obtener balance actual
-        balance_info = user.get_vacation_balance_info(start_date.year)
+        balance_info = user.get_vacation_balance_info(user.get_vacation_year(start_date))
         
         response_data = {
             'would_exceed': would_exceed,
@@ -259,7 +291,7 @@ def employee_vacation_balance(user_id):
     """Obtener balance de vacaciones de un empleado"""
     try:
         user = User.query.get_or_404(user_id)
-        year = int(flask_request.args.get('year', get_canary_time().year))
+        year = int(flask_request.args.get('year', user.get_vacation_year()))
         
         balance_info = user.get_vacation_balance_info(year)
         
@@ -272,6 +304,64 @@ def employee_vacation_balance(user_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+@admin_bp.route('/api/vacation-plan', methods=['GET', 'POST'])
+@admin_required
+def vacation_plan():
+    """Planificar las vacaciones pendientes de un periodo (GET) o aplicar el plan (POST)"""
+    from services.vacation_scheduler import plan_vacations, STRATEGIES
+    from services.batch_review import review_batch
+    
+    params = flask_request.get_json(silent=True) or flask_request.values
+    try:
+        start_date = datetime.strptime(params.get('start_date'), '%Y-%m-%d').date()
+        end_date = datetime.strptime(params.get('end_date'), '%Y-%m-%d').date()
+        department_id = int(params['department_id']) if params.get('department_id') else None
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Parámetros inválidos (start_date, end_date en formato YYYY-MM-DD)'}), 400
+    
+    # 'longest_first' (heurística: las más largas primero) o 'seniority'
+    strategy = params.get('strategy') or 'longest_first'
+    if strategy not in STRATEGIES or start_date > end_date:
+        return jsonify({'success': False, 'message': 'Estrategia o rango de fechas inválido'}), 400
+    
+    plan = plan_vacations(start_date, end_date, department_id, strategy)
+    response = {'success': True, 'plan': plan}
+    
+    # Aplicar: se aprueban en un solo lote las solicitudes que el plan acepta
+    if flask_request.method == 'POST' and plan['approve']:
+        response['results'] = review_batch([entry['request_id'] for entry in plan['approve']], 'approve', g.user)
+    
+    return jsonify(response)
+
+@admin_bp.route('/export/<kind>')
+@admin_required
+def export_data(kind):
+    """Exportar libro mayor, solicitudes o festivos trabajados (CSV o XLSX) en streaming"""
+    from services.export import EXPORTS, FORMATS, MIN_YEAR, MAX_YEAR, iter_csv, iter_xlsx, export_filename
+    
+    file_format = flask_request.args.get('format', 'csv')
+    try:
+        # Un filtro mal escrito no puede acabar exportando todo
+        filters = {name: int(flask_request.args[name]) if flask_request.args.get(name) else None
+                   for name in ('year', 'department_id', 'user_id')}
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Parámetros inválidos (year, department_id, user_id)'}), 400
+    
+    # Validado antes de empezar: un error dentro del generador llegaría con las cabeceras ya enviadas
+    if filters['year'] is not None and not MIN_YEAR <= filters['year'] <= MAX_YEAR:
+        return jsonify({'success': False, 'message': f'El año debe estar entre {MIN_YEAR} y {MAX_YEAR}'}), 400
+    if any(filters[name] is not None and filters[name] < 1 for name in ('department_id', 'user_id')):
+        return jsonify({'success': False, 'message': 'department_id y user_id deben ser positivos'}), 400
+    
+    if kind not in EXPORTS or file_format not in FORMATS:
+        return jsonify({'success': False, 'message': f"Exportación no disponible: {', '.join(EXPORTS)} en {', '.join(FORMATS)}"}), 400
+    
+    rows = iter_csv(kind, **filters) if file_format == 'csv' else iter_xlsx(kind, **filters)
+    # Sin Content-Length: la respuesta se envía por trozos según se leen las filas
+    return Response(stream_with_context(rows), mimetype=FORMATS[file_format], headers={
+        'Content-Disposition': f'attachment; filename="{export_filename(kind, file_format, filters["year"])}"'
+    })
+
 # Reactivar usuario
 
 @admin_bp.route('/employees/<int:user_id>/reactivate', methods=['POST'])
@@ -299,18 +389,8 @@ def get_employee_available_holidays(user_id):
     try:
         user = User.query.get_or_404(user_id)
         
-        # Obtener festivos aprobados que NO estén siendo usados en requests
-        available_holidays = WorkedHoliday.query.filter_by(
-            user_id=user_id,
-            status='approved'
-        ).filter(
-            ~WorkedHoliday.id.in_(
-                db.session.query(Request.worked_holiday_id).filter(
-                    Request.worked_holiday_id.isnot(None),
-                    Request.status.in_(['pending', 'approved'])
-                )
-            )
-        ).order_by(WorkedHoliday.date.asc()).all()
+        # Festivos aprobados que NO estén siendo usados en requests
+        available_holidays = WorkedHoliday.get_available_query(user_id).all()
         
         holidays_data = []
         for holiday in available_holidays:
@@ -1,10 +1,28 @@
-from flask import Blueprint, jsonify, g, request as flask_request
+from flask import Blueprint, jsonify, g, request as flask_request, Response
 from utils import login_required
-from models import Notification, Request, WorkedHoliday, Department
+from models import db, Notification, Request, WorkedHoliday, Department, User
+from services import notification_bus
 from datetime import datetime, date, timedelta
+import hashlib
+import queue
+import time
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
+# Cada cuánto se envía un comentario keepalive por el canal SSE
+STREAM_KEEPALIVE_SECONDS = 25
+
+# Vida máxima de una conexión SSE: al cerrarse, el navegador reconecta solo y recibe el
+# contador leído de la base de datos. Cada pestaña abierta ocupa un hilo (con workers
+# síncronos, un worker entero) mientras dura la conexión: usar workers con hilos o gevent
+STREAM_MAX_SECONDS = 300
+
+# Años como máximo en un mapa de ocupación
+MAX_OCCUPANCY_YEARS = 5
+
+# Días como máximo en una consulta de disponibilidad (un trimestre con margen)
+MAX_AVAILABILITY_DAYS = 186
+
 @api_bp.route('/notifications')
 @login_required
 def notifications():
@@ -12,6 +30,37 @@ def notifications():
     count = g.user.get_notifications_count() if g.user else 0
     return jsonify({'count': count})
 
+@api_bp.route('/notifications/stream')
+@login_required
+def notifications_stream():
+    """Canal Server-Sent Events con el contador y las notificaciones nuevas"""
+    user_id = g.user.id
+    initial_count = g.user.get_notifications_count()
+    
+    def stream():
+        # El generador no toca la base de datos: una pestaña inactiva solo espera en su cola
+        subscriber = notification_bus.subscribe(user_id)
+        deadline = time.monotonic() + STREAM_MAX_SECONDS
+        try:
+            yield 'retry: 5000\n\n'
+            yield notification_bus.format_sse('unread', {'count': initial_count})
+            
+            while time.monotonic() < deadline:
+                try:
+                    event_name, data = subscriber.get(timeout=min(STREAM_KEEPALIVE_SECONDS, max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    # Comentario SSE para mantener viva la conexión a través de proxies
+                    yield ': keepalive\n\n'
+                    continue
+                yield notification_bus.format_sse(event_name, data)
+        finally:
+            notification_bus.unsubscribe(user_id, subscriber)
+    
+    response = Response(stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Sin buffer en nginx
+    return response
+
 @api_bp.route('/notifications/list')
 @login_required
 def notifications_list():
@@ -116,6 +165,32 @@ def validate_dates():
             'message': f'Error: {str(e)}'
         })
 
+@api_bp.route('/availability')
+@login_required
+def date_availability():
+    """Disponibilidad de un mes o trimestre para el selector de fechas (una petición por vista)"""
+    try:
+        start_date = datetime.strptime(flask_request.args.get('start', ''), '%Y-%m-%d').date()
+        end_date = datetime.strptime(flask_request.args.get('end', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'error': 'Formato de fecha inválido'}), 400
+    
+    if end_date < start_date or (end_date - start_date).days >= MAX_AVAILABILITY_DAYS:
+        return jsonify({'error': f'El rango debe ser de 1 a {MAX_AVAILABILITY_DAYS} días'}), 400
+    
+    availability = g.user.get_date_availability(start_date, end_date)
+    
+    # Los días no listados están libres
+    return jsonify({
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'own_days': [day.isoformat() for day in availability['own_days']],
+        'capacity_days': [day.isoformat() for day in availability['capacity_days']],
+        'max_concurrent': availability['max_concurrent'],
+        'year_start_month': availability['year_start_month'],
+        'balances': {str(year): days for year, days in availability['balances'].items()}
+    })
+
 @api_bp.route('/validate-recovery-date')
 @login_required
 def validate_recovery_date():
@@ -165,197 +240,158 @@ def validate_recovery_date():
             'message': f'Error: {str(e)}'
         })
 
+def _parse_calendar_range():
+    """Obtener el rango de fechas pedido por FullCalendar (por defecto, 4 meses)"""
+    start_str = flask_request.args.get('start')
+    end_str = flask_request.args.get('end')
+    
+    if start_str and end_str:
+        try:
+            # FullCalendar envía fechas en formato ISO: 2025-06-01T00:00:00+00:00
+            if 'T' in start_str:
+                start_date = datetime.fromisoformat(start_str.replace('Z', '+00:00')).date()
+                end_date = datetime.fromisoformat(end_str.replace('Z', '+00:00')).date()
+            else:
+                start_date = datetime.strptime(start_str, '%Y-%m-%d').date()
+                end_date = datetime.strptime(end_str, '%Y-%m-%d').date()
+            return start_date, end_date
+        except ValueError:
+            pass
+    
+    # Rango por defecto
+    today = date.today()
+    return today - timedelta(days=30), today + timedelta(days=90)
+
+def _calendar_query(columns, start_date, end_date):
+    """Consulta de solicitudes visibles en el calendario para el usuario actual"""
+    query = db.session.query(*columns)\
+                      .select_from(Request)\
+                      .join(User, User.id == Request.user_id)\
+                      .join(Department, Department.id == User.department_id)\
+                      .filter(Request.start_date <= end_date,
+                              Request.end_date >= start_date)
+    
+    if g.user.is_admin():
+        # Admin ve todas las aprobadas y pendientes
+        return query.filter(Request.status.in_(['approved', 'pending']))
+    
+    # Empleado ve sus solicitudes aprobadas y las vacaciones aprobadas de su departamento
+    return query.filter(
+        Request.status == 'approved',
+        db.or_(
+            Request.user_id == g.user.id,
+            db.and_(
+                Request.type == 'vacation',
+                User.department_id == g.user.department_id,
+                User.role == 'employee',
+                User.is_active == True
+            )
+        )
+    )
+
+def _calendar_etag(start_date, end_date):
+    """ETag fuerte del feed: cambia si cambia cualquier solicitud, usuario o departamento del rango"""
+    stats = _calendar_query([
+        db.func.count(Request.id),
+        db.func.max(Request.created_at),
+        db.func.max(Request.reviewed_at),
+        db.func.max(Request.updated_at),
+        db.func.max(User.updated_at),
+        db.func.max(Department.updated_at)
+    ], start_date, end_date).one()
+    
+    viewer = 'admin' if g.user.is_admin() else f'user-{g.user.id}-{g.user.department_id}'
+    fingerprint = '|'.join(str(value) for value in (viewer, start_date, end_date) + tuple(stats))
+    return hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()
+
 @api_bp.route('/calendar-events')
 @login_required
 def calendar_events():
     """Eventos para el calendario"""
     try:
-        print(f"Usuario: {g.user.name}, Admin: {g.user.is_admin()}")  # Debug
+        start_date, end_date = _parse_calendar_range()
         
-        # Obtener rango de fechas (por defecto, 3 meses)
-        start_str = flask_request.args.get('start')
-        end_str = flask_request.args.get('end')
+        # Si el cliente ya tiene la versión actual, no hace falta construir los eventos
+        etag = _calendar_etag(start_date, end_date)
+        if flask_request.if_none_match.contains(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
         
-        print(f"Parámetros recibidos - start: {start_str}, end: {end_str}")  # Debug
-        
-        if start_str and end_str:
-            try:
-                # FullCalendar envía fechas en formato ISO: 2025-06-01T00:00:00+00:00
-                # Intentar varios formatos
-                if 'T' in start_str:
-                    start_date = datetime.fromisoformat(start_str.replace('Z', '+00:00')).date()
-                    end_date = datetime.fromisoformat(end_str.replace('Z', '+00:00')).date()
-                else:
-                    start_date = datetime.strptime(start_str, '%Y-%m-%d').date()
-                    end_date = datetime.strptime(end_str, '%Y-%m-%d').date()
-            except Exception as e:
-                print(f"Error parseando fechas: {e}")
-                # Fallback a rango por defecto
-                today = date.today()
-                start_date = today - timedelta(days=30)
-                end_date = today + timedelta(days=90)
-        else:
-            # Rango por defecto
-            today = date.today()
-            start_date = today - timedelta(days=30)
-            end_date = today + timedelta(days=90)
-        
-        print(f"Rango de fechas: {start_date} a {end_date}")  # Debug
+        # Una sola consulta por columnas: sin cargar objetos Request ni lazy loads
+        rows = _calendar_query([
+            Request.id,
+            Request.user_id,
+            Request.type,
+            Request.status,
+            Request.start_date,
+            Request.end_date,
+            User.name.label('user_name'),
+            Department.name.label('department_name')
+        ], start_date, end_date).all()
         
+        type_texts = {'vacation': 'Vacaciones', 'recovery': 'Recuperación'}
         events = []
         
-        if g.user.is_admin():
-            print("Ejecutando lógica de admin...")  # Debug
-            
-            # Admin ve todas las vacaciones aprobadas
-            approved_requests = Request.query.filter(
-                Request.status == 'approved',
-                Request.start_date <= end_date,
-                Request.end_date >= start_date
-            ).all()
-            
-            print(f"Solicitudes aprobadas encontradas: {len(approved_requests)}")  # Debug
+        for row in rows:
+            days = (row.end_date - row.start_date).days + 1
+            type_text = type_texts.get(row.type, 'Desconocido')
+            event = {
+                'start': row.start_date.isoformat(),
+                'end': (row.end_date + timedelta(days=1)).isoformat(),
+                'textColor': '#ffffff',
+                'extendedProps': {
+                    'type': type_text,
+                    'user': row.user_name,
+                    'department': row.department_name,
+                    'requestId': row.id,
+                    'days': days
+                }
+            }
             
-            for req in approved_requests:
-                print(f"Procesando solicitud: {req.user.name} - {req.start_date} a {req.end_date}")  # Debug
-                
-                if req.type == 'vacation':
+            if g.user.is_admin() and row.status == 'approved':
+                if row.type == 'vacation':
                     color = '#0054a6'  # Azul para vacaciones aprobadas
-                    title = req.user.name
+                    title = row.user_name
                 else:
-                    color = '#f59f00'  # Naranja para recuperaciones aprobadas  
-                    title = f'{req.user.name} (R)'
-                
-                events.append({
-                    'id': f'{req.type}-{req.id}',
-                    'title': title,
-                    'start': req.start_date.isoformat(),
-                    'end': (req.end_date + timedelta(days=1)).isoformat(),
-                    'backgroundColor': color,
-                    'borderColor': color,
-                    'textColor': '#ffffff',
-                    'extendedProps': {
-                        'type': req.get_type_text(),
-                        'user': req.user.name,
-                        'department': req.user.department.name,
-                        'requestId': req.id,
-                        'status': 'Aprobada',
-                        'days': (req.end_date - req.start_date).days + 1
-                    }
-                })
+                    color = '#f59f00'  # Naranja para recuperaciones aprobadas
+                    title = f'{row.user_name} (R)'
+                event['id'] = f'{row.type}-{row.id}'
+                event['extendedProps']['status'] = 'Aprobada'
             
-            # Admin también ve las PENDIENTES con colores diferentes
-            pending_requests = Request.query.filter(
-                Request.status == 'pending',
-                Request.start_date <= end_date,
-                Request.end_date >= start_date
-            ).all()
-            
-            print(f"Solicitudes pendientes encontradas: {len(pending_requests)}")  # Debug
-            
-            for req in pending_requests:
-                if req.type == 'vacation':
+            elif g.user.is_admin():
+                if row.type == 'vacation':
                     color = '#6c757d'  # Gris para vacaciones pendientes
-                    title = f'{req.user.name} (Pendiente)'
+                    title = f'{row.user_name} (Pendiente)'
                 else:
                     color = '#ffc107'  # Amarillo para recuperaciones pendientes
-                    title = f'{req.user.name} (R-Pendiente)'
+                    title = f'{row.user_name} (R-Pendiente)'
+                event['id'] = f'pending-{row.type}-{row.id}'
+                event['display'] = 'background'  # Mostrar como fondo para diferenciar
+                event['extendedProps']['status'] = 'Pendiente'
                 
-                events.append({
-                    'id': f'pending-{req.type}-{req.id}',
-                    'title': title,
-                    'start': req.start_date.isoformat(),
-                    'end': (req.end_date + timedelta(days=1)).isoformat(),
-                    'backgroundColor': color,
-                    'borderColor': color,
-                    'textColor': '#ffffff',
-                    'display': 'background',  # Mostrar como fondo para diferenciar
-                    'extendedProps': {
-                        'type': req.get_type_text(),
-                        'user': req.user.name,
-                        'department': req.user.department.name,
-                        'requestId': req.id,
-                        'status': 'Pendiente',
-                        'days': (req.end_date - req.start_date).days + 1
-                    }
-                })
-                
-        else:
-            print("Ejecutando lógica de empleado...")  # Debug
-            
-            # Empleado ve sus vacaciones y las de su departamento
-            
-            # Mis vacaciones y recuperaciones
-            my_requests = Request.query.filter(
-                Request.user_id == g.user.id,
-                Request.status == 'approved',
-                Request.start_date <= end_date,
-                Request.end_date >= start_date
-            ).all()
-            
-            print(f"Mis solicitudes encontradas: {len(my_requests)}")  # Debug
-            
-            for req in my_requests:
-                color = '#2fb344' if req.type == 'vacation' else '#f59f00'
-                type_text = 'Vacaciones' if req.type == 'vacation' else 'Recuperación'
-                days = (req.end_date - req.start_date).days + 1
+            elif row.user_id == g.user.id:
+                # Mis vacaciones y recuperaciones
+                color = '#2fb344' if row.type == 'vacation' else '#f59f00'
                 title = f'Mis {type_text}' + (f' ({days} días)' if days > 1 else ' (1 día)')
+                event['id'] = f'{row.type}-{row.id}'
                 
-                events.append({
-                    'id': f'{req.type}-{req.id}',
-                    'title': title,
-                    'start': req.start_date.isoformat(),
-                    'end': (req.end_date + timedelta(days=1)).isoformat(),
-                    'backgroundColor': color,
-                    'borderColor': color,
-                    'textColor': '#ffffff',
-                    'extendedProps': {
-                        'type': type_text,
-                        'user': g.user.name,
-                        'department': g.user.department.name,
-                        'requestId': req.id,
-                        'days': days
-                    }
-                })
+            else:
+                # Vacaciones de compañeros del departamento
+                color = '#0ea5e9'
+                title = row.user_name + (f' ({days} días)' if days > 1 else ' (1 día)')
+                event['id'] = f'dept-vacation-{row.id}'
             
-            # Vacaciones de compañeros del departamento
-            dept_employees = g.user.department.get_employees()
-            dept_employee_ids = [emp.id for emp in dept_employees if emp.id != g.user.id]
+            event['title'] = title
+            event['backgroundColor'] = color
+            event['borderColor'] = color
+            events.append(event)
             
-            if dept_employee_ids:
-                dept_requests = Request.query.filter(
-                    Request.user_id.in_(dept_employee_ids),
-                    Request.type == 'vacation',
-                    Request.status == 'approved',
-                    Request.start_date <= end_date,
-                    Request.end_date >= start_date
-                ).all()
-                
-                print(f"Solicitudes de compañeros encontradas: {len(dept_requests)}")  # Debug
-                
-                for req in dept_requests:
-                    days = (req.end_date - req.start_date).days + 1
-                    title = req.user.name + (f' ({days} días)' if days > 1 else ' (1 día)')
-                    
-                    events.append({
-                        'id': f'dept-vacation-{req.id}',
-                        'title': title,
-                        'start': req.start_date.isoformat(),
-                        'end': (req.end_date + timedelta(days=1)).isoformat(),
-                        'backgroundColor': '#0ea5e9',
-                        'borderColor': '#0ea5e9',
-                        'textColor': '#ffffff',
-                        'extendedProps': {
-                            'type': 'Vacaciones',
-                            'user': req.user.name,
-                            'department': req.user.department.name,
-                            'requestId': req.id,
-                            'days': days
-                        }
-                    })
-        
-        print(f"Total eventos generados: {len(events)}")  # Debug
-        return jsonify(events)
+        response = jsonify(events)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
         
     except Exception as e:
         print(f"Error in calendar_events: {e}")  # Para debug
@@ -363,6 +399,42 @@ def calendar_events():
         traceback.print_exc()
         return jsonify([])  # Devolver array vacío en caso de error
 
+@api_bp.route('/occupancy/department/<int:dept_id>')
+@login_required
+def department_occupancy(dept_id):
+    """Ocupación diaria de un departamento por años (admin: cualquiera, total; empleado: el suyo, sin contarle a él)"""
+    if not g.user.is_admin() and g.user.department_id != dept_id:
+        return jsonify({'error': 'No autorizado'}), 403
+    
+    department = Department.query.get_or_404(dept_id)
+    
+    try:
+        start_year = int(flask_request.args.get('start_year', flask_request.args.get('year', date.today().year)))
+        end_year = int(flask_request.args.get('end_year', start_year))
+    except ValueError:
+        return jsonify({'error': 'Año inválido'}), 400
+    
+    if end_year < start_year or end_year - start_year >= MAX_OCCUPANCY_YEARS:
+        return jsonify({'error': f'El rango debe ser de 1 a {MAX_OCCUPANCY_YEARS} años'}), 400
+    if start_year < date.min.year or end_year > date.max.year:
+        return jsonify({'error': f'El año debe estar entre {date.min.year} y {date.max.year}'}), 400
+    
+    # El empleado ve las plazas que le quedan a él: sus propias vacaciones no ocupan su hueco,
+    # igual que al aprobarle una solicitud. El admin ve la ocupación total.
+    exclude_user_id = None if g.user.is_admin() else g.user.id
+    occupancy_map = department.get_occupancy_map(date(start_year, 1, 1), date(end_year, 12, 31), exclude_user_id)
+    
+    # Arrays compactos: la posición i corresponde al día start_date + i
+    return jsonify({
+        'department_id': department.id,
+        'department_name': department.name,
+        'start_date': occupancy_map['start_date'].isoformat(),
+        'end_date': occupancy_map['end_date'].isoformat(),
+        'max_concurrent': occupancy_map['max_concurrent'],
+        'occupancy': occupancy_map['occupancy'],
+        'headroom': occupancy_map['headroom']
+    })
+
 @api_bp.route('/stats/department/<int:dept_id>')
 @login_required
 def department_stats(dept_id):
@@ -371,21 +443,18 @@ def department_stats(dept_id):
         return jsonify({'error': 'No autorizado'}), 403
     
     department = Department.query.get_or_404(dept_id)
-    stats = department.get_vacation_stats()
-    
-    # Agregar información adicional
-    today = date.today()
-    employees_on_vacation = department.get_employees_on_vacation(today, today)
+    return jsonify(department.get_vacation_stats())
     
-    stats.update({
-        'department_name': department.name,
-        'department_id': department.id,
-        'employees_on_vacation_count': len(employees_on_vacation),
-        'employees_on_vacation': [emp.name for emp in employees_on_vacation],
-        'can_approve_more': department.can_approve_vacation(today, today)
-    })
+@api_bp.route('/stats/departments')
+@login_required
+def all_department_stats():
+    """Estadísticas de todos los departamentos en una respuesta (solo admin)"""
+    if not g.user.is_admin():
+        return jsonify({'error': 'No autorizado'}), 403
     
-    return jsonify(stats)
+    departments = Department.query.order_by(Department.name).all()
+    stats = Department.get_stats_for(departments)
+    return jsonify({'departments': [stats[department.id] for department in departments]})
 
 
     
\ No newline at end of file
@@ -1,7 +1,7 @@
 from flask import Blueprint, render_template, request as flask_request, redirect, url_for, flash, session, g
 from models import User, db
 from utils import login_required
-from werkzeug.security import check_password_hash
+from services import login_throttle
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -16,14 +16,39 @@ def login():
             flash('Email y contraseña son obligatorios.', 'error')
             return render_template('login.html')
         
+        # Demasiados fallos: se rechaza antes de calcular ningún hash
+        ip = flask_request.remote_addr
+        retry_after = login_throttle.get_retry_after(email, ip)
+        if retry_after:
+            flash(f'Demasiados intentos fallidos. Vuelve a intentarlo en {-(-retry_after // 60)} minuto(s).', 'error')
+            return render_template('login.html'), 429, {'Retry-After': str(retry_after)}
+        
         # Buscar usuario
         user = User.query.filter_by(email=email).first()
         
-        if user and user.check_password(password):
+        if user:
+            password_ok = user.check_password(password)
+        else:
+            # Email desconocido: el mismo trabajo de hash, para no delatar qué cuentas existen
+            login_throttle.verify_dummy_password(password)
+            password_ok = False
+        
+        if password_ok:
+            login_throttle.reset(email)
+            
             if not user.is_active:
                 flash('Tu cuenta está desactivada. Contacta con el administrador.', 'error')
                 return render_template('login.html')
             
+            # Hash con un esquema o coste antiguo: recifrar ahora que tenemos la contraseña
+            if user.password_needs_rehash():
+                try:
+                    user.set_password(password)
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"⚠️ No se pudo recifrar la contraseña de {user.email}: {e}")
+            
             # Iniciar sesión
             session.permanent = True  # Sesión permanente según config
             session['user_id'] = user.id
@@ -42,6 +67,7 @@ def login():
                 return redirect(next_page)
             return redirect(url_for('dashboard.index'))
         else:
+            login_throttle.record_failure(email, ip)
             flash('Email o contraseña incorrectos.', 'error')
     
     return render_template('login.html')
@@ -1,6 +1,8 @@
 from flask import Blueprint, render_template, g, jsonify
 from utils import login_required
 from models import Request, WorkedHoliday, Department, User, db
+from services.dashboard_summary import build_employees_summary
+from sqlalchemy.orm import joinedload
 from datetime import date, timedelta
 
 dashboard_bp = Blueprint('dashboard', __name__)
@@ -25,60 +27,30 @@ def render_admin_dashboard():
     pending_holidays = WorkedHoliday.query.filter_by(status='pending').count()
     
     # Solicitudes recientes
-    recent_requests = Request.query.filter_by(status='pending')\
+    recent_requests = Request.query.options(joinedload(Request.user))\
+                                  .filter_by(status='pending')\
                                   .order_by(Request.created_at.desc())\
                                   .limit(5).all()
     
     # Festivos pendientes
-    recent_holidays = WorkedHoliday.query.filter_by(status='pending')\
+    recent_holidays = WorkedHoliday.query.options(joinedload(WorkedHoliday.user))\
+                                        .filter_by(status='pending')\
                                         .order_by(WorkedHoliday.created_at.desc())\
                                         .limit(5).all()
     
     # Empleados actualmente de vacaciones
     today = date.today()
-    current_vacations = Request.query.filter(
+    current_vacations = Request.query.options(
+        joinedload(Request.user).joinedload(User.department)
+    ).filter(
         Request.type == 'vacation',
         Request.status == 'approved',
         Request.start_date <= today,
         Request.end_date >= today
     ).all()
     
-    # Resumen de empleados con sus días pendientes
-    employees_summary = []
-    all_employees = User.query.filter_by(role='employee', is_active=True).all()
-    
-    for employee in all_employees:
-        # Calcular días de vacaciones disponibles (asumiendo 22 días por año)
-        current_year = today.year
-        vacation_days_used = employee.get_vacation_days_used(current_year)
-        vacation_days_available = employee.get_vacation_days_available()
-        
-        # Calcular festivos aprobados disponibles para recuperación
-        approved_holidays = WorkedHoliday.query.filter(
-            WorkedHoliday.user_id == employee.id,
-            WorkedHoliday.status == 'approved'
-        ).all()
-        
-        holidays_to_recover = 0
-        for holiday in approved_holidays:
-            recovery_status, _ = holiday.get_recovery_status()
-            if not recovery_status:  # No tiene recuperación asociada
-                holidays_to_recover += 1
-        
-        # Estado actual del empleado
-        is_on_vacation = employee.is_on_vacation(today)
-        has_pending_requests = Request.query.filter_by(
-            user_id=employee.id, 
-            status='pending'
-        ).first() is not None
-        
-        employees_summary.append({
-            'employee': employee,
-            'vacation_days_available': vacation_days_available,
-            'holidays_to_recover': holidays_to_recover,
-            'is_on_vacation': is_on_vacation,
-            'has_pending_requests': has_pending_requests
-        })
+    # Resumen de empleados con sus días pendientes (número fijo de consultas)
+    employees_summary = build_employees_summary(today)
     
     return render_template('dashboard.html',
                          is_admin=True,
@@ -120,8 +92,8 @@ def render_employee_dashboard():
         Request.start_date > today
     ).order_by(Request.start_date.asc()).first()
     
-    # Estadísticas del año
-    current_year = today.year
+    # Estadísticas del año de vacaciones en curso (el del departamento)
+    current_year = g.user.get_vacation_year(today)
     vacation_days_used = g.user.get_vacation_days_used(current_year)
     
     # Compañeros del departamento actualmente de vacaciones
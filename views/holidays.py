@@ -1,24 +1,64 @@
-from flask import Blueprint, render_template, request as flask_request, redirect, url_for, flash, g
+from flask import Blueprint, render_template, request as flask_request, redirect, url_for, flash, g, jsonify
 from utils import login_required, admin_required, create_notifications_for_new_holiday, create_notifications_for_new_request, get_canary_time
 from models import db, WorkedHoliday, Request, Department, User
 from datetime import datetime
 
 holidays_bp = Blueprint('holidays', __name__)
 
+# Filas por página en las tablas de festivos (admin)
+HOLIDAYS_PAGE_SIZE = 50
+
+# Años admitidos en el filtro del listado
+MIN_FILTER_YEAR = 1900
+MAX_FILTER_YEAR = 3000
+
+def _parse_holiday_filters():
+    """Leer los filtros del listado de festivos desde la query string (ValueError si el año no es válido)"""
+    status = flask_request.args.get('status', '')
+    year = flask_request.args.get('year', '').strip()
+    
+    # Un año fuera de rango no se ignora: el listado acabaría mostrando todos los años
+    if year:
+        if not year.isdigit() or not MIN_FILTER_YEAR <= int(year) <= MAX_FILTER_YEAR:
+            raise ValueError(f'El año debe estar entre {MIN_FILTER_YEAR} y {MAX_FILTER_YEAR}')
+        year = int(year)
+    
+    return {
+        'statuses': [status] if status in ['approved', 'rejected'] else ['approved', 'rejected'],
+        'department_id': flask_request.args.get('department_id', type=int),
+        'user_id': flask_request.args.get('user_id', type=int),
+        'year': year or None
+    }
+
 @holidays_bp.route('/holidays')
 @login_required
 def index():
     """Lista de festivos trabajados"""
     if g.user.is_admin():
-        # Admin ve todos los festivos
-        all_holidays = WorkedHoliday.query.order_by(WorkedHoliday.date.desc()).all()
-        pending_holidays = [h for h in all_holidays if h.status == 'pending']
+        # Pendientes e histórico paginados por cursor (fecha, id) con los mismos filtros
+        try:
+            filters = _parse_holiday_filters()
+        except ValueError as e:
+            return str(e), 400
+        scope = {key: filters[key] for key in ('department_id', 'user_id', 'year')}
+        
+        pending_holidays, pending_cursor = WorkedHoliday.get_admin_page(
+            statuses=['pending'], limit=HOLIDAYS_PAGE_SIZE, **scope
+        )
+        history_holidays, next_cursor = WorkedHoliday.get_admin_page(
+            statuses=filters['statuses'], limit=HOLIDAYS_PAGE_SIZE, **scope
+        )
+        status_counts = WorkedHoliday.get_status_counts(**scope)
         departments = Department.query.all()
         
         return render_template('holidays.html',
                              is_admin=True,
-                             all_holidays=all_holidays,
                              pending_holidays=pending_holidays,
+                             pending_cursor=pending_cursor,
+                             history_holidays=history_holidays,
+                             next_cursor=next_cursor,
+                             status_counts=status_counts,
+                             filters=filters,
                              departments=departments,
                              common_holidays=WorkedHoliday.get_common_holidays())
     else:
@@ -31,13 +71,13 @@ def index():
             status='approved'
         ).order_by(WorkedHoliday.date.desc()).all()
         
-        # Calcular festivos disponibles
-        available_holidays = []
-        for holiday in approved_holidays:
-            recovery_status, _ = holiday.get_recovery_status()
-            # Disponible si no tiene recovery activa O si la anterior fue rechazada
-            if not recovery_status or recovery_status == 'rejected':
-                available_holidays.append(holiday)
+        # Disponibles según el estado de recuperación persistido (sin consultas por festivo)
+        available_holidays = [h for h in approved_holidays if h.is_available_for_recovery()[0]]
+        
+        # Última recuperación de cada festivo en una sola consulta (fecha y motivo en la tabla)
+        latest_recoveries = WorkedHoliday.get_latest_recoveries(
+            [h.id for h in approved_holidays if h.recovery_status]
+        )
         
         return render_template('holidays.html',
                             is_admin=False,
@@ -45,8 +85,46 @@ def index():
                             approved_holidays=approved_holidays,
                             available_for_recovery=available_holidays,
                             available_count=len(available_holidays),
+                            latest_recoveries=latest_recoveries,
                             common_holidays=WorkedHoliday.get_common_holidays())
 
+@holidays_bp.route('/holidays/page')
+@admin_required
+def page():
+    """Siguiente página de pendientes o del histórico en JSON (para cargar más filas)"""
+    try:
+        filters = _parse_holiday_filters()
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    section = 'pending' if flask_request.args.get('section') == 'pending' else 'history'
+    
+    holidays, next_cursor = WorkedHoliday.get_admin_page(
+        statuses=['pending'] if section == 'pending' else filters['statuses'],
+        department_id=filters['department_id'],
+        user_id=filters['user_id'],
+        year=filters['year'],
+        cursor=flask_request.args.get('cursor'),
+        limit=HOLIDAYS_PAGE_SIZE
+    )
+    
+    template = 'partials/holiday_pending_rows.html' if section == 'pending' else 'partials/holiday_history_rows.html'
+    
+    return jsonify({
+        'holidays': [{
+            'id': holiday.id,
+            'user_id': holiday.user_id,
+            'user_name': holiday.user.name,
+            'department': holiday.user.department.name,
+            'date': holiday.date.isoformat(),
+            'status': holiday.status,
+            'description': holiday.description,
+            'approver': holiday.approver.name if holiday.approver else None,
+            'approved_at': holiday.approved_at.isoformat() if holiday.approved_at else None
+        } for holiday in holidays],
+        'html': render_template(template, holidays=holidays),
+        'next_cursor': next_cursor
+    })
+
 @holidays_bp.route('/holidays', methods=['POST'])
 @login_required
 def create():
@@ -1,22 +1,52 @@
 from flask import Blueprint, render_template, request as flask_request, redirect, url_for, flash, g, jsonify
 from utils import login_required, admin_required, create_notifications_for_new_request
 from models import db, Request, User, Department, WorkedHoliday
+from sqlalchemy.orm import joinedload
 from datetime import datetime
 
 requests_bp = Blueprint('requests', __name__)
 
+# Filas por página del histórico de solicitudes (admin)
+HISTORY_PAGE_SIZE = 50
+
+def _parse_history_filters():
+    """Leer los filtros del histórico de solicitudes desde la query string"""
+    def parse_date(value):
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+        except ValueError:
+            return None
+    
+    status = flask_request.args.get('status', '')
+    
+    return {
+        'statuses': [status] if status in ['approved', 'rejected'] else ['approved', 'rejected'],
+        'type': flask_request.args.get('type') if flask_request.args.get('type') in ['vacation', 'recovery'] else None,
+        'department_id': flask_request.args.get('department_id', type=int),
+        'user_id': flask_request.args.get('user_id', type=int),
+        'date_from': parse_date(flask_request.args.get('date_from')),
+        'date_to': parse_date(flask_request.args.get('date_to'))
+    }
+
 @requests_bp.route('/requests')
 @login_required
 def index():
     """Lista de solicitudes"""
     if g.user.is_admin():
-        all_requests = Request.query.order_by(Request.created_at.desc()).all()
-        pending_requests = Request.query.filter_by(status='pending').order_by(Request.created_at.desc()).all()
+        pending_requests = Request.query.options(
+            joinedload(Request.user).joinedload(User.department)
+        ).filter_by(status='pending').order_by(Request.created_at.desc()).all()
+        
+        # Histórico paginado por cursor (created_at, id)
+        filters = _parse_history_filters()
+        history_requests, next_cursor = Request.get_admin_page(limit=HISTORY_PAGE_SIZE, **filters)
         departments = Department.query.all()
         
         return render_template('requests.html', 
                              is_admin=True,
-                             all_requests=all_requests,
+                             history_requests=history_requests,
+                             next_cursor=next_cursor,
+                             filters=filters,
                              pending_requests=pending_requests,
                              departments=departments)
     else:
@@ -28,6 +58,35 @@ def index():
                              my_requests=my_requests,
                              my_recovery_requests=my_recovery_requests)
 
+@requests_bp.route('/requests/history')
+@admin_required
+def history():
+    """Siguiente página del histórico en JSON (para cargar más filas en la tabla)"""
+    filters = _parse_history_filters()
+    history_requests, next_cursor = Request.get_admin_page(
+        cursor=flask_request.args.get('cursor'),
+        limit=HISTORY_PAGE_SIZE,
+        **filters
+    )
+    
+    return jsonify({
+        'requests': [{
+            'id': req.id,
+            'user_id': req.user_id,
+            'user_name': req.user.name,
+            'department': req.user.department.name,
+            'type': req.type,
+            'status': req.status,
+            'start_date': req.start_date.isoformat(),
+            'end_date': req.end_date.isoformat(),
+            'days': req.calculate_days(),
+            'reviewer': req.reviewer.name if req.reviewer else None,
+            'created_at': req.created_at.isoformat()
+        } for req in history_requests],
+        'html': render_template('partials/request_history_rows.html', history_requests=history_requests),
+        'next_cursor': next_cursor
+    })
+
 @requests_bp.route('/requests', methods=['POST'])
 @login_required
 def create():
@@ -69,12 +128,7 @@ def create():
                 return redirect(url_for('requests.index'))
             
             # Verificar que no esté ya usado
-            existing_recovery = Request.query.filter(
-                Request.worked_holiday_id == holiday.id,
-                Request.status.in_(['pending', 'approved'])
-            ).first()
-            
-            if existing_recovery:
+            if not holiday.is_available_for_recovery()[0]:
                 flash(f'El festivo del {holiday.date.strftime("%d/%m/%Y")} ya está siendo usado para otra recuperación.', 'error')
                 return redirect(url_for('requests.index'))
             
@@ -198,6 +252,44 @@ def approve(request_id):
     
     return '', 204
 
+@requests_bp.route('/requests/batch', methods=['POST'])
+@admin_required
+def batch_review():
+    """Aprobar o rechazar varias solicitudes pendientes de una vez (JSON)"""
+    from services.batch_review import review_batch, MAX_BATCH_SIZE
+    
+    data = flask_request.get_json(silent=True) or {}
+    action = data.get('action')
+    
+    # Una lista de ids: una cadena como "123" se recorrería carácter a carácter
+    ids = data.get('ids') or []
+    try:
+        if not isinstance(ids, list):
+            raise TypeError('ids debe ser una lista')
+        request_ids = [int(request_id) for request_id in ids]
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Lista de solicitudes inválida'}), 400
+    
+    if len(set(request_ids)) != len(request_ids):
+        return jsonify({'success': False, 'message': 'Hay solicitudes repetidas en el lote'}), 400
+    if action not in ['approve', 'reject']:
+        return jsonify({'success': False, 'message': 'Acción inválida'}), 400
+    if not request_ids:
+        return jsonify({'success': False, 'message': 'No se ha seleccionado ninguna solicitud'}), 400
+    if len(request_ids) > MAX_BATCH_SIZE:
+        return jsonify({'success': False, 'message': f'Máximo {MAX_BATCH_SIZE} solicitudes por lote'}), 400
+    
+    results = review_batch(request_ids, action, g.user, (data.get('reason') or '').strip() or None)
+    succeeded = sum(1 for result in results if result['success'])
+    
+    return jsonify({
+        'success': True,
+        'action': action,
+        'processed': succeeded,
+        'failed': len(results) - succeeded,
+        'results': results
+    })
+
 @requests_bp.route('/requests/<int:request_id>/reject', methods=['POST'])
 @admin_required
 def reject(request_id):